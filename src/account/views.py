@@ -16,10 +16,11 @@ from django.views.generic import (
 
 from account.forms import UserRegistrationForm, ProfileForm
 from account.models import BrowsingHistory, Profile, Seller
-from adminsettings.models import SiteSettings
-from cart.models import Order
+from adminsettings.services import get_site_settings
+from cart.services.order_history import get_order_history
 from cart.services.cart_actions import merge_cart_products
 from products.models import Product
+from products.services.thumbnails import get_thumbnail
 
 
 class FormValidationMixin:
@@ -97,10 +98,10 @@ class SellerDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        context['products'] = Product.objects.filter(sellers=kwargs['object']).order_by('-count_sells')
-        context['top_products_cache_time'] = (
-            SiteSettings.objects.values('top_product_cache_time')[0]['top_product_cache_time']
-        )
+        context['products'] = Product.objects.filter(
+            sellers=kwargs['object'],
+        ).select_related('primary_image').order_by('-count_sells')
+        context['top_products_cache_time'] = get_site_settings().top_product_cache_time
 
         return context
 
@@ -111,9 +112,14 @@ class HistoryOrderView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        history = Order.objects.filter(profile=self.request.user.id).order_by('-created_at')[:20]
+        history, next_cursor = get_order_history(
+            self.request.user,
+            self.request.GET.get('after'),
+            archived=None,
+        )
 
         context['history'] = history
+        context['next_cursor'] = next_cursor
 
         return context
 
@@ -129,13 +135,13 @@ class UserBrowsingHistoryView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        history = BrowsingHistory.objects.filter(profile=self.request.user).order_by('-timestamp')[:20]
+        history = BrowsingHistory.objects.filter(
+            profile=self.request.user,
+        ).select_related('product__primary_image').order_by('-timestamp')[:20]
 
         for item in history:
             product = item.product
-            first_image = product.images.first()
-
-            item.image_url = first_image.image.url if first_image else None
+            item.image = get_thumbnail(product.primary_image)
 
         context['history'] = history
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AdminsettingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'adminsettings'
+
+    def ready(self):
+        from adminsettings import signals
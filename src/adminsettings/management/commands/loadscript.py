@@ -5,6 +5,8 @@ from django.core import management
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from products.services.pictures import update_primary_images
+
 
 try:
     FOLDER_FIXTURES = settings.FOLDER_FIXTURES
@@ -61,6 +63,7 @@ class Command(BaseCommand):
             else:
                 self.stdout.write(self.style.SUCCESS('\nAll commands and loadings have been successful!'))
                 self.stdout.write(self.style.SUCCESS(f'\nFixtures upload order: {order_load}'))
+        update_primary_images()
 
     def _remove_old_migrations(self) -> None:
         self.stdout.write('\nRemove old migration files...\n')
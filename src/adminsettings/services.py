@@ -0,0 +1,72 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+from adminsettings.models import SiteSettings
+
+SETTINGS_VERSION_KEY = 'site_settings_version'
+VERSION_CHECK_INTERVAL = 5
+MAX_LOCAL_AGE = 60
+
+
+class _LocalSiteSettings:
+    """
+        Хранилище настроек сайта в памяти процесса.
+
+        Версия настроек хранится в общем кэше и меняется при сохранении
+        настроек, поэтому остальные процессы перечитывают строку из БД
+        не позже чем через VERSION_CHECK_INTERVAL секунд. Если общий кэш
+        недоступен процессу (например, воркеру Celery в другом контейнере),
+        настройки всё равно перечитываются раз в MAX_LOCAL_AGE секунд.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.settings = None
+        self.version = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+
+    def get(self) -> SiteSettings:
+        now = time.monotonic()
+        if self.settings is not None and now - self.checked_at < VERSION_CHECK_INTERVAL:
+            return self.settings
+
+        with self.lock:
+            version = cache.get(SETTINGS_VERSION_KEY)
+            if version is None:
+                version = uuid.uuid4().hex
+                cache.add(SETTINGS_VERSION_KEY, version, timeout=None)
+
+            if (self.settings is None or version != self.version
+                    or now - self.loaded_at >= MAX_LOCAL_AGE):
+                self.settings = SiteSettings.objects.first() or SiteSettings()
+                self.version = version
+                self.loaded_at = now
+            self.checked_at = now
+
+        return self.settings
+
+    def reset(self) -> None:
+        with self.lock:
+            self.settings = None
+
+
+_local_site_settings = _LocalSiteSettings()
+
+
+def get_site_settings() -> SiteSettings:
+    """
+    Получение настроек сайта.
+
+    Если настройки ещё не созданы, возвращается несохранённый объект
+    со значениями по умолчанию.
+    """
+    return _local_site_settings.get()
+
+
+def invalidate_site_settings() -> None:
+    """ Сброс настроек сайта во всех процессах. """
+    cache.set(SETTINGS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _local_site_settings.reset()
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from adminsettings.models import SiteSettings
+from adminsettings.services import invalidate_site_settings
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def clear_site_settings_cache(sender, instance, **kwargs) -> None:
+    """
+    Сброс закэшированных настроек сайта при их изменении.
+
+    Версия меняется после фиксации транзакции, чтобы другие процессы
+    не закэшировали под новой версией ещё не зафиксированную строку.
+    """
+    transaction.on_commit(invalidate_site_settings)
@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from adminsettings.models import SiteSettings
+from adminsettings.services import SETTINGS_VERSION_KEY, get_site_settings
+
+
+class SiteSettingsCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site_settings = SiteSettings.objects.create(delivery_cost=150)
+
+    def test_get_site_settings_cached(self):
+        self.assertEqual(get_site_settings().delivery_cost, 150)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_settings().delivery_cost, 150)
+
+    def test_get_site_settings_refreshed_on_save(self):
+        get_site_settings()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site_settings.delivery_cost = 300
+            self.site_settings.save()
+            version = cache.get(SETTINGS_VERSION_KEY)
+        self.assertNotEqual(cache.get(SETTINGS_VERSION_KEY), version)
+        self.assertEqual(get_site_settings().delivery_cost, 300)
+
+    def test_get_site_settings_defaults(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site_settings.delete()
+        self.assertEqual(get_site_settings().delivery_cost, 100)
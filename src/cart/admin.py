@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from cart.models import Order, Cart
+from cart.models import Order, OrderItem, Cart
 
 
 @admin.register(Cart)
@@ -12,8 +12,15 @@ class PropertyValueAdmin(admin.ModelAdmin):
     ]
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ['seller_product', 'product']
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    inlines = [OrderItemInline]
     list_display = 'profile', 'fio', 'phone', 'email', \
                    'city', 'delivery_address', 'delivery_type', \
                    'payment_type', 'comment', 'archived', 'created_at'
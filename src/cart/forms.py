@@ -5,17 +5,14 @@ import phonenumbers
 
 
 class CreateOrderForm(forms.ModelForm):
-    cart = forms.JSONField(widget=forms.Textarea(attrs={'hidden': True}))
-    profile = forms.CharField(widget=forms.Textarea(attrs={'hidden': True}))
+    quote_token = forms.CharField(widget=forms.HiddenInput())
     phone = forms.CharField(required=True)
     email = forms.EmailField(required=True)
 
     class Meta:
         model = Order
         fields = (
-            'profile',
             'fio',
-            'cart',
             'phone',
             'email',
             'city',
@@ -23,8 +20,6 @@ class CreateOrderForm(forms.ModelForm):
             'delivery_type',
             'payment_type',
             'comment',
-            'status',
-            'total_price',
         )
 
     def clean_phone(self):
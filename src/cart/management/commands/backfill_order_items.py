@@ -0,0 +1,45 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from cart.models import Order
+from cart.services.order_create import create_order_items
+from cart.services.order_history import get_order_summary
+
+
+class Command(BaseCommand):
+    """
+    Команда для заполнения позиций заказов (OrderItem) и краткой информации
+    о заказе по содержимому Order.cart у заказов, созданных до появления позиций.
+    """
+    help = 'Create order items for orders that have none'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Amount of orders processed in one transaction',
+        )
+
+    def handle(self, *args, **options) -> None:
+        batch_size = options['batch_size']
+        orders = Order.objects.filter(items=None).order_by('pk')
+
+        processed = 0
+        items_created = 0
+        last_pk = 0
+        while True:
+            batch = list(orders.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for order in batch:
+                    items_created += len(create_order_items(order))
+                    order.items_count, order.preview_image = get_order_summary(order.cart)
+                    order.save(update_fields=['items_count', 'preview_image'])
+            processed += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} order(s), created {items_created} order item(s)'
+        ))
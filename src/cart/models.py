@@ -2,7 +2,7 @@ from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from products.models import SellerProduct
+from products.models import Product, SellerProduct
 
 from account.models import Profile
 
@@ -28,7 +28,7 @@ class Order(models.Model):
     """
     Модель для описания заказа покупателя.
 
-    profile - id пользователя;
+    profile - связь с пользователем;
     fio - фамилия, имя и отчество покупателя;
     phone - телефон покупателя;
     email - адрес электронной почты покупателя;
@@ -41,8 +41,10 @@ class Order(models.Model):
     created_at - дата и время создания заказа;
     status - статус заказа;
     total_price - итоговая стоимость заказа;
+    items_count - количество единиц товара в заказе;
+    preview_image - ссылка на изображение первого товара в заказе.
     """
-    profile = models.CharField(max_length=4, null=False, blank=False)
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='orders')
     fio = models.CharField(max_length=255, null=False, blank=False)
     phone = models.CharField(max_length=10, blank=True, null=True)
     email = models.EmailField(null=False, blank=False)
@@ -57,7 +59,49 @@ class Order(models.Model):
     status = models.BooleanField(default=False)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     payment_id = models.SlugField(max_length=200, unique=True, null=True)
+    items_count = models.PositiveIntegerField(default=0)
+    preview_image = models.CharField(max_length=255, blank=True)
 
     class Meta:
+        indexes = [
+            models.Index(fields=['profile', 'archived', '-created_at', '-id']),
+            models.Index(fields=['profile', '-created_at', '-id']),
+        ]
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
+
+
+class OrderItem(models.Model):
+    """
+    Модель для описания позиции заказа.
+
+    Дублирует содержимое Order.cart в нормализованном виде
+    для выборок и аналитики продаж.
+
+    order - связь с заказом;
+    seller_product - связь с товаром продавца;
+    product - связь с товаром;
+    price - цена за единицу товара без скидки;
+    discounted_price - цена за единицу товара со скидкой;
+    count - количество товара.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    seller_product = models.ForeignKey(
+        SellerProduct,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='order_items',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='order_items',
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discounted_price = models.DecimalField(max_digits=10, decimal_places=2)
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = _('Order item')
+        verbose_name_plural = _('Order items')
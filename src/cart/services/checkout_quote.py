@@ -0,0 +1,94 @@
+import hashlib
+import json
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.core.cache import cache
+from django.utils.translation import gettext
+
+from account.models import Profile
+from adminsettings.services import get_site_settings
+from cart.models import Cart
+from cart.services.order_create import get_carts_JSON, get_total_price
+
+QUOTE_KEY = 'checkout_quote_{token}'
+QUOTE_TTL = 60 * 15
+EXPRESS_DELIVERY = 'Экспресс доставка'
+
+
+def get_cart_hash(carts: Iterable[Cart]) -> str:
+    """
+    Сервис для получения хэша содержимого корзины.
+
+    Учитываются только товары продавцов и их количество, поэтому хэш
+    можно посчитать без пересчёта цен и скидок.
+    """
+    content = sorted((cart.product_seller_id, cart.count) for cart in carts)
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
+def create_quote(profile: Profile) -> Tuple[str, Dict]:
+    """
+    Сервис для расчёта заказа по корзине пользователя и сохранения расчёта в кэше.
+
+    args:
+        profile - пользователь, оформляющий заказ.
+
+    return:
+        token - ключ расчёта для формы заказа;
+        quote - расчёт заказа: позиции с ценами после скидок, стоимость доставки,
+                итоговая цена и хэш корзины.
+    """
+    carts = list(Cart.objects.filter(profile=profile).select_related(
+        'product_seller__product__primary_image',
+    ))
+    lines = get_carts_JSON(carts)
+    total_price, delivery_price = get_total_price(lines)
+    quote = {
+        'profile': profile.pk,
+        'cart': lines,
+        'total_price': total_price,
+        'delivery_price': delivery_price,
+        'express_delivery_price': get_site_settings().express_delivery_cost,
+        'cart_hash': get_cart_hash(carts),
+    }
+
+    token = uuid.uuid4().hex
+    cache.set(QUOTE_KEY.format(token=token), quote, QUOTE_TTL)
+    return token, quote
+
+
+def get_quote(token: str, profile: Profile) -> Optional[Dict]:
+    """
+    Сервис для получения сохранённого расчёта заказа.
+
+    Расчёт не возвращается, если он истёк, принадлежит другому пользователю
+    или корзина изменилась после расчёта.
+    """
+    if not token:
+        return None
+
+    quote = cache.get(QUOTE_KEY.format(token=token))
+    if not quote or quote['profile'] != profile.pk or not quote['cart']:
+        return None
+
+    if quote['cart_hash'] != get_cart_hash(Cart.objects.filter(profile=profile)):
+        return None
+
+    return quote
+
+
+def delete_quote(token: str) -> None:
+    """ Сервис для удаления использованного расчёта заказа. """
+    cache.delete(QUOTE_KEY.format(token=token))
+
+
+def get_order_total_price(quote: Dict, delivery_type: str) -> Decimal:
+    """
+    Сервис для получения итоговой цены заказа по расчёту и способу доставки.
+    """
+    total_price = Decimal(str(quote['total_price']))
+    if delivery_type in (EXPRESS_DELIVERY, gettext(EXPRESS_DELIVERY)):
+        total_price += Decimal(str(quote['express_delivery_price']))
+    return total_price
@@ -1,9 +1,12 @@
+from decimal import Decimal
 from typing import Tuple, Dict, List
 
-from cart.models import Cart
+from cart.models import Cart, Order, OrderItem
+from products.models import SellerProduct
+from products.services.thumbnails import thumbnail_url
 
 from discounts.services.discount_utils import calculate_discounted_prices
-from adminsettings.models import SiteSettings
+from adminsettings.services import get_site_settings
 
 
 def get_total_price(carts: Dict) -> Tuple[int, int]:
@@ -18,8 +21,9 @@ def get_total_price(carts: Dict) -> Tuple[int, int]:
         delivery_price - цена доставки.
     """
     total_price = 0
-    min_price = SiteSettings.objects.first().min_price_for_free_delivery
-    delivery_price = SiteSettings.objects.first().delivery_cost
+    site_settings = get_site_settings()
+    min_price = site_settings.min_price_for_free_delivery
+    delivery_price = site_settings.delivery_cost
     for cart in carts.values():
         total_price += cart['price'] * cart['count']
     sellers = [cart['seller'] for cart in carts.values()]
@@ -52,13 +56,58 @@ def get_carts_JSON(carts: List[Cart]) -> Dict:
 
     for cart in carts_list:
         response[cart[0].id] = {
-            'image': cart[0].product.images.first().image.url,
+            'image': thumbnail_url(cart[0].product.primary_image, 'small'),
             'name': cart[0].product.name,
             'slug': cart[0].product.slug,
             'description': cart[0].product.description,
             'price': float(cart[1]),
+            'unit_price': float(cart[0].price),
             'count': cart[2],
             'seller': cart[0].id,
+            'discounted': cart[3],
         }
 
     return response
+
+
+def create_order_items(order: Order) -> List[OrderItem]:
+    """
+    Сервис для создания позиций заказа по содержимому Order.cart.
+
+    Ключи Order.cart - id товаров продавцов. Если товар продавца уже удалён,
+    позиция сохраняется без связей с товаром.
+
+    args:
+        order - заказ.
+
+    return:
+        список созданных позиций заказа.
+    """
+    if not isinstance(order.cart, dict):
+        return []
+
+    seller_products = SellerProduct.objects.in_bulk(
+        [int(pk) for pk in order.cart if str(pk).isdigit()],
+    )
+
+    items = []
+    for pk, cart in order.cart.items():
+        seller_product = seller_products.get(int(pk)) if str(pk).isdigit() else None
+        discounted_price = Decimal(str(cart['price']))
+        if cart.get('unit_price') is not None:
+            price = Decimal(str(cart['unit_price']))
+        elif seller_product:
+            price = seller_product.price
+        else:
+            price = discounted_price
+
+        items.append(OrderItem(
+            order=order,
+            seller_product=seller_product,
+            product_id=seller_product.product_id if seller_product else None,
+            price=price,
+            discounted_price=discounted_price,
+            count=cart['count'],
+        ))
+
+    return OrderItem.objects.bulk_create(items)
@@ -0,0 +1,93 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Q
+
+from account.models import Profile
+from cart.models import Order
+
+ORDERS_PER_PAGE = 20
+ORDER_SUMMARY_FIELDS = (
+    'id',
+    'created_at',
+    'delivery_type',
+    'payment_type',
+    'total_price',
+    'status',
+    'items_count',
+    'preview_image',
+)
+
+
+def get_order_summary(cart: Any) -> Tuple[int, str]:
+    """
+    Сервис для получения краткой информации о заказе по его корзине.
+
+    return:
+        items_count - количество единиц товара в заказе;
+        preview_image - ссылка на изображение первого товара.
+    """
+    if not isinstance(cart, dict) or not cart:
+        return 0, ''
+
+    items_count = sum(item.get('count', 0) for item in cart.values())
+    preview_image = next(iter(cart.values())).get('image', '')
+    return items_count, preview_image
+
+
+def encode_cursor(order: Order) -> str:
+    """ Сервис для получения курсора страницы, следующей за заказом. """
+    value = f'{order.created_at.isoformat()}|{order.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """ Сервис для разбора курсора страницы. Некорректный курсор игнорируется. """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def get_order_history(
+        profile: Profile,
+        cursor: Optional[str] = None,
+        limit: int = ORDERS_PER_PAGE,
+        archived: Optional[bool] = False,
+) -> Tuple[List[Order], Optional[str]]:
+    """
+    Сервис для постраничного получения истории заказов пользователя.
+
+    Используется пагинация по ключу (created_at, id), поэтому стоимость запроса
+    не зависит от номера страницы. Загружаются только поля для списка заказов.
+    Выборки с фильтром по archived и без него используют разные индексы Order.
+
+    args:
+        profile - пользователь;
+        cursor - курсор страницы, полученный с предыдущей страницы;
+        limit - количество заказов на странице;
+        archived - выбирать архивные (True) или неархивные (False) заказы, None - все заказы.
+
+    return:
+        orders - заказы на странице;
+        next_cursor - курсор следующей страницы или None, если страница последняя.
+    """
+    queryset = Order.objects.filter(profile=profile)
+    if archived is not None:
+        queryset = queryset.filter(archived=archived)
+    queryset = queryset.only(
+        *ORDER_SUMMARY_FIELDS,
+    ).order_by('-created_at', '-id')
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+        )
+
+    orders = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
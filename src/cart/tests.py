@@ -1,55 +1,199 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.urls import reverse
 
-from account.models import Profile
+from account.models import Profile, Seller
 from adminsettings.models import SiteSettings
-from cart.models import Order
+from cart.models import Cart, Order
+from cart.services.checkout_quote import create_quote, get_quote
+from cart.services.order_create import create_order_items
+from cart.services.order_history import get_order_history
+from products.models import Category, Picture, Product, SellerProduct
 
 
 class CreateOrderViewTestCase(TestCase):
     def setUp(self) -> None:
-        SiteSettings.objects.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            SiteSettings.objects.create()
         self.user = Profile.objects.create_user(
             username="admin",
             email="admin@example.com",
             password='123'
         )
         self.client.login(email="admin@example.com", password='123')
+        product = Product.objects.create(
+            category=Category.objects.create(name="some category"),
+            name="SSD",
+            slug="ssd",
+            description="SSD Samsung",
+        )
+        Picture.objects.create(product=product, image="products/images/ssd.webp")
+        self.seller_product = SellerProduct.objects.create(
+            product=product,
+            seller=Seller.objects.create(name="Mvideo", description="Mvideo", profile=self.user),
+            count=10,
+            price=199,
+        )
+        Cart.objects.create(product_seller=self.seller_product, profile=self.user, count=1)
+        self.order_data = {
+            "fio": "Иванов Иван",
+            "phone": "+79998887766",
+            "email": "admin@example.com",
+            "city": "Moskow",
+            "delivery_address": "Kutuzova 14",
+            "delivery_type": "Обычная доставка",
+            "payment_type": "Онлайн картой",
+            "comment": "Тестовый заказ",
+            "total_price": "1.00",
+        }
 
     def tearDown(self) -> None:
         self.client.logout()
         Profile.objects.filter(username='admin').delete()
 
-    def test_create_order_view(self):
+    @patch('cart.views.get_paid', return_value='/payment/')
+    def test_create_order_view(self, get_paid):
+        token, quote = create_quote(self.user)
         responce = self.client.post(
             reverse("cart:create_order"),
-            {
-                "profile": Profile.objects.first().id,
-                "fio": "Иванов Иван",
-                "phone": "+79998887766",
-                "email": "admin@example.com",
-                "cart": {
-                    "16": {
-                        "image": "SAMSUNG.webp",
-                        "name": "SSD",
-                        "slug": "ssd",
-                        "description": "SSD Samsung",
-                        "price": 199.0,
-                        "count": 1,
-                        "seller": "Mvideo"
-                    },
+            {**self.order_data, "quote_token": token},
+        )
+
+        self.assertEqual(responce.status_code, 302)
+        order = Order.objects.get(phone="9998887766")
+        self.assertEqual(order.total_price, 299)
+        self.assertEqual(list(order.cart), [str(self.seller_product.pk)])
+        self.assertFalse(Cart.objects.filter(profile=self.user).exists())
+        self.assertIsNone(get_quote(token, self.user))
+
+    @patch('cart.views.get_paid', return_value='/payment/')
+    def test_create_order_view_changed_cart(self, get_paid):
+        token, quote = create_quote(self.user)
+        Cart.objects.filter(profile=self.user).update(count=2)
+        responce = self.client.post(
+            reverse("cart:create_order"),
+            {**self.order_data, "quote_token": token},
+        )
+
+        self.assertRedirects(responce, reverse("cart:create_order"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        get_paid.assert_not_called()
+
+
+class CreateOrderItemsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = Profile.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password='123'
+        )
+        product = Product.objects.create(
+            category=Category.objects.create(name="some category"),
+            name="some product",
+            slug="some_product",
+        )
+        self.seller_product = SellerProduct.objects.create(
+            product=product,
+            seller=Seller.objects.create(name="seller", description="seller", profile=self.user),
+            count=10,
+            price=200,
+        )
+
+    def test_create_order_items(self):
+        order = Order.objects.create(
+            profile=self.user,
+            fio="Иванов Иван",
+            email="admin@example.com",
+            cart={
+                str(self.seller_product.pk): {
+                    "price": 150.0,
+                    "count": 2,
+                    "seller": self.seller_product.pk,
+                },
+                "999": {
+                    "price": 99.0,
+                    "unit_price": 120.0,
+                    "count": 1,
+                    "seller": 999,
                 },
-                "city": "Moskow",
-                "delivery_address": "Kutuzova 14",
-                "delivery_type": "Обычная доставка",
-                "payment_type": "Онлайн картой",
-                "comment": "Тестовый заказ",
-                "total_price": "999.00",
-                "payment_id": "1",
             },
+            city="Moskow",
+            delivery_address="Kutuzova 14",
+            total_price=399,
         )
+        create_order_items(order)
 
-        self.assertEqual(responce.status_code, 302)
-        self.assertTrue(
-            Order.objects.filter(phone="9998887766").exists()
+        item = order.items.get(seller_product=self.seller_product)
+        self.assertEqual(item.product, self.seller_product.product)
+        self.assertEqual(item.price, 200)
+        self.assertEqual(item.discounted_price, 150)
+        self.assertEqual(item.count, 2)
+
+        missing_item = order.items.get(seller_product=None)
+        self.assertIsNone(missing_item.product)
+        self.assertEqual(missing_item.price, 120)
+
+
+class OrderHistoryTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = Profile.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password='123'
         )
+        Order.objects.bulk_create([
+            Order(
+                profile=self.user,
+                fio="Иванов Иван",
+                email="admin@example.com",
+                cart={},
+                city="Moskow",
+                delivery_address="Kutuzova 14",
+                total_price=100,
+                archived=number == 0,
+            )
+            for number in range(26)
+        ])
+
+    def test_get_order_history_pages(self):
+        first_page, cursor = get_order_history(self.user, limit=20)
+        second_page, last_cursor = get_order_history(self.user, cursor, limit=20)
+
+        self.assertEqual(len(first_page), 20)
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(last_cursor)
+        pks = [order.pk for order in first_page + second_page]
+        self.assertEqual(
+            pks,
+            list(Order.objects.filter(archived=False).order_by('-created_at', '-id').values_list('pk', flat=True)),
+        )
+
+    def test_get_order_history_with_archived(self):
+        orders, cursor = get_order_history(self.user, limit=30, archived=None)
+        self.assertEqual(len(orders), 26)
+        self.assertIsNone(cursor)
+
+        orders, cursor = get_order_history(self.user, archived=True)
+        self.assertEqual([order.archived for order in orders], [True])
+
+    def test_order_lists_show_preview_image(self):
+        Order.objects.update(preview_image='/media/preview.png')
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('cart:order_list'))
+        self.assertContains(response, 'src="/media/preview.png"')
+
+        response = self.client.get(reverse('account:historyorder'))
+        self.assertContains(response, 'src="/media/preview.png"')
+
+    def test_order_lists_link_next_page(self):
+        self.client.force_login(self.user)
+        for url in (reverse('cart:order_list'), reverse('account:historyorder')):
+            response = self.client.get(url)
+            self.assertContains(response, 'Pagination-element_next')
+            self.assertNotContains(response, 'Pagination-element_prev')
+
+    def test_get_order_history_invalid_cursor(self):
+        orders, cursor = get_order_history(self.user, 'not-a-cursor', limit=20)
+        self.assertEqual(len(orders), 20)
@@ -1,5 +1,7 @@
 from typing import Any
 
+from django.contrib import messages
+from django.db import transaction
 from django.db.models import F, QuerySet, Model
 from django.views.generic import ListView, DetailView
 from django.core.exceptions import ValidationError
@@ -7,17 +9,20 @@ from django.http import HttpResponse, HttpRequest
 from django.shortcuts import render, redirect
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils.translation import gettext as _
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 
-from adminsettings.models import SiteSettings
 from cart.serializer import CartSerializer, ProductSellerSerializer, CartPostSerializer
 from products.models import SellerProduct
+from products.services.thumbnails import thumbnail_url
 from cart.forms import CreateOrderForm
 from cart.models import Order, Cart
 from cart.services.cart_actions import check_product_amt
-from cart.services.order_create import get_total_price, get_fio, get_carts_JSON
+from cart.services.checkout_quote import create_quote, delete_quote, get_order_total_price, get_quote
+from cart.services.order_create import get_fio, create_order_items
+from cart.services.order_history import get_order_history, get_order_summary
 from payments.services.payment_service import get_paid
 
 
@@ -26,8 +31,16 @@ class OrderListView(LoginRequiredMixin, ListView):
     context_object_name = "orders"
 
     def get_queryset(self):
-        queryset = Order.objects.filter(archived=False, profile=self.request.user.id).order_by('-created_at')
-        return queryset
+        orders, self.next_cursor = get_order_history(
+            self.request.user,
+            self.request.GET.get('after'),
+        )
+        return orders
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
 
 
 class OrderDetailView(LoginRequiredMixin, DetailView):
@@ -38,7 +51,7 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     context_object_name = "order"
 
     def get_queryset(self):
-        queryset = Order.objects.filter(archived=False, profile=self.request.user.id)
+        queryset = Order.objects.filter(archived=False, profile=self.request.user)
         return queryset
 
     def post(self, request, pk):
@@ -55,16 +68,16 @@ class CreateOrderView(LoginRequiredMixin, View):
         user = request.user
         if user.is_authenticated:
             fio = get_fio(user.last_name, user.first_name, user.username)
-            carts = (get_carts_JSON(Cart.objects.filter(profile=user.id)))
-            total_price, delivery_price = get_total_price(carts)
+            token, quote = create_quote(user)
             context = {
-                'form': CreateOrderForm(initial={"cart": carts, "profile": user.id}),
+                'form': CreateOrderForm(initial={"quote_token": token}),
+                'order_cart': quote['cart'],
                 'user_fio': fio,
                 'user_phone': user.phone,
                 'user_email': user.email,
-                'total_price': total_price,
-                'delivery_price': delivery_price,
-                'express': SiteSettings.objects.first().express_delivery_cost,
+                'total_price': quote['total_price'],
+                'delivery_price': quote['delivery_price'],
+                'express': quote['express_delivery_price'],
             }
 
         else:
@@ -76,12 +89,32 @@ class CreateOrderView(LoginRequiredMixin, View):
 
         form = CreateOrderForm(request.POST)
         if form.is_valid():
-            form.save()
+            token = form.cleaned_data['quote_token']
+            quote = get_quote(token, request.user)
+            if quote is None:
+                messages.add_message(
+                    request,
+                    messages.WARNING,
+                    _("Корзина изменилась или время оформления заказа истекло. Проверьте заказ ещё раз."),
+                )
+                return redirect('cart:create_order')
+
+            form.instance.profile = request.user
+            form.instance.cart = quote['cart']
+            form.instance.items_count, form.instance.preview_image = get_order_summary(quote['cart'])
+            form.instance.total_price = get_order_total_price(
+                quote,
+                form.cleaned_data['delivery_type'],
+            )
+            with transaction.atomic():
+                order = form.save()
+                create_order_items(order)
+            delete_quote(token)
             Cart.objects.filter(profile=request.user.id).delete()
             # if form.cleaned_data['payment_type'] == "Online from a random someone else's account":
             #
             #     return HttpResponse("обработка запроса")
-            paid_url = get_paid(Order.objects.filter(profile=request.user.pk).last())
+            paid_url = get_paid(order)
             return redirect(paid_url)
         return self.get(request)
 
@@ -97,9 +130,14 @@ class CartView(ListView):
             cart_list: dict = self.request.session.get('cart')
             if cart_list is None:
                 return []
-            return [[SellerProduct.objects.get(pk=obj['product_seller']), obj['count']] for obj in cart_list]
+            seller_products = SellerProduct.objects.select_related(
+                'product__primary_image',
+            ).in_bulk([obj['product_seller'] for obj in cart_list])
+            return [[seller_products[obj['product_seller']], obj['count']] for obj in cart_list]
 
-        cart = Cart.objects.filter(profile=self.request.user)
+        cart = Cart.objects.filter(profile=self.request.user).select_related(
+            'product_seller__product__primary_image',
+        )
         check_product_amt(cart)
         return cart
 
@@ -113,7 +151,7 @@ class CartView(ListView):
                     'product_obj': product_seller[0].product,
                     'pk': product_seller[0].pk,
                     'seller': product_seller[0].pk,
-                    'pict': product_seller[0].product.images.first().image.url,
+                    'pict': thumbnail_url(product_seller[0].product.primary_image, 'small'),
                     'name': product_seller[0].product.name,
                     'price': product_seller[0].price,
                     'count': product_seller[1],
@@ -128,7 +166,7 @@ class CartView(ListView):
                     'product_obj': cart_product.product_seller.product,
                     'pk': cart_product.pk,
                     'seller': cart_product.product_seller.pk,
-                    'pict': cart_product.product_seller.product.images.first().image.url,
+                    'pict': thumbnail_url(cart_product.product_seller.product.primary_image, 'small'),
                     'name': cart_product.product_seller.product.name,
                     'price': cart_product.product_seller.price,
                     'count': cart_product.count,
@@ -76,6 +76,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "products.middleware.AnonymousPageCacheMiddleware",
 ]
 
 if DEBUG:
@@ -112,6 +113,9 @@ TEMPLATES = [
             "constants": {
             },
             'globals': {
+                'site_settings': 'adminsettings.services.get_site_settings',
+                'thumbnail': 'products.services.thumbnails.thumbnail',
+                'thumbnail_url': 'products.services.thumbnails.thumbnail_url',
             },
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -247,9 +251,47 @@ MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
 
 IMPORT_DIR = BASE_DIR / 'imports'
 IMPORT_PENDING_DIR = IMPORT_DIR / 'pending'
+IMPORT_PROCESSING_DIR = IMPORT_DIR / 'processing'
+IMPORT_DUPLICATES_DIR = IMPORT_DIR / 'duplicates'
 IMPORT_SUCCESS_DIR = IMPORT_DIR / 'success'
 IMPORT_FAILURE_DIR = IMPORT_DIR / 'failure'
 IMPORT_LOGS_DIR = IMPORT_DIR / 'logs'
+IMPORT_BATCH_SIZE = 500
+IMPORT_SHARD_SIZE = 5000
+IMPORT_LOG_FLUSH_MESSAGES = 100
+IMPORT_LOG_FLUSH_INTERVAL = 5
+IMPORT_LOG_TAIL_MESSAGES = 200
+IMPORT_IMAGE_WORKERS = 4
+IMPORT_IMAGE_MEMORY_BUDGET = 64 * 1024 * 1024
+IMPORT_MAX_CONCURRENT = 2
+IMPORT_STALE_AFTER = 6 * 60 * 60
+IMPORT_SCHEDULER_LOCK_TIMEOUT = 5 * 60
+CACHE_REBUILD_BETA = 1.0
+CACHE_REBUILD_GRACE = 5 * 60
+CACHE_REBUILD_LOCK_TIMEOUT = 60
+BANNERS_CACHE_TIMEOUT = 10 * 60
+BANNERS_PREWARM_AHEAD = 2 * 60
+
+PAGE_CACHE_TIMEOUT = 5 * 60
+PAGE_CACHE_VIEWS = {
+    'index': ['catalog'],
+    'products:catalog': ['catalog'],
+    'products:products-by-category': ['catalog'],
+    'products:products-by-tag': ['catalog'],
+    'products:product_details': ['common', 'product:{slug}'],
+}
+
+PICTURE_THUMBNAIL_SIZES = {
+    'small': (100, 100),
+    'medium': (300, 300),
+    'large': (800, 800),
+}
+PICTURE_THUMBNAIL_QUALITY = 85
+PICTURE_THUMBNAIL_RETRY_TIMEOUT = 10 * 60
+PICTURE_REUSE_TIMEOUT = 60 * 60
+
+EXPORT_DIR = BASE_DIR / 'exports'
+EXPORT_CHUNK_SIZE = 2000
 
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
@@ -260,6 +302,21 @@ RABBITMQ_PORT = os.getenv("RABBITMQ_PORT")
 RABBITMQ_USER = os.getenv("RABBITMQ_USER")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
 
+CELERY_BEAT_SCHEDULE = {
+    'process-payment-events': {
+        'task': 'payments.tasks.process_payment_events',
+        'schedule': 60.0,
+    },
+    'schedule-pending-imports': {
+        'task': 'products.tasks.schedule_pending_imports',
+        'schedule': 60.0,
+    },
+    'refresh-banners': {
+        'task': 'products.tasks.refresh_banners',
+        'schedule': 60.0,
+    },
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_ADMIN_EMAIL = 'admin@megano.com'
 DEFAULT_FROM_EMAIL = 'admin@megano.com'
@@ -0,0 +1,24 @@
+from django.contrib import admin
+
+from payments.models import PaymentEvent
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'event',
+        'payment_id',
+        'status',
+        'received_at',
+        'processed_at',
+        'attempts',
+    ]
+    list_filter = ['event', 'status']
+    search_fields = ['payment_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
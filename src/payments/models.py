@@ -0,0 +1,46 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class PaymentEvent(models.Model):
+    """
+    Модель входящего уведомления платёжного сервиса.
+
+    Записи только добавляются: повторная доставка того же уведомления
+    отбрасывается по уникальному event_key.
+
+    event_key - уникальный ключ события (тип события, id платежа и статус);
+    event - тип события (например, payment.succeeded);
+    payment_id - id платежа в платёжном сервисе;
+    status - статус платежа в уведомлении;
+    payload - тело уведомления;
+    received_at - дата и время получения уведомления;
+    processed_at - дата и время обработки уведомления;
+    attempts - количество попыток обработки;
+    error - текст ошибки последней попытки обработки.
+    """
+    event_key = models.CharField(max_length=255, unique=True)
+    event = models.CharField(max_length=100, blank=True)
+    payment_id = models.SlugField(max_length=200, db_index=True)
+    status = models.CharField(max_length=40)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['processed_at', 'received_at']),
+        ]
+        verbose_name = _('Payment event')
+        verbose_name_plural = _('Payment events')
+
+    def __str__(self):
+        return self.event_key
+
+    @staticmethod
+    def build_event_key(event: str, payment_id: str, status: str) -> str:
+        """ Получение уникального ключа события. """
+        return f'{event}:{payment_id}:{status}'
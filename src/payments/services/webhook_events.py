@@ -0,0 +1,90 @@
+from typing import Any, Dict, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Order
+from payments.models import PaymentEvent
+from payments.services.payment_service import get_payment_status
+
+EVENTS_BATCH_SIZE = 100
+MAX_PROCESSING_ATTEMPTS = 5
+
+
+def register_payment_event(notification: Dict[str, Any]) -> Tuple[PaymentEvent, bool]:
+    """
+    Сохранение уведомления платёжного сервиса.
+
+    Args:
+        notification: тело уведомления.
+
+    Returns:
+        Кортеж (событие, было ли событие создано). Повторная доставка
+        уведомления возвращает уже сохранённое событие.
+    """
+    payment = notification['object']
+    event = notification.get('event', '')
+    event_key = PaymentEvent.build_event_key(
+        event,
+        payment['id'],
+        payment['status'],
+    )
+    return PaymentEvent.objects.get_or_create(
+        event_key=event_key,
+        defaults={
+            'event': event,
+            'payment_id': payment['id'],
+            'status': payment['status'],
+            'payload': notification,
+        },
+    )
+
+
+def process_payment_event(event: PaymentEvent) -> None:
+    """
+    Применение события к заказу.
+
+    Заказ блокируется на время обработки, а списание товаров выполняется
+    только при переходе заказа в оплаченный статус, поэтому повторная
+    обработка не меняет остатки дважды.
+    """
+    if event.status != 'succeeded':
+        return
+
+    order = Order.objects.select_for_update().get(payment_id=event.payment_id)
+    if not order.status:
+        get_payment_status(order)
+
+
+def process_pending_events(batch_size: int = EVENTS_BATCH_SIZE) -> int:
+    """
+    Обработка одной пачки необработанных событий.
+
+    Args:
+        batch_size: максимальное количество событий в пачке.
+
+    Returns:
+        Количество событий, взятых в обработку.
+    """
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.select_for_update(
+                skip_locked=True,
+            ).filter(
+                processed_at=None,
+                attempts__lt=MAX_PROCESSING_ATTEMPTS,
+            )[:batch_size]
+        )
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    process_payment_event(event)
+            except Exception as e:
+                event.error = f'{type(e).__name__}: {e}'
+            else:
+                event.processed_at = timezone.now()
+                event.error = ''
+            event.save(update_fields=['attempts', 'processed_at', 'error'])
+
+    return len(events)
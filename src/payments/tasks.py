@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from payments.services.webhook_events import EVENTS_BATCH_SIZE, process_pending_events
+
+
+@shared_task
+def process_payment_events(batch_size: int = EVENTS_BATCH_SIZE):
+    while process_pending_events(batch_size) == batch_size:
+        pass
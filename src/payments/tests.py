@@ -0,0 +1,86 @@
+import json
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+from kombu.exceptions import OperationalError
+
+from account.models import Profile, Seller
+from cart.models import Order
+from payments.models import PaymentEvent
+from payments.services.webhook_events import process_pending_events
+from products.models import Category, Product, SellerProduct
+
+
+class PaymentWebhookTestCase(TestCase):
+    def setUp(self) -> None:
+        profile = Profile.objects.create_user(
+            username="buyer",
+            email="buyer@example.com",
+            password='123'
+        )
+        seller = Seller.objects.create(name="seller", description="seller", profile=profile)
+        product = Product.objects.create(
+            category=Category.objects.create(name="some category"),
+            name="some product",
+            slug="some_product",
+        )
+        self.seller_product = SellerProduct.objects.create(
+            product=product,
+            seller=seller,
+            count=10,
+            price=100,
+        )
+        self.order = Order.objects.create(
+            profile=profile,
+            fio="Иванов Иван",
+            email="buyer@example.com",
+            cart={str(self.seller_product.pk): {'seller': self.seller_product.pk, 'count': 3}},
+            city="Moskow",
+            delivery_address="Kutuzova 14",
+            total_price=300,
+            payment_id="payment-1",
+        )
+        self.notification = {
+            'type': 'notification',
+            'event': 'payment.succeeded',
+            'object': {'id': 'payment-1', 'status': 'succeeded'},
+        }
+
+    def post_notification(self, notification):
+        return self.client.post(
+            reverse("payments:payment_webhook"),
+            data=json.dumps(notification),
+            content_type="application/json",
+        )
+
+    def test_duplicate_delivery_is_stored_once(self):
+        self.assertEqual(self.post_notification(self.notification).status_code, 200)
+        self.assertEqual(self.post_notification(self.notification).status_code, 200)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_event_is_stored_when_broker_is_down(self):
+        with patch('payments.views.process_payment_events.delay', side_effect=OperationalError), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.post_notification(self.notification)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(PaymentEvent.objects.filter(processed_at=None).exists())
+
+    def test_malformed_notification(self):
+        self.assertEqual(self.post_notification({'event': 'payment.succeeded'}).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_stock_is_changed_once(self):
+        self.post_notification(self.notification)
+        self.post_notification({
+            **self.notification,
+            'event': 'payment.waiting_for_capture',
+        })
+        process_pending_events()
+        process_pending_events()
+
+        self.seller_product.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.seller_product.count, 7)
+        self.assertTrue(self.order.status)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at=None).exists())
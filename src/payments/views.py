@@ -1,25 +1,35 @@
 import json
+import logging
 
+from django.db import transaction
 from django.http import HttpResponse, HttpRequest
+from kombu.exceptions import OperationalError
 
-from payments.services.payment_service import get_payment_status
+from payments.services.webhook_events import register_payment_event
+from payments.tasks import process_payment_events
 
-from cart.models import Order
+logger = logging.getLogger(__name__)
 
 
 def payment_webhook_view(request: HttpRequest) -> HttpResponse:
     '''вебхук для получения статуса заказа'''
-    if request.method == 'GET':
+    if request.method != 'POST':
         return HttpResponse(status=404)
-    if request.method == 'POST':
-        response = json.loads(request.body)
 
-        if response['object']['status'] != 'succeeded':
-            return HttpResponse(status=400)
+    try:
+        notification = json.loads(request.body)
+        event, created = register_payment_event(notification)
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse(status=400)
 
-        if response['object']['status'] == 'canceled':
-            return HttpResponse(status=200)
+    if created:
+        transaction.on_commit(enqueue_payment_events)
+    return HttpResponse(status=200)
 
-        order = Order.objects.get(payment_id=response['object']['id'])
-        get_payment_status(order)
-        return HttpResponse(status=200)
+
+def enqueue_payment_events() -> None:
+    '''постановка обработки событий в очередь; при недоступном брокере событие обработает задача по расписанию'''
+    try:
+        process_payment_events.delay()
+    except (OperationalError, OSError):
+        logger.exception('Payment events processing could not be queued')
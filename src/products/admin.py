@@ -1,12 +1,16 @@
+from datetime import datetime
+import tempfile
+
 from django.contrib import admin
 from django.db.models import QuerySet
 from django import forms
-from django.http import HttpRequest
+from django.http import FileResponse, HttpRequest
 from django.urls import path
 from modeltranslation.admin import TranslationAdmin
 
 from products import admin_filters, models
-from products.views import ProductImportFormView
+from products.services.product_export import export_products
+from products.views import ProductImportFormView, ProductImportProgressView
 
 
 @admin.action(description="Archive selected products")
@@ -27,6 +31,22 @@ def mark_unarchived(
     queryset.update(archived=False)
 
 
+@admin.action(description="Export selected products")
+def export_selected_products(
+        modeladmin: admin.ModelAdmin,
+        request: HttpRequest,
+        queryset: QuerySet,
+):
+    file = tempfile.TemporaryFile()
+    export_products(file, queryset)
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=f'products_{datetime.now():%Y-%m-%d_%H-%M-%S}.zip',
+    )
+
+
 class PictureInline(admin.StackedInline):
     model = models.Picture
     extra = 1
@@ -63,7 +83,8 @@ class PropertyAdmin(TranslationAdmin):
 class ProductAdmin(TranslationAdmin):
     actions = [
         mark_archived,
-        mark_unarchived
+        mark_unarchived,
+        export_selected_products,
     ]
     change_list_template = 'admin/product_change_list.html'
     inlines = [PictureInline]
@@ -99,6 +120,11 @@ class ProductAdmin(TranslationAdmin):
                 ProductImportFormView.as_view(),
                 name='import_products',
             ),
+            path(
+                'product_import-products/progress/',
+                ProductImportProgressView.as_view(),
+                name='import_products_progress',
+            ),
         ]
         return new_urls + urls
 
@@ -146,6 +172,11 @@ class SellerProductAdminModel(admin.ModelAdmin):
                 ProductImportFormView.as_view(),
                 name='import_products',
             ),
+            path(
+                'product_import-products/progress/',
+                ProductImportProgressView.as_view(),
+                name='import_products_progress',
+            ),
         ]
         return new_urls + urls
 
@@ -200,6 +231,8 @@ class ProductImportLogAdmin(admin.ModelAdmin):
         'start',
         'end',
         'file_name',
+        'log_file',
+        'file_hash',
         'message_log',
     ]
     list_display_links = ['id', 'status']
@@ -1,64 +1,98 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Count, Q
+from django.utils.functional import SimpleLazyObject
 
 from products.forms import SearchForm
 from products.models import Category
+from products.services import cache_utils
 from products.services.banners import CacheableContextCategory
+from products.services.dto import StaleSchemaError, pack, unpack
 from discounts.models import Discount
 
 CATEGORIES_KEY = 'header_menu_categories'
+ACTIVE_DISCOUNTS_KEY = 'header_menu_active_discounts'
 
 
 class MenuCategory(CacheableContextCategory):
-    def __init__(self, category: Category):
+    __slots__ = ('icon_url', 'subcategories')
+
+    def __init__(self, category: Category, children: Dict[Optional[int], List[Category]]):
         super().__init__(category)
         self.icon_url = settings.MEDIA_URL + str(
             category.icon,
         ) if category.icon else ''
-        self.subcategories = [MenuCategory(subcategory)
+        self.subcategories = [MenuCategory(subcategory, children)
                               for subcategory
-                              in category.subcategories.filter(
-                                  is_active=True
-                              ).all()]
-
-
-def get_active_discounts_count():
-    count = 0
-    for subclass in Discount.__subclasses__():
-        query = subclass.objects.aggregate(
-            active_count=Count(
-                'active',
-                filter=Q(active=True)
-            )
-        )
-        count += query['active_count']
-    return count
+                              in children[category.pk]]
 
 
-def header_menu(request):
-    menu_categories = cache.get(CATEGORIES_KEY)
+def build_menu_categories() -> List[MenuCategory]:
+    """
+    Построение дерева активных категорий для меню.
+
+    Все активные категории загружаются одним запросом и раскладываются
+    по родительским категориям в памяти. Подкатегории неактивных
+    категорий в меню не попадают.
+    """
+    children = defaultdict(list)
+    for category in Category.objects.filter(is_active=True):
+        children[category.parent_category_id].append(category)
+    return [MenuCategory(category, children)
+            for category in children[None]]
+
+
+def get_menu_categories() -> List[MenuCategory]:
+    """ Получение дерева категорий меню из кэша на активном языке. """
+    categories_key = cache_utils.get_namespaced_key(CATEGORIES_KEY)
+    payload = cache.get(categories_key)
+    if payload is not None:
+        try:
+            return unpack(payload)
+        except StaleSchemaError:
+            pass
+
+    menu_categories = build_menu_categories()
+    cache.set(categories_key, pack(menu_categories))
+    return menu_categories
 
-    if not menu_categories:
-        active_categories = Category.objects.filter(
-            is_active=True,
-            parent_category=None,
-        ).prefetch_related(
-            'subcategories',
-        ).all()
-        menu_categories = [MenuCategory(category)
-                           for category in active_categories]
 
-        cache.set(CATEGORIES_KEY, menu_categories)
+def get_active_discounts_count() -> int:
+    """
+    Получение количества активных скидок всех типов.
 
-    active_discounts = get_active_discounts_count()
+    Количество кэшируется и сбрасывается сигналами при изменении скидок.
+    """
+    count = cache.get(ACTIVE_DISCOUNTS_KEY)
 
+    if count is None:
+        count = sum(subclass.objects.filter(active=True).count()
+                    for subclass in Discount.__subclasses__())
+        cache.set(ACTIVE_DISCOUNTS_KEY, count, timeout=None)
+
+    return count
+
+
+def header_menu(request):
+    """
+    Контекст шапки сайта.
+
+    Категории и количество скидок вычисляются только при обращении
+    к ним из шаблона, поэтому страницы без шапки (например, админка)
+    не обращаются ни к кэшу, ни к БД.
+    """
     return {
-        'categories': menu_categories,
+        'categories': SimpleLazyObject(get_menu_categories),
         'search_form': SearchForm(),
-        'active_discounts': active_discounts,
+        'active_discounts': SimpleLazyObject(get_active_discounts_count),
     }
 
 
 def clear_category_cache():
-    cache.delete(CATEGORIES_KEY)
+    cache_utils.delete_namespaced(CATEGORIES_KEY)
+
+
+def clear_active_discounts_cache():
+    cache.delete(ACTIVE_DISCOUNTS_KEY)
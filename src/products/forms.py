@@ -83,3 +83,16 @@ class ProductsImportForm(forms.Form):
         ),
     )
     email = forms.EmailField(required=False)
+    bulk = forms.BooleanField(
+        required=False,
+        help_text='Stream the json file and insert entries in batches',
+    )
+    sharded = forms.BooleanField(
+        required=False,
+        help_text='Split the archive into shards imported in parallel by several workers',
+    )
+    upsert = forms.BooleanField(
+        required=False,
+        help_text='Update existing products by slug and seller products by seller and product, '
+                  'skipping unchanged entries',
+    )
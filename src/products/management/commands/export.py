@@ -0,0 +1,42 @@
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from products.services.product_export import export_products
+
+
+class Command(BaseCommand):
+    help = "Export products data into a zip-archive in the product_import format"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o',
+            '--output',
+            required=False,
+            help='Specify a zip-archive file to export to',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            required=False,
+            help='Amount of entries read from the database at once',
+        )
+
+    def handle(self, *args, **options):
+        output = options.get('output')
+        if output:
+            output = Path(output)
+        else:
+            output = Path(settings.EXPORT_DIR).joinpath(
+                f'products_{datetime.now():%Y-%m-%d_%H-%M-%S}.zip',
+            )
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(f'Begin product export to {output}')
+        counts = export_products(output, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Exported {products} products, {seller_products} seller products '
+            'and {images} product images'.format(**counts)
+        ))
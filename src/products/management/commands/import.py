@@ -1,9 +1,10 @@
 import pathlib
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
-from products.tasks import import_products
+from products.services.product_import.product_importer import ProductImporter
+from products.tasks import schedule_pending_imports
 
 
 class Command(BaseCommand):
@@ -24,6 +25,32 @@ class Command(BaseCommand):
             nargs='?',
             help='Specify an admin email to send a notification',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Stream the json file and insert entries in batches',
+        )
+        parser.add_argument(
+            '--sharded',
+            action='store_true',
+            help='Split archives into shards imported in parallel by several workers',
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Update existing products and seller products, skipping unchanged entries',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the archives without writing anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            required=False,
+            help='Amount of entries inserted at once in bulk mode',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Begin product product_import')
@@ -38,7 +65,7 @@ class Command(BaseCommand):
 
             try:
                 files = [f for f in pathlib.Path(pending_imports_dir).iterdir()
-                         if f.is_file()]
+                         if f.is_file() and f.suffix == '.zip']
             except FileNotFoundError:
                 self.stdout.write(
                     self.style.ERROR('Import category doesn\'t exist')
@@ -47,9 +74,34 @@ class Command(BaseCommand):
 
         email = options.get('email')
 
-        if files:
-            for file in files:
-                import_products.delay(file.as_posix(), email)
-            self.stdout.write(f'{len(files)} file(s) added to product_import query')
+        if files and options['dry_run']:
+            invalid = [
+                file.name for file in files
+                if not ProductImporter(
+                    file.as_posix(),
+                    email=email,
+                    batch_size=options['batch_size'],
+                    upsert=options['upsert'],
+                    dry_run=True,
+                ).valid
+            ]
+            if invalid:
+                raise CommandError(f'Validation failed for {", ".join(invalid)}')
+            self.stdout.write(self.style.SUCCESS(f'{len(files)} file(s) are valid'))
+        elif files:
+            scheduled = schedule_pending_imports(
+                [file.name for file in files],
+                email=email or '',
+                bulk=options['bulk'],
+                batch_size=options['batch_size'],
+                sharded=options['sharded'],
+                upsert=options['upsert'],
+            )
+            self.stdout.write(f'{scheduled} file(s) added to product_import query')
+            if scheduled < len(files):
+                self.stdout.write(self.style.WARNING(
+                    f'{len(files) - scheduled} file(s) were skipped as duplicates '
+                    f'or left pending until an import slot is free'
+                ))
         else:
             self.stdout.write(self.style.WARNING('No files to product_import'))
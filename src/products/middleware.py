@@ -0,0 +1,47 @@
+from products.services.cache_utils import track_deferred_builds
+from products.services.page_cache import PageState, cache_page, get_cached_page, get_page_tags, is_anonymous_request
+
+
+class AnonymousPageCacheMiddleware:
+    """
+        Кэш и условные ответы страниц для анонимных посетителей.
+
+        Обрабатываются только страницы из настройки PAGE_CACHE_VIEWS.
+        До вызова view по версиям тегов страницы проверяются заголовки
+        If-None-Match и If-Modified-Since и при совпадении сразу отдаётся
+        ответ 304, иначе страница отдаётся из кэша. В обоих случаях
+        не выполняются ни view, ни контекстные процессоры, ни рендеринг
+        шаблона. Страницы сбрасываются сменой версий их тегов при изменении
+        моделей. Страница не кэшируется, если при её построении часть
+        данных из кэша (например, баннеры) ещё строилась другим процессом.
+
+        Должен стоять в MIDDLEWARE после SessionMiddleware, LocaleMiddleware
+        и CsrfViewMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_deferred_builds() as deferred:
+            response = self.get_response(request)
+        request._page_cache_deferred = bool(deferred)
+
+        page = getattr(request, '_page_state', None)
+        if page is not None:
+            if not request._page_cache_hit and not request._page_cache_deferred:
+                cache_page(request, response, page.key)
+            page.set_validators(response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not is_anonymous_request(request):
+            return None
+        tags = get_page_tags(request)
+        if tags is None:
+            return None
+
+        page = PageState(request, tags)
+        request._page_state = page
+        response = page.get_not_modified(request) or get_cached_page(request, page.key)
+        request._page_cache_hit = response is not None
+        return response
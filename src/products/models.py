@@ -3,8 +3,10 @@ from decimal import Decimal
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from django_cleanup import cleanup
 
 from products.services import product_utils
+from products.storage import ContentAddressedStorage
 from products.validators import validate_not_subcategory
 
 
@@ -43,7 +45,9 @@ class Product(models.Model):
     count_sells - количество проданных единиц товара;
     archived - флаг архивирования (мягкого удаления) товара;
     sort_index - индекс сортировки товара;
-    limited - флаг ограниченного количества товара.
+    limited - флаг ограниченного количества товара;
+    import_hash - хэш содержимого записи импорта, из которой товар был создан или обновлён;
+    primary_image - основное изображение товара для карточек и списков.
     """
     category = models.ForeignKey(
         "Category",
@@ -58,6 +62,15 @@ class Product(models.Model):
     archived = models.BooleanField(default=False)
     sort_index = models.IntegerField(default=0)
     limited = models.BooleanField(default=False)
+    import_hash = models.CharField(max_length=64, blank=True, editable=False)
+    primary_image = models.ForeignKey(
+        'Picture',
+        related_name='+',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
 
     tags = models.ManyToManyField(
         'Tag',
@@ -72,6 +85,11 @@ class Product(models.Model):
         ordering = ['sort_index', 'name']
         indexes = [
             models.Index(fields=['name', 'slug']),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(limited=True, archived=False),
+                name='product_limited_idx',
+            ),
         ]
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
@@ -123,11 +141,13 @@ def product_images_directory_path(
         instance: "ProductImage",
         filename: str
 ) -> str:
-    """Сгенерировать путь для сохранения изображения продукта."""
-    return "products/images/product_{pk}/{filename}".format(
-        pk=instance.product.pk,
-        filename=filename,
-    )
+    """
+    Сгенерировать путь для сохранения изображения продукта.
+
+    Хранилище ContentAddressedStorage заменяет имя файла хэшем его содержимого,
+    поэтому одинаковые изображения разных товаров хранятся одним файлом.
+    """
+    return "products/images/{filename}".format(filename=filename)
 
 
 def category_images_directory_path(
@@ -152,19 +172,26 @@ def category_icons_directory_path(
     )
 
 
+@cleanup.ignore
 class Picture(models.Model):
     """
     Модель изображения продукта.
 
     product - связь с продуктом, к которому относится изображение;
-    image - файл изображения.
+    image - файл изображения, общий для изображений с одинаковым содержимым;
+    thumbnails_ready - созданы ли миниатюры изображения.
     """
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
         related_name='images',
     )
-    image = models.ImageField(upload_to=product_images_directory_path)
+    image = models.ImageField(
+        upload_to=product_images_directory_path,
+        storage=ContentAddressedStorage(),
+        db_index=True,
+    )
+    thumbnails_ready = models.BooleanField(default=False, editable=False)
 
 
 class SellerProduct(models.Model):
@@ -175,7 +202,8 @@ class SellerProduct(models.Model):
     product - связь с продуктами;
     seller - связь с продавцами;
     count - количество товаров в наличии;
-    price - цена товара у данного продавца.
+    price - цена товара у данного продавца;
+    import_hash - хэш содержимого записи импорта, из которой запись была создана или обновлена.
     """
     product = models.ForeignKey(
         Product,
@@ -188,9 +216,13 @@ class SellerProduct(models.Model):
     )
     count = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    import_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     class Meta:
         ordering = ['seller', 'product']
+        indexes = [
+            models.Index(fields=['seller', 'product']),
+        ]
         verbose_name = _('Seller product')
         verbose_name_plural = _('Seller products')
 
@@ -310,6 +342,9 @@ class ProductImportLog(models.Model):
     items_imported = models.PositiveIntegerField(default=0)
     file_name = models.CharField(null=True, blank=True, max_length=200)
     message_log = models.TextField(null=True, blank=True)
+    log_file = models.CharField(null=True, blank=True, max_length=500)
+    progress = models.JSONField(null=True, blank=True)
+    file_hash = models.CharField(blank=True, max_length=64, db_index=True, editable=False)
 
     class Meta:
         verbose_name = _('Product import log')
@@ -1,38 +1,48 @@
 from abc import ABC
 import datetime
-import random
-from typing import Dict, List
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from django.conf import settings
-from django.core.cache import cache
-from django.db.models import Count, Min, Q
+from django.db.models import Exists, Min, OuterRef, QuerySet
+from django.utils import translation
+from kombu.exceptions import OperationalError
 
-from products.models import Category, Product
+from products.models import Category, Product, SellerProduct
+from products.services import cache_utils
+from products.services.dto import CacheableDTO
+from products.services.sampling import sample
+from products.services.thumbnails import get_thumbnail
 
 
 FIXED_KEY = 'index_banners_fixed'
 SLIDER_KEY = 'index_banners_slider'
 TOP_SELLERS_KEY = 'index_top_sellers'
 LIMITED_OFFERS_KEY = 'index_limited_offer'
-TIMED_LIMITED_OFFER_KEY = 'index_timed_limited_offer'
+SLIDER_DESCRIPTION_LENGTH = 210
 
+logger = logging.getLogger(__name__)
 
-class CacheableContextProduct(ABC):
+
+class CacheableContextProduct(CacheableDTO, ABC):
     """
         Базовый DTO с информацией о продукте.
 
         Пригодный для кэширования.
     """
+    __slots__ = ('pk', 'name', 'absolute_url', 'image')
+
     def __init__(self, product: Product):
         self.pk = product.pk
         self.name = product.name
         self.absolute_url = product.get_absolute_url()
-        image = product.images.all()[0].image
-        self.image_url = settings.MEDIA_URL + str(image) if image else ''
+        self.image = get_thumbnail(product.primary_image)
 
 
 class ProductPreviewCard(CacheableContextProduct):
     """ DTO с информацией о продукте для preview карточки. """
+    __slots__ = ('category', 'price', 'discounted_price')
+
     def __init__(self, product: Product):
         super().__init__(product)
         self.category = product.category.full_name
@@ -40,12 +50,14 @@ class ProductPreviewCard(CacheableContextProduct):
         self.discounted_price = product.discounted_min_price
 
 
-class CacheableContextCategory:
+class CacheableContextCategory(CacheableDTO):
     """
         Базовый DTO с информацией о категории продукта.
 
         Пригодный для кэширования.
     """
+    __slots__ = ('name', 'absolute_url')
+
     def __init__(self, category: Category):
         self.name = category.name
         self.absolute_url = category.get_absolute_url()
@@ -58,153 +70,129 @@ class Banner:
         Баннеры-слайдеры товаров и баннеры категорий.
     """
     class SliderProduct(CacheableContextProduct):
-        """ DTO с информаций о товаре для баннера-слайдера. """
+        """
+            DTO с информаций о товаре для баннера-слайдера.
+
+            Хранит только начало описания, которого хватает для truncate(200) в шаблоне.
+        """
+        __slots__ = ('description',)
+
         def __init__(self, product: Product):
             super().__init__(product)
-            self.description = product.description
+            self.description = (product.description or '')[:SLIDER_DESCRIPTION_LENGTH]
 
     class BannerCategory(CacheableContextCategory):
         """ DTO с информацией о категории для баннера. """
+        __slots__ = ('min_price', 'image')
+
         def __init__(self, category: Category):
             super().__init__(category)
             sample = category.products.filter(
                 archived=False,
             ).annotate(
                 min=Min('sellerproduct__price'),
-            ).order_by('min').prefetch_related('images').first()
+            ).order_by('min').select_related('primary_image').first()
             self.min_price = sample.discounted_min_price
-            self.image_url = sample.images.first().image.url
-
-    def __init__(self, fixed_amount=3, slider_amount=3):
-        self.fixed = cache.get(FIXED_KEY)
-
-        if not self.fixed:
-            categories = Category.objects.annotate(
-                    num_products=Count('products', filter=Q(
-                        products__archived=False))
-                ).filter(is_active=True, num_products__gt=0).all()
-
-            if categories:
-                random_categories = random.sample(
-                    list(categories),
-                    k=fixed_amount,
-                )
-
-                self.fixed = [self.BannerCategory(category)
-                              for category in random_categories]
-
-                cache.set(FIXED_KEY, self.fixed)
-
-        self.slider = cache.get(SLIDER_KEY)
-
-        if not self.slider:
-            products = Product.objects.annotate(
-                seller_count=Count('sellerproduct')
-            ).filter(
-                    archived=False,
-                    category__is_active=True,
-                    seller_count__gt=0,
-                ).prefetch_related('images').all()
-            if products:
-                random_products = random.sample(
-                    list(products),
-                    k=slider_amount,
-                )
+            self.image = get_thumbnail(sample.primary_image)
+
+    def __init__(self):
+        self.fixed = get_cached_banner(FIXED_KEY)
+        self.slider = get_cached_banner(SLIDER_KEY)
+
+    @classmethod
+    def build_fixed(cls, amount: int = 3) -> List['Banner.BannerCategory']:
+        """ Построение баннеров случайных категорий. """
+        categories = Category.objects.filter(
+            Exists(Product.objects.filter(category=OuterRef('pk'), archived=False)),
+            is_active=True,
+        )
+        return [cls.BannerCategory(category)
+                for category in sample(categories, amount)]
 
-                self.slider = [self.SliderProduct(product)
-                               for product in random_products]
-                cache.set(SLIDER_KEY, self.slider)
+    @classmethod
+    def build_slider(cls, amount: int = 3) -> List['Banner.SliderProduct']:
+        """ Построение баннеров-слайдеров случайных товаров. """
+        products = get_available_products().select_related('primary_image')
+        return [cls.SliderProduct(product)
+                for product in sample(products, amount)]
 
 
 class TopSellerProduct(ProductPreviewCard):
     """ DTO с информацией о товаре для preview карточки популярного товара. """
+    __slots__ = ()
+
     def __init__(self, product: Product):
         super().__init__(product)
 
     @staticmethod
-    def get_top_sellers(amount : int = 8) -> List['TopSellerProduct']:
+    def get_top_sellers() -> List['TopSellerProduct']:
         """ Получение списка preview карточек популярных товаров. """
-        top_sellers = cache.get(TOP_SELLERS_KEY)
+        return get_cached_banner(TOP_SELLERS_KEY) or []
 
-        if not top_sellers:
-            products = Product.objects.annotate(
-                seller_count=Count('sellerproduct')
-            ).filter(
-                archived=False,
-                category__is_active=True,
-                seller_count__gt=0,
-            ).order_by(
-                '-sort_index',
-                '-count_sells',
-            ).select_related(
-                'category',
-            ).prefetch_related('images').all()[:amount]
-            top_sellers = [TopSellerProduct(product)
-                           for product in products]
-            cache.set(TOP_SELLERS_KEY, top_sellers)
-
-        return top_sellers
+    @staticmethod
+    def build_top_sellers(amount: int = 8) -> List['TopSellerProduct']:
+        """ Построение списка preview карточек популярных товаров. """
+        products = get_available_products().order_by(
+            '-sort_index',
+            '-count_sells',
+        ).select_related(
+            'category',
+            'primary_image',
+        ).all()[:amount]
+        return [TopSellerProduct(product)
+                for product in products]
 
 
 class LimitedProduct(ProductPreviewCard):
     """ DTO с информацией о товаре для карточки лимитированного товара. """
+    __slots__ = ('end_time',)
+
     def __init__(self, product: Product):
         super().__init__(product)
+        self.end_time = None
 
     @staticmethod
-    def get_limited_offers(
-            amount: int = 16,
-    ) -> Dict[str, List['LimitedProduct']]:
+    def get_limited_offers() -> Dict[str, Any]:
         """ Получение карточек лимитированных товаров. """
-        limited_offers = cache.get(LIMITED_OFFERS_KEY)
-        timed_limited_offer = cache.get(TIMED_LIMITED_OFFER_KEY)
+        limited_offers = get_cached_banner(LIMITED_OFFERS_KEY) or {}
 
         result = {}
-        if not limited_offers or not timed_limited_offer:
-            products = Product.objects.annotate(
-                seller_count=Count('sellerproduct')
-            ).filter(
-                archived=False,
-                category__is_active=True,
-                seller_count__gt=0,
-                limited=True,
-            )
-            if timed_limited_offer and not limited_offers:
-                products = products.exclude(pk=timed_limited_offer.pk)
-
-            products = products.select_related(
-                'category',
-            ).prefetch_related('images').all()
-
-            products = list(products)
-
-            if not timed_limited_offer and products:
-                product = random.choice(products)
-                products.remove(product)
-                timed_limited_offer = LimitedProduct(product)
-                cache.set(TIMED_LIMITED_OFFER_KEY, timed_limited_offer)
-
-            if products:
-                if len(products) > amount:
-                    products = random.choices(products, k=amount)
-                limited_offers = [LimitedProduct(product)
-                                  for product in products]
-                end_time = LimitedProduct._get_limited_offer_end_time()
-                seconds_until_end_time = (end_time - datetime.datetime.now()).seconds
-                cache.set(
-                    LIMITED_OFFERS_KEY,
-                    limited_offers,
-                    timeout=seconds_until_end_time,
-                )
-
-        if limited_offers:
-            result['regular'] = limited_offers
+        if limited_offers.get('regular'):
+            result['regular'] = limited_offers['regular']
+        timed_limited_offer = limited_offers.get('timed')
         if timed_limited_offer:
-            end_time = LimitedProduct._get_limited_offer_end_time()
-            timed_limited_offer.end_time = end_time
+            timed_limited_offer.end_time = LimitedProduct._get_limited_offer_end_time()
             result['timed'] = timed_limited_offer
         return result
 
+    @staticmethod
+    def build_limited_offers(amount: int = 16) -> Dict[str, Any]:
+        """
+        Построение карточек лимитированных товаров.
+
+        Один случайный товар становится предложением дня, остальные
+        выбираются случайно среди оставшихся.
+        """
+        products = get_available_products().filter(
+            limited=True,
+        ).select_related(
+            'category',
+            'primary_image',
+        )
+
+        products = [LimitedProduct(product)
+                    for product in sample(products, amount + 1)]
+        return {
+            'timed': products[0] if products else None,
+            'regular': products[1:],
+        }
+
+    @staticmethod
+    def get_limited_offers_timeout() -> int:
+        """ Получение времени жизни кэша лимитированных товаров - до конца дня. """
+        end_time = LimitedProduct._get_limited_offer_end_time()
+        return (end_time - datetime.datetime.now()).seconds
+
     @staticmethod
     def _get_limited_offer_end_time() -> datetime.datetime:
         """ Получение времени окончания действия временного баннера. """
@@ -215,10 +203,92 @@ class LimitedProduct(ProductPreviewCard):
         )
 
 
+def get_available_products() -> QuerySet:
+    """ Получение queryset товаров, которые можно показывать в баннерах. """
+    return Product.objects.filter(
+        Exists(SellerProduct.objects.filter(product=OuterRef('pk'))),
+        archived=False,
+        category__is_active=True,
+    )
+
+
+BANNER_BUILDERS: Dict[str, Tuple[Callable[[], Any], Callable[[], int]]] = {
+    FIXED_KEY: (Banner.build_fixed, lambda: settings.BANNERS_CACHE_TIMEOUT),
+    SLIDER_KEY: (Banner.build_slider, lambda: settings.BANNERS_CACHE_TIMEOUT),
+    TOP_SELLERS_KEY: (TopSellerProduct.build_top_sellers, lambda: settings.BANNERS_CACHE_TIMEOUT),
+    LIMITED_OFFERS_KEY: (LimitedProduct.build_limited_offers, LimitedProduct.get_limited_offers_timeout),
+}
+
+
+def get_cached_banner(key: str) -> Optional[Any]:
+    """
+    Получение баннеров главной страницы из кэша.
+
+    Баннеры заранее строятся задачей refresh_banners по расписанию
+    для каждого языка, а при приближении истечения пересчитываются задачей
+    в фоне, поэтому запрос строит баннеры сам, только если кэш пуст,
+    и только один. Если задачу не удалось поставить в очередь, блокировка
+    снимается и запрос получает текущее значение.
+    """
+    from products.tasks import refresh_banners
+
+    builder, timeout = BANNER_BUILDERS[key]
+    language = translation.get_language()
+    def schedule_refresh(stale_key: str) -> None:
+        try:
+            refresh_banners.delay([key], language)
+        except (OperationalError, OSError):
+            logger.exception('Banner %s refresh could not be scheduled', stale_key)
+            cache_utils.release_lock(stale_key)
+
+    return cache_utils.get_or_build(
+        cache_utils.get_namespaced_key(key, language),
+        builder,
+        timeout,
+        schedule_refresh,
+    )
+
+
+def refresh_banner_cache(keys: List[str] = None, ahead: int = None, language: str = None) -> List[str]:
+    """
+    Пересчёт баннеров главной страницы в кэше.
+
+    Ошибка построения одного баннера не мешает пересчёту остальных,
+    блокировка каждого ключа снимается в любом случае.
+
+    Args:
+        keys (List[str]): ключи баннеров, блокировка пересчёта которых уже взята
+            при чтении из кэша; они пересчитываются безусловно,
+        ahead (int): если ключи не переданы, пересчитываются баннеры, которые
+            истекут в течение ahead секунд, по умолчанию BANNERS_PREWARM_AHEAD,
+        language (str): язык баннеров, по умолчанию все языки сайта.
+
+    Returns:
+        Пересчитанные ключи с пространством имён языка.
+    """
+    ahead = settings.BANNERS_PREWARM_AHEAD if ahead is None else ahead
+    refreshed = []
+    for code in [language] if language else cache_utils.get_languages():
+        with translation.override(code):
+            for key in BANNER_BUILDERS if keys is None else keys:
+                namespaced_key = cache_utils.get_namespaced_key(key)
+                if keys is None and not (
+                        cache_utils.expires_in(namespaced_key) <= ahead
+                        and cache_utils.acquire_lock(namespaced_key)):
+                    continue
+
+                builder, timeout = BANNER_BUILDERS[key]
+                try:
+                    cache_utils.build(namespaced_key, builder, timeout())
+                except Exception:
+                    logger.exception('Banner %s refresh failed', namespaced_key)
+                    continue
+                finally:
+                    cache_utils.release_lock(namespaced_key)
+                refreshed.append(namespaced_key)
+    return refreshed
+
+
 def clear_banner_cache() -> None:
-    """ Функция для очистки кэша баннеров """
-    cache.delete(FIXED_KEY)
-    cache.delete(SLIDER_KEY)
-    cache.delete(TOP_SELLERS_KEY)
-    cache.delete(LIMITED_OFFERS_KEY)
-    cache.delete(TIMED_LIMITED_OFFER_KEY)
+    """ Функция для очистки кэша баннеров на всех языках """
+    cache_utils.delete_namespaced(*BANNER_BUILDERS)
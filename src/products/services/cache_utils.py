@@ -0,0 +1,212 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import random
+import time
+import uuid
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+from products.services.dto import StaleSchemaError, pack, unpack
+
+LOCK_KEY = '{key}_lock'
+NAMESPACED_KEY = '{language}:{key}'
+TAG_VERSION_KEY = 'tag_version_{tag}'
+
+_deferred_builds: ContextVar[Optional[List[str]]] = ContextVar('cache_deferred_builds', default=None)
+
+
+def get_or_build(
+        key: str,
+        builder: Callable[[], Any],
+        timeout: Callable[[], int],
+        schedule_refresh: Callable[[str], None],
+        default: Any = None,
+) -> Any:
+    """
+    Получить значение из кэша с защитой от одновременного пересчёта.
+
+    Значение хранится вместе со временем истечения и длительностью
+    построения. Незадолго до истечения значение с растущей вероятностью
+    считается устаревшим (probabilistic early recompute), тогда один процесс,
+    взявший блокировку, ставит пересчёт в очередь schedule_refresh,
+    а все запросы продолжают получать текущее значение. Устаревшее
+    значение хранится в кэше ещё CACHE_REBUILD_GRACE секунд.
+
+    Если значения в кэше нет или оно сохранено в устаревшей схеме DTO,
+    его строит только процесс, взявший блокировку, остальные сразу
+    получают default.
+
+    Args:
+        key (str): ключ кэша,
+        builder (Callable): функция построения значения,
+        timeout (Callable): функция, возвращающая время жизни значения в секундах,
+        schedule_refresh (Callable): функция, ставящая пересчёт ключа в очередь
+            и снимающая блокировку по его завершении,
+        default (Any): значение, возвращаемое, пока значение строит другой процесс.
+    """
+    entry = get_entry(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        early = delta * settings.CACHE_REBUILD_BETA * math.log(1 - random.random())
+        if time.time() - early < expires_at:
+            return value
+        if acquire_lock(key):
+            schedule_refresh(key)
+        return value
+
+    if not acquire_lock(key):
+        deferred = _deferred_builds.get()
+        if deferred is not None:
+            deferred.append(key)
+        return default
+    try:
+        return build(key, builder, timeout())
+    finally:
+        release_lock(key)
+
+
+@contextmanager
+def track_deferred_builds() -> Iterator[List[str]]:
+    """
+    Отслеживать ключи, для которых get_or_build вернул default,
+    потому что значение строит другой процесс.
+
+    Используется, чтобы не кэшировать страницу, построенную без этих значений.
+    """
+    deferred = []
+    token = _deferred_builds.set(deferred)
+    try:
+        yield deferred
+    finally:
+        _deferred_builds.reset(token)
+
+
+def build(key: str, builder: Callable[[], Any], timeout: int) -> Any:
+    """
+    Построить значение и сохранить его в кэш вместе со временем истечения.
+
+    Args:
+        key (str): ключ кэша,
+        builder (Callable): функция построения значения,
+        timeout (int): время жизни значения в секундах.
+    """
+    start = time.time()
+    value = builder()
+    delta = time.time() - start
+    cache.set(
+        key,
+        (pack(value), start + delta + timeout, delta),
+        timeout=timeout + settings.CACHE_REBUILD_GRACE,
+    )
+    return value
+
+
+def get_entry(key: str) -> Optional[Tuple[Any, float, float]]:
+    """
+    Получить из кэша значение, время его истечения и длительность построения.
+
+    Значение в устаревшей схеме DTO считается отсутствующим.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    payload, expires_at, delta = entry
+    try:
+        return unpack(payload), expires_at, delta
+    except StaleSchemaError:
+        return None
+
+
+def expires_in(key: str) -> float:
+    """ Получить количество секунд до истечения значения в кэше, 0 если значения нет. """
+    entry = get_entry(key)
+    if entry is None:
+        return 0
+    return max(entry[1] - time.time(), 0)
+
+
+def acquire_lock(key: str) -> bool:
+    """ Взять блокировку пересчёта ключа кэша. """
+    return cache.add(LOCK_KEY.format(key=key), True, timeout=settings.CACHE_REBUILD_LOCK_TIMEOUT)
+
+
+def release_lock(key: str) -> None:
+    """ Снять блокировку пересчёта ключа кэша. """
+    cache.delete(LOCK_KEY.format(key=key))
+
+
+def get_namespaced_key(key: str, language: str = None) -> str:
+    """
+    Получить ключ кэша в пространстве имён языка.
+
+    Значения, зависящие от языка (переведённые названия, ссылки с префиксом
+    языка), хранятся отдельно для каждого языка, поэтому при смене языка
+    кэш не нужно сбрасывать.
+
+    Args:
+        key (str): ключ кэша без языка,
+        language (str): код языка, по умолчанию активный язык.
+    """
+    language = language or translation.get_language() or settings.LANGUAGE_CODE
+    return NAMESPACED_KEY.format(language=language, key=key)
+
+
+def get_languages() -> List[str]:
+    """ Получить коды всех языков сайта. """
+    return [code for code, _ in settings.LANGUAGES]
+
+
+def delete_namespaced(*keys: str) -> None:
+    """ Удалить ключи кэша во всех языковых пространствах имён. """
+    cache.delete_many([
+        get_namespaced_key(key, language)
+        for key in keys
+        for language in get_languages()
+    ])
+
+
+def get_tag_versions(tags: List[str]) -> List[str]:
+    """
+    Получить текущие версии тегов кэша одним запросом к кэшу.
+
+    Версия тега входит в ключи зависящих от него значений и меняется
+    при изменении данных, поэтому старые значения перестают читаться
+    и удаляются кэшем по истечении времени жизни. Версия начинается
+    со времени её создания, см. get_versions_timestamp.
+
+    Args:
+        tags (List[str]): теги, например 'catalog' или 'product:<slug>'.
+    """
+    keys = [TAG_VERSION_KEY.format(tag=tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_tag_version()
+            cache.add(key, version, timeout=None)
+            versions[key] = cache.get(key) or version
+    return [versions[key] for key in keys]
+
+
+def get_versions_timestamp(versions: List[str]) -> int:
+    """ Получить время последнего изменения тегов по их версиям. """
+    return max(int(version.partition('.')[0]) for version in versions)
+
+
+def invalidate_tags(*tags: str) -> None:
+    """ Сменить версии тегов кэша, сделав недоступными все зависящие от них значения. """
+    version = _new_tag_version()
+    cache.set_many({TAG_VERSION_KEY.format(tag=tag): version for tag in tags}, timeout=None)
+
+
+def _new_tag_version() -> str:
+    """
+    Получить новую версию тега: время создания и случайная часть.
+
+    Случайная часть вместо счётчика гарантирует, что после очистки
+    кэша версии не повторят уже выданные клиентам.
+    """
+    return f'{int(time.time())}.{uuid.uuid4().hex}'
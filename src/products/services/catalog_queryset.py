@@ -46,7 +46,7 @@ class CatalogQuerySetProcessor:
         sort = self.__get_selected_sort_type(request)
         products_list = self.__get_sorted_queryset(products_list, sort)
 
-        return products_list
+        return products_list.select_related('primary_image')
 
     def __get_base_queryset(self, request) -> QuerySet:
         """ Получение базового queryset для дальнейшей работы. """
@@ -0,0 +1,93 @@
+import hashlib
+from typing import Any, Dict, Tuple, Type
+
+SCHEMA_VERSION = 1
+DTO_TYPES: Dict[str, Type['CacheableDTO']] = {}
+
+
+class StaleSchemaError(ValueError):
+    """ Данные в кэше сохранены в другой версии схемы DTO. """
+
+
+class CacheableDTO:
+    """
+        Базовый DTO для хранения в кэше.
+
+        Наследники объявляют поля в __slots__, полный список полей
+        с учётом родителей собирается в fields. В кэш DTO сохраняется
+        кортежем из схемы класса и значений полей (см. pack). Схема -
+        имя класса и короткий хэш имён и порядка полей, поэтому в кэше
+        нет ссылок на классы, а добавление, удаление, переименование
+        или перестановка полей не ломает чтение старых значений,
+        а приводит к их пересчёту.
+    """
+    __slots__ = ()
+    fields: Tuple[str, ...] = ()
+    schema: str = ''
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.fields = tuple(
+            field
+            for klass in reversed(cls.__mro__)
+            for field in klass.__dict__.get('__slots__', ())
+        )
+        fingerprint = hashlib.md5(','.join(cls.fields).encode()).hexdigest()[:8]
+        cls.schema = f'{cls.__qualname__}:{fingerprint}'
+        DTO_TYPES[cls.schema] = cls
+
+
+def pack(value: Any) -> Tuple[int, Any]:
+    """
+    Упаковать значение для сохранения в кэш.
+
+    DTO заменяются кортежами (схема класса, значения полей...), списки
+    и словари упаковываются рекурсивно, остальные значения сохраняются
+    как есть. Результат содержит только встроенные типы и Decimal.
+
+    Args:
+        value (Any): DTO, список или словарь DTO либо простое значение.
+
+    Returns:
+        Кортеж из версии схемы и упакованного значения.
+    """
+    return SCHEMA_VERSION, _encode(value)
+
+
+def unpack(payload: Any) -> Any:
+    """
+    Распаковать значение, сохранённое pack.
+
+    Raises:
+        StaleSchemaError: значение сохранено в другой версии схемы
+            или не соответствует текущим DTO.
+    """
+    if not isinstance(payload, tuple) or len(payload) != 2 or payload[0] != SCHEMA_VERSION:
+        raise StaleSchemaError('Unknown cache payload schema')
+    return _decode(payload[1])
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, CacheableDTO):
+        return (value.schema, *(_encode(getattr(value, field, None)) for field in value.fields))
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, tuple):
+        dto_type = DTO_TYPES.get(value[0])
+        if dto_type is None or len(value) != len(dto_type.fields) + 1:
+            raise StaleSchemaError(f'Unknown DTO {value[0]}')
+        dto = dto_type.__new__(dto_type)
+        for field, item in zip(dto_type.fields, value[1:]):
+            setattr(dto, field, _decode(item))
+        return dto
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    return value
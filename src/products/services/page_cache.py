@@ -0,0 +1,133 @@
+import hashlib
+import re
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+
+from products.services import cache_utils
+
+PAGE_KEY = 'page_{digest}'
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+CSRF_INPUT_RE = re.compile(r'''(name=['"]csrfmiddlewaretoken['"] value=['"])[^'"]*''')
+
+
+def get_page_tags(request: HttpRequest) -> Optional[List[str]]:
+    """
+    Получить теги кэша страницы по настройке PAGE_CACHE_VIEWS.
+
+    Теги могут содержать параметры url, например 'product:{slug}'.
+
+    Returns:
+        Теги страницы или None, если страница не кэшируется.
+    """
+    match = request.resolver_match
+    tags = settings.PAGE_CACHE_VIEWS.get(match.view_name) if match else None
+    if tags is None:
+        return None
+    return [tag.format(**match.kwargs) for tag in tags]
+
+
+def is_anonymous_request(request: HttpRequest) -> bool:
+    """
+    Проверка, что ответ на запрос не зависит от посетителя.
+
+    Кэшированная страница отдаётся только запросам без cookie сессии
+    и flash-сообщений: в сессии хранятся авторизация, корзина, список
+    сравнения и фильтры каталога. Проверка не обращается к хранилищу
+    сессий и БД.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and 'messages' not in request.COOKIES
+    )
+
+
+class PageState:
+    """
+        Состояние кэшируемой страницы для текущего запроса.
+
+        Строится по пути, параметрам запроса в каноническом порядке,
+        активному языку и текущим версиям тегов страницы, без обращения
+        к БД. Содержит ключ кэша страницы и валидаторы условных запросов:
+        strong ETag и время последнего изменения тегов.
+    """
+    def __init__(self, request: HttpRequest, tags: List[str]):
+        query = urlencode(sorted(
+            (name, value)
+            for name, values in request.GET.lists()
+            for value in values
+        ))
+        versions = cache_utils.get_tag_versions(tags)
+        stamp = '|'.join([request.path, query, *versions])
+        digest = hashlib.md5(stamp.encode()).hexdigest()
+
+        self.key = cache_utils.get_namespaced_key(PAGE_KEY.format(digest=digest))
+        self.etag = quote_etag(self.key.replace(':', '-'))
+        self.last_modified = cache_utils.get_versions_timestamp(versions)
+
+    def get_not_modified(self, request: HttpRequest) -> Optional[HttpResponse]:
+        """ Получить ответ 304, если у клиента актуальная версия страницы. """
+        return get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+
+    def set_validators(self, response: HttpResponse) -> None:
+        """
+        Добавить в ответ ETag и Last-Modified страницы.
+
+        Ответ помечается private и no-cache с Vary по cookie и языку, чтобы
+        браузер и прокси всегда проверяли страницу и не показали анонимную
+        версию после входа или наполнения корзины. Страница из кэша
+        не обращается к сессии, поэтому Vary: Cookie добавляется явно.
+        """
+        if response.status_code in (200, 304) and not response.has_header('ETag'):
+            response['ETag'] = self.etag
+            response['Last-Modified'] = http_date(self.last_modified)
+            patch_cache_control(response, no_cache=True, private=True)
+            patch_vary_headers(response, ('Cookie', 'Accept-Language'))
+
+
+def get_cached_page(request: HttpRequest, key: str) -> Optional[HttpResponse]:
+    """
+    Получить кэшированную страницу.
+
+    CSRF токен в формах страницы заменяется на токен текущего посетителя.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    content, content_type = entry
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(content, content_type=content_type)
+
+
+def cache_page(request: HttpRequest, response: HttpResponse, key: str) -> bool:
+    """
+    Сохранить страницу в кэш, если ответ одинаков для всех анонимных посетителей.
+
+    Не сохраняются ответы с ошибкой, с установленными cookie, с запретом
+    кэширования и ответы, при построении которых изменилась сессия.
+    CSRF токены форм заменяются заглушкой.
+
+    Returns:
+        Была ли страница сохранена.
+    """
+    if (
+        request.method != 'GET'
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or 'no-store' in response.get('Cache-Control', '')
+        or 'private' in response.get('Cache-Control', '')
+        or getattr(request, 'session', None) is not None and request.session.modified
+    ):
+        return False
+
+    content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}', response.content.decode(response.charset))
+    cache.set(key, (content, response['Content-Type']), timeout=settings.PAGE_CACHE_TIMEOUT)
+    return True
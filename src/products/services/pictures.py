@@ -0,0 +1,76 @@
+import logging
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from kombu.exceptions import OperationalError
+
+from products.models import Picture, Product
+from products.services.thumbnails import THUMBNAIL_FORMATS, get_thumbnail_name
+
+logger = logging.getLogger(__name__)
+
+
+def update_primary_images(product_ids: Iterable[int] = None, reset: bool = False) -> int:
+    """
+    Сервис для заполнения основного изображения товаров.
+
+    Основным считается изображение товара с наименьшим id, то есть то же,
+    что возвращал product.images.first(). Товары обновляются одним запросом.
+
+    args:
+        product_ids - id товаров, по умолчанию все товары;
+        reset - пересчитать основное изображение, даже если оно уже задано.
+
+    return:
+        Количество обновлённых товаров.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+    if not reset:
+        products = products.filter(primary_image__isnull=True)
+
+    first_picture = Picture.objects.filter(
+        product=OuterRef('pk'),
+    ).order_by('pk').values('pk')[:1]
+    return products.update(primary_image=Subquery(first_picture))
+
+
+def delete_unreferenced_images(names: Iterable[str], retry: bool = True) -> List[str]:
+    """
+    Сервис для удаления файлов изображений, на которые больше не ссылается ни одна запись Picture.
+
+    Файлы изображений общие для записей с одинаковым содержимым, поэтому
+    файл и его миниатюры удаляются только вместе с последней ссылкой на него.
+    Файл, который в это время повторно использует ещё не зафиксированная
+    запись, не удаляется, а его удаление повторяется задачей через
+    PICTURE_REUSE_TIMEOUT секунд.
+
+    args:
+        names - имена файлов изображений в хранилище;
+        retry - поставить в очередь повторное удаление пропущенных файлов.
+
+    return:
+        Имена пропущенных повторно используемых файлов.
+    """
+    storage = Picture._meta.get_field('image').storage
+    skipped = []
+    for name in set(names):
+        if not name or Picture.objects.filter(image=name).exists():
+            continue
+        if not storage.delete_unused(name):
+            skipped.append(name)
+            continue
+        for size in settings.PICTURE_THUMBNAIL_SIZES:
+            for fmt in THUMBNAIL_FORMATS:
+                storage.delete(get_thumbnail_name(name, size, fmt))
+
+    if skipped and retry:
+        from products.tasks import delete_picture_images
+
+        try:
+            delete_picture_images.apply_async((skipped,), countdown=settings.PICTURE_REUSE_TIMEOUT)
+        except (OperationalError, OSError):
+            logger.exception('Deletion of images %s could not be scheduled', skipped)
+    return skipped
@@ -0,0 +1,131 @@
+from datetime import datetime
+import io
+import json
+from os import PathLike, path
+import shutil
+from typing import IO, Dict, Iterator, Set, Tuple, Union
+import zipfile
+
+from django.conf import settings
+from django.db.models import QuerySet
+from modeltranslation.translator import translator
+
+from products.models import Picture, Product, SellerProduct
+
+EXPORT_ROOT = 'export'
+EXPORT_JSON = f'{EXPORT_ROOT}/products.json'
+PRODUCT_FIELDS = ('name', 'slug', 'description', 'category', 'sort_index', 'limited', 'archived')
+
+
+def export_products(
+        file: Union[str, PathLike[str], IO[bytes]],
+        products: QuerySet = None,
+        chunk_size: int = None,
+) -> Dict[str, int]:
+    """
+    Сервис для выгрузки товаров в zip архив формата импорта.
+
+    Товары, записи seller_product и изображения читаются из базы данных
+    пачками через iterator, json файл и изображения пишутся в архив потоково,
+    поэтому расход памяти не зависит от размера каталога. Товары в архиве
+    называются по слагу, а записи seller_product ссылаются на них как на
+    новые, поэтому архив можно импортировать в пустую базу данных.
+
+    args:
+        file - путь к файлу архива или открытый на запись файл;
+        products - выгружаемые товары, по умолчанию все товары;
+        chunk_size - количество записей, читаемых из базы данных за раз.
+
+    return:
+        Количество выгруженных товаров, записей seller_product и изображений.
+    """
+    if products is None:
+        products = Product.objects.all()
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    counts = {'products': 0, 'seller_products': 0, 'images': 0}
+
+    with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(EXPORT_JSON, 'w', force_zip64=True) as json_member:
+            json_file = io.TextIOWrapper(json_member, encoding='utf-8')
+            json_file.write('{"products": {')
+            counts['products'] = _write_entries(json_file, _product_entries(products, chunk_size))
+            json_file.write('}, "seller_products": {')
+            counts['seller_products'] = _write_entries(
+                json_file,
+                _seller_product_entries(products, chunk_size),
+            )
+            json_file.write('}}')
+            json_file.flush()
+            json_file.detach()
+
+        storage = Picture._meta.get_field('image').storage
+        pictures = Picture.objects.filter(
+            product__in=products,
+        ).values_list('product_id', 'product__slug', 'image').order_by('product_id', 'pk')
+        current_product, member_names = None, set()
+        for product_id, slug, image in pictures.iterator(chunk_size=chunk_size):
+            if not image or not storage.exists(image):
+                continue
+            if product_id != current_product:
+                current_product, member_names = product_id, set()
+            member = zipfile.ZipInfo(
+                f'{EXPORT_ROOT}/{slug}/{_unique_name(path.basename(image), member_names)}',
+                date_time=datetime.now().timetuple()[:6],
+            )
+            member.compress_type = zipfile.ZIP_STORED
+            with storage.open(image) as source, \
+                    archive.open(member, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target)
+            counts['images'] += 1
+
+    return counts
+
+
+def _unique_name(name: str, used: Set[str]) -> str:
+    """ Получить имя изображения, не совпадающее с уже записанными именами изображений товара. """
+    stem, ext = path.splitext(name)
+    unique, number = name, 1
+    while unique in used:
+        unique = f'{stem}_{number}{ext}'
+        number += 1
+    used.add(unique)
+    return unique
+
+
+def _write_entries(json_file: IO[str], entries: Iterator[Tuple[str, Dict]]) -> int:
+    """ Записать записи раздела json файла, не собирая их в память. """
+    count = 0
+    for name, content in entries:
+        if count:
+            json_file.write(', ')
+        json_file.write(json.dumps(name))
+        json_file.write(': ')
+        json_file.write(json.dumps(content, ensure_ascii=False, default=str))
+        count += 1
+    return count
+
+
+def _product_entries(products: QuerySet, chunk_size: int) -> Iterator[Tuple[str, Dict]]:
+    """ Получить записи товаров для json файла. """
+    fields = list(PRODUCT_FIELDS)
+    for translation_fields in translator.get_options_for_model(Product).fields.values():
+        fields.extend(field.name for field in translation_fields)
+
+    for product in products.order_by('pk').values(*fields).iterator(chunk_size=chunk_size):
+        yield product['slug'], product
+
+
+def _seller_product_entries(products: QuerySet, chunk_size: int) -> Iterator[Tuple[str, Dict]]:
+    """ Получить записи seller_product для json файла. """
+    seller_products = SellerProduct.objects.filter(
+        product__in=products,
+    ).values_list('pk', 'seller_id', 'product__slug', 'count', 'price').order_by('pk')
+
+    for pk, seller_id, slug, count, price in seller_products.iterator(chunk_size=chunk_size):
+        yield f'seller_product_{pk}', {
+            'seller': seller_id,
+            'product': slug,
+            'new': True,
+            'count': count,
+            'price': str(price),
+        }
@@ -0,0 +1,411 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils.text import slugify
+from modeltranslation.translator import NotRegistered, translator
+
+from account.models import Seller
+from products.models import Category, Picture, Product, SellerProduct
+from products.services.product_import.image_import import ImageIngestor
+from products.services.product_import.import_utils import (
+    ImportLogger,
+    ImportStats,
+    batched,
+    get_content_hash,
+)
+from products.services.pictures import update_primary_images
+from products.services.thumbnails import schedule_thumbnails
+
+
+class BulkImportWriter:
+    """
+        Класс, отвечающий за пакетную запись импортируемых товаров в базу данных.
+
+        Категории и продавцы загружаются один раз, записи сохраняются пачками
+        через bulk_create, каждая пачка - в отдельной транзакции. Если пачка
+        не сохранилась целиком, её записи сохраняются по одной, чтобы
+        в лог попали ошибки конкретных записей.
+
+        В режиме upsert существующие товары ищутся по слагу, а записи
+        seller_product - по продавцу и товару. Записи, хэш содержимого которых
+        не изменился с прошлого импорта, пропускаются и считаются успешными,
+        изменившиеся обновляются через bulk_update. Изображения добавляются
+        только к новым товарам.
+    """
+    def __init__(
+            self,
+            images: ImageIngestor,
+            file_names: Dict,
+            logger: ImportLogger,
+            stats: ImportStats,
+            user_id: int = None,
+            batch_size: int = None,
+            upsert: bool = False,
+    ):
+        """
+        Args:
+            images (ImageIngestor): загрузчик изображений из архива импорта,
+            file_names (Dict): имена файлов изображений в архиве по именам товаров,
+            logger (ImportLogger): лог импорта,
+            stats (ImportStats): счётчики импорта,
+            user_id (int): id пользователя, инициализировавшего импорт,
+            batch_size (int): количество записей в одной пачке,
+            upsert (bool): обновлять существующие записи вместо ошибки о повторе.
+        """
+        self.__images = images
+        self.__file_names = file_names
+        self.__logger = logger
+        self.__stats = stats
+        self.__user_id = user_id
+        self.__batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.__upsert = upsert
+        self.__categories = None
+        self.__sellers = None
+        self.new_products = {}
+
+    def add_products(self, entries: Iterable[Tuple[str, Dict]]) -> None:
+        """ Добавить записи товаров в базу данных. """
+        self.__logger.log('Importing products')
+        self.__stats.stage = 'products'
+        if self.__categories is None:
+            self.__categories = Category.objects.in_bulk()
+
+        for batch in batched(entries, self.__batch_size):
+            self.__add_products_batch(batch)
+
+        if self.__stats.skipped_product_imports:
+            self.__logger.log(f'Skipped {self.__stats.skipped_product_imports} unchanged products')
+        if self.__stats.successful_product_imports:
+            self.__logger.log(
+                f'Imported {self.__stats.successful_product_imports} products'
+            )
+
+    def add_seller_products(self, entries: Iterable[Tuple[str, Dict]]) -> None:
+        """ Добавить записи seller_product в базу данных. """
+        self.__logger.log('Importing seller products')
+        self.__stats.stage = 'seller_products'
+        if self.__sellers is None:
+            self.__sellers = Seller.objects.select_related('profile').in_bulk()
+
+        for batch in batched(entries, self.__batch_size):
+            self.__add_seller_products_batch(batch)
+
+        if self.__stats.skipped_seller_product_imports:
+            self.__logger.log(
+                f'Skipped {self.__stats.skipped_seller_product_imports} unchanged seller products'
+            )
+        if self.__stats.successful_seller_product_imports:
+            self.__logger.log(
+                f'Imported {self.__stats.successful_seller_product_imports} seller products'
+            )
+
+    def __add_products_batch(self, batch: List[Tuple[str, Dict]]) -> None:
+        """ Добавить пачку записей товаров в базу данных. """
+        prepared = []
+        batch_slugs = set()
+        for prod_name, prod_content in batch:
+            self.__stats.product_imports += 1
+            try:
+                product = self.__build_product(prod_content)
+                if product.slug in batch_slugs:
+                    raise ValueError(f'Duplicate slug {product.slug} in the archive')
+                batch_slugs.add(product.slug)
+                prepared.append((prod_name, product))
+            except Exception as e:
+                self.__log_product_error(prod_name, e)
+
+        existing = {
+            product.slug: product
+            for product in Product.objects.filter(
+                slug__in=batch_slugs,
+            ).only('pk', 'slug', 'import_hash')
+        }
+        new, changed = [], []
+        for prod_name, product in prepared:
+            current = existing.get(product.slug)
+            if current is None:
+                new.append((prod_name, product))
+            elif not self.__upsert:
+                self.__log_product_error(
+                    prod_name,
+                    ValueError(f'Product with slug {product.slug} already exists'),
+                )
+            elif current.import_hash == product.import_hash:
+                self.__stats.successful_product_imports += 1
+                self.__stats.skipped_product_imports += 1
+                self.new_products[prod_name] = current
+            else:
+                product.pk = current.pk
+                changed.append((prod_name, product))
+
+        saved = self.__save_batch(
+            Product,
+            new,
+            self.__log_product_error,
+        )
+        for prod_name, product in saved:
+            self.__stats.successful_product_imports += 1
+            self.new_products[prod_name] = product
+            self.__logger.log(f'Product {prod_name} imported successfully')
+
+        updated = self.__update_batch(
+            Product,
+            changed,
+            dict(batch),
+            self.__log_product_error,
+        )
+        for prod_name, product in updated:
+            self.__stats.successful_product_imports += 1
+            self.new_products[prod_name] = product
+            self.__logger.log(f'Product {prod_name} updated successfully')
+
+        self.__add_pictures(saved)
+
+    def __build_product(self, prod_content: Dict) -> Product:
+        """ Подготовить запись о товаре к сохранению. """
+        prod_content = dict(prod_content)
+        if not prod_content.get('slug'):
+            prod_content['slug'] = slugify(prod_content['name'])
+        import_hash = get_content_hash(prod_content)
+
+        category = self.__categories.get(int(prod_content['category']))
+        if not category:
+            raise Category.DoesNotExist(
+                f'Category {prod_content["category"]} does not exist'
+            )
+        prod_content['category'] = category
+        return Product(**prod_content, import_hash=import_hash)
+
+    def __add_pictures(self, products: List[Tuple[str, Product]]) -> None:
+        """ Добавить изображения пачки товаров в базу данных. """
+        pictures = []
+        stored = self.__images.store(
+            (image_name, Picture(product=product))
+            for prod_name, product in products
+            for image_name in self.__file_names.get(prod_name, [])
+        )
+        for image_name, picture, error in stored:
+            self.__stats.image_imports += 1
+            if error:
+                self.__log_image_error(image_name, error)
+            else:
+                pictures.append((image_name, picture))
+
+        saved = self.__save_batch(Picture, pictures, self.__log_image_error)
+        for image_name, picture in saved:
+            self.__stats.successful_image_imports += 1
+            self.__logger.log(f'Image {image_name} imported successfully')
+        schedule_thumbnails(picture.pk for _, picture in saved)
+        update_primary_images({picture.product_id for _, picture in saved})
+
+    def __add_seller_products_batch(self, batch: List[Tuple[str, Dict]]) -> None:
+        """ Добавить пачку записей seller_product в базу данных. """
+        existing_ids = {
+            int(sell_prod_data['product'])
+            for _, sell_prod_data in batch
+            if not sell_prod_data.get('new') and str(sell_prod_data.get('product')).isdigit()
+        }
+        existing_products = Product.objects.in_bulk(existing_ids)
+
+        prepared = []
+        batch_keys = set()
+        for sell_prod_name, sell_prod_data in batch:
+            self.__stats.seller_product_imports += 1
+            try:
+                seller_product = self.__build_seller_product(sell_prod_data, existing_products)
+                key = (seller_product.seller_id, seller_product.product_id)
+                if self.__upsert and key in batch_keys:
+                    raise ValueError(
+                        f'Duplicate seller {key[0]} product {key[1]} in the archive'
+                    )
+                batch_keys.add(key)
+                prepared.append((sell_prod_name, seller_product))
+            except Exception as e:
+                self.__log_seller_product_error(sell_prod_name, e)
+
+        new, changed = prepared, []
+        if self.__upsert and prepared:
+            existing = {}
+            for seller_product in SellerProduct.objects.filter(
+                seller_id__in={key[0] for key in batch_keys},
+                product_id__in={key[1] for key in batch_keys},
+            ).only('pk', 'seller_id', 'product_id', 'import_hash').order_by('pk'):
+                existing.setdefault(
+                    (seller_product.seller_id, seller_product.product_id),
+                    seller_product,
+                )
+
+            new = []
+            for sell_prod_name, seller_product in prepared:
+                current = existing.get((seller_product.seller_id, seller_product.product_id))
+                if current is None:
+                    new.append((sell_prod_name, seller_product))
+                elif current.import_hash == seller_product.import_hash:
+                    self.__stats.successful_seller_product_imports += 1
+                    self.__stats.skipped_seller_product_imports += 1
+                else:
+                    seller_product.pk = current.pk
+                    changed.append((sell_prod_name, seller_product))
+
+        saved = self.__save_batch(
+            SellerProduct,
+            new,
+            self.__log_seller_product_error,
+        )
+        for sell_prod_name, seller_product in saved:
+            self.__stats.successful_seller_product_imports += 1
+            self.__logger.log(f'Seller product {sell_prod_name} imported successfully')
+
+        updated = self.__update_batch(
+            SellerProduct,
+            changed,
+            dict(batch),
+            self.__log_seller_product_error,
+        )
+        for sell_prod_name, seller_product in updated:
+            self.__stats.successful_seller_product_imports += 1
+            self.__logger.log(f'Seller product {sell_prod_name} updated successfully')
+
+    def __build_seller_product(
+            self,
+            sell_prod_data: Dict,
+            existing_products: Dict[int, Product],
+    ) -> SellerProduct:
+        """ Подготовить запись seller_product к сохранению. """
+        sell_prod_data = dict(sell_prod_data)
+        seller = self.__sellers.get(int(sell_prod_data['seller']))
+        if not seller:
+            raise Seller.DoesNotExist(f'Seller {sell_prod_data["seller"]} does not exist')
+        seller_owner = seller.profile
+        if self.__user_id and not (seller_owner.pk == self.__user_id or
+                                   seller_owner.is_superuser or
+                                   seller_owner.is_staff):
+            raise PermissionDenied('Can\'t add products for someone else\'s seller')
+        sell_prod_data['seller'] = seller
+
+        if sell_prod_data.get('new'):
+            product = self.new_products.get(str(sell_prod_data['product']))
+        else:
+            product = existing_products.get(int(sell_prod_data['product']))
+        if not product:
+            raise Product.DoesNotExist(
+                f'Product {sell_prod_data["product"]} does not exist'
+            )
+        sell_prod_data['product'] = product
+
+        if isinstance(sell_prod_data.get('new'), bool):
+            del sell_prod_data['new']
+        import_hash = get_content_hash({
+            **sell_prod_data,
+            'seller': seller.pk,
+            'product': product.pk,
+        })
+        return SellerProduct(**sell_prod_data, import_hash=import_hash)
+
+    def __save_batch(self, model, prepared: List[Tuple[str, object]], log_error) -> List[Tuple[str, object]]:
+        """
+        Сохранить пачку записей.
+
+        Если пачку не удалось сохранить целиком из-за ошибки БД или
+        некорректного значения поля, записи сохраняются по одной,
+        а ошибки отдельных записей логируются.
+
+        Returns:
+            Список успешно сохранённых записей.
+        """
+        if not prepared:
+            return []
+
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj for _, obj in prepared])
+            return prepared
+        except Exception:
+            pass
+
+        saved = []
+        with transaction.atomic():
+            for name, obj in prepared:
+                try:
+                    with transaction.atomic():
+                        obj.pk = None
+                        obj.save(force_insert=True)
+                    saved.append((name, obj))
+                except Exception as e:
+                    log_error(name, e)
+        return saved
+
+    def __update_batch(
+            self,
+            model,
+            changed: List[Tuple[str, object]],
+            entries: Dict[str, Dict],
+            log_error,
+    ) -> List[Tuple[str, object]]:
+        """
+        Обновить пачку изменившихся записей.
+
+        Обновляются только поля, указанные в записи импорта,
+        поэтому записи группируются по набору полей. Группа, которую
+        не удалось обновить целиком, обновляется по одной записи.
+
+        Returns:
+            Список успешно обновлённых записей.
+        """
+        groups = defaultdict(list)
+        for name, obj in changed:
+            groups[self.__get_update_fields(model, entries[name])].append((name, obj))
+
+        updated = []
+        for fields, group in groups.items():
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_update([obj for _, obj in group], fields)
+                updated.extend(group)
+                continue
+            except Exception:
+                pass
+
+            with transaction.atomic():
+                for name, obj in group:
+                    try:
+                        with transaction.atomic():
+                            obj.save(update_fields=fields)
+                        updated.append((name, obj))
+                    except Exception as e:
+                        log_error(name, e)
+        return updated
+
+    @staticmethod
+    def __get_update_fields(model, entry: Dict) -> Tuple[str, ...]:
+        """ Получить поля модели, которые нужно обновить по записи импорта. """
+        try:
+            translated = translator.get_options_for_model(model).fields
+        except NotRegistered:
+            translated = {}
+
+        fields = {'import_hash'}
+        for name in entry:
+            if name in ('new', 'slug', 'seller', 'product'):
+                continue
+            fields.add(name)
+            fields.update(field.name for field in translated.get(name, ()))
+        return tuple(sorted(fields))
+
+    def __log_product_error(self, prod_name: str, error: Exception) -> None:
+        self.__logger.log(
+            f'Product ({prod_name}) product_import failed due to {type(error).__name__}: {error}'
+        )
+
+    def __log_image_error(self, image_name: str, error: Exception) -> None:
+        self.__logger.log(
+            f'Image ({image_name}) product_import failed due to {type(error).__name__}: {error}'
+        )
+
+    def __log_seller_product_error(self, sell_prod_name: str, error: Exception) -> None:
+        self.__logger.log(
+            f'Seller product ({sell_prod_name}) import failed due to {type(error).__name__}: {error}',
+        )
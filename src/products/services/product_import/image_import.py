@@ -0,0 +1,150 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import hashlib
+import io
+from os import path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+import zipfile
+
+from django.conf import settings
+from django.core.files.images import ImageFile
+from PIL import Image
+
+from products.models import Picture
+
+
+class ImageIngestor:
+    """
+        Класс, отвечающий за параллельную загрузку изображений из архива импорта.
+
+        Изображения читаются из архива в основном потоке, а проверка Pillow
+        и запись в хранилище выполняются пулом потоков. Суммарный размер
+        прочитанных, но ещё не сохранённых изображений ограничен
+        IMPORT_IMAGE_MEMORY_BUDGET байтами.
+    """
+    def __init__(
+            self,
+            archive: zipfile.ZipFile,
+            workers: int = None,
+            memory_budget: int = None,
+    ):
+        """
+        Args:
+            archive (ZipFile): архив импорта,
+            workers (int): количество потоков для обработки изображений,
+            memory_budget (int): ограничение суммарного размера изображений в обработке в байтах.
+        """
+        self.__archive = archive
+        self.__workers = workers or settings.IMPORT_IMAGE_WORKERS
+        self.__memory_budget = memory_budget or settings.IMPORT_IMAGE_MEMORY_BUDGET
+        self.__executor = None
+
+    def __enter__(self) -> 'ImageIngestor':
+        self.__executor = ThreadPoolExecutor(max_workers=self.__workers)
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.__executor.shutdown()
+        self.__executor = None
+
+    def store(
+            self,
+            pictures: Iterable[Tuple[str, Picture]],
+    ) -> Iterator[Tuple[str, Picture, Optional[Exception]]]:
+        """
+        Проверить изображения и сохранить их файлы в хранилище.
+
+        Записи Picture в базу данных не сохраняются.
+
+        Args:
+            pictures (Iterable[Tuple[str, Picture]]): имена файлов в архиве и записи изображений.
+
+        Returns:
+            Кортежи (имя файла, запись изображения, ошибка или None) в порядке завершения обработки.
+        """
+        return self.__process(pictures, self.__store_image)
+
+    def verify(self, image_names: Iterable[str]) -> Iterator[Tuple[str, Optional[Exception]]]:
+        """
+        Проверить, что изображения из архива можно прочитать, ничего не сохраняя.
+
+        Args:
+            image_names (Iterable[str]): имена файлов в архиве.
+
+        Returns:
+            Кортежи (имя файла, ошибка или None) в порядке завершения проверки.
+        """
+        checked = self.__process(
+            ((image_name, None) for image_name in image_names),
+            self.__verify_image,
+        )
+        for image_name, _, error in checked:
+            yield image_name, error
+
+    def __process(
+            self,
+            items: Iterable[Tuple[str, Any]],
+            worker: Callable[[str, bytes, Any], None],
+    ) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+        """
+        Обработать изображения из архива пулом потоков в пределах ограничения памяти.
+
+        Args:
+            items (Iterable[Tuple[str, Any]]): имена файлов в архиве и связанные с ними объекты,
+            worker (Callable): обработчик, получающий имя файла, его содержимое и объект.
+        """
+        in_flight: Dict[Future, Tuple[str, Any, int]] = {}
+        in_flight_size = 0
+
+        def completed(block: bool):
+            nonlocal in_flight_size
+            done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_name, item, size = in_flight.pop(future)
+                in_flight_size -= size
+                yield image_name, item, future.exception()
+
+        for image_name, item in items:
+            try:
+                size = self.__archive.getinfo(image_name).file_size
+                while in_flight and in_flight_size + size > self.__memory_budget:
+                    yield from completed(block=True)
+                content = self.__archive.read(image_name)
+            except Exception as e:
+                yield image_name, item, e
+                continue
+
+            future = self.__executor.submit(worker, image_name, content, item)
+            in_flight[future] = (image_name, item, size)
+            in_flight_size += size
+            yield from completed(block=False)
+
+        while in_flight:
+            yield from completed(block=True)
+
+    @staticmethod
+    def __verify_image(image_name: str, content: bytes, item: Any = None) -> None:
+        """ Проверить, что содержимое файла является изображением. """
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+
+    @classmethod
+    def __store_image(cls, image_name: str, content: bytes, picture: Picture) -> None:
+        """
+        Проверить изображение и сохранить его файл в хранилище.
+
+        Хранилище изображений адресуется содержимым, поэтому если файл с таким
+        хэшем уже сохранён, запись ссылается на него без проверки и записи.
+        """
+        field = picture.image.field
+        name = field.storage.get_hashed_name(
+            field.generate_filename(picture, path.basename(image_name)),
+            hashlib.sha256(content).hexdigest(),
+        )
+        if field.storage.reuse(name):
+            picture.image.name = name
+            return
+
+        cls.__verify_image(image_name, content)
+
+        image = ImageFile(io.BytesIO(content), name=path.basename(image_name))
+        picture.image.save(image.name, image, save=False)
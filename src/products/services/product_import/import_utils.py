@@ -1,21 +1,80 @@
+from collections import deque
 from datetime import datetime
+import hashlib
+from itertools import islice
+import json
+import logging
 import os
-from typing import Union
+from pathlib import Path
+import shutil
+import time
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple, Union
+import zipfile
 
 import celery
 from django.conf import settings
 
-from products.models import ProductImportLog
+from products.models import ImportStatusEnum, ProductImportLog
+
+logger = logging.getLogger(__name__)
 
 
 class ImportLogger:
-    """ Класс, отвечающий за логгирование импорта товаров. """
-    def __init__(self, start: datetime, file_manager: 'FileManager'):
-        self.__log_messages = []
+    """
+        Класс, отвечающий за логгирование импорта товаров.
+
+        Сообщения сразу дописываются в файл лога, а в запись ProductImportLog
+        пачками - каждые IMPORT_LOG_FLUSH_MESSAGES сообщений или
+        IMPORT_LOG_FLUSH_INTERVAL секунд - сохраняются только последние
+        IMPORT_LOG_TAIL_MESSAGES сообщений. Полный лог остаётся в файле,
+        поэтому размер записи в базе данных не растёт вместе с логом.
+    """
+    def __init__(
+            self,
+            start: datetime,
+            file_manager: 'FileManager',
+            flush_messages: int = None,
+            flush_interval: float = None,
+            import_log: ProductImportLog = None,
+            log_path: Union[str, os.PathLike] = None,
+            progress: 'ImportProgress' = None,
+    ):
+        """
+        Args:
+            start (datetime): время начала импорта,
+            file_manager (FileManager): менеджер файлов текущего импорта,
+            flush_messages (int): количество сообщений, после которого лог сохраняется в базу данных,
+            flush_interval (float): интервал в секундах, после которого лог сохраняется в базу данных,
+            import_log (ProductImportLog): существующая запись лога, в которую нужно писать сообщения,
+            log_path (Union[str, PathLike]): путь к файлу лога, если он отличается от пути по умолчанию,
+            progress (ImportProgress): прогресс импорта, сохраняемый в запись лога вместе с сообщениями.
+        """
+        self.__pending_messages = 0
         self.__start = start
         self.__file_manager = file_manager
-        self.__import_log = ProductImportLog(start=self.__start)
-        self.__import_log.save()
+        self.__flush_messages = flush_messages or settings.IMPORT_LOG_FLUSH_MESSAGES
+        self.__flush_interval = flush_interval or settings.IMPORT_LOG_FLUSH_INTERVAL
+        self.__last_flush = time.monotonic()
+        self.__progress = progress
+        self.__log_path = log_path or self.__file_manager.get_log_path()
+        self.__log_file = open(self.__log_path, 'a')
+        self.__import_log = import_log
+        if self.__import_log is None:
+            self.__import_log = ProductImportLog(
+                start=self.__start,
+                message_log='',
+                log_file=str(self.__log_path),
+            )
+            self.__import_log.save()
+        self.__tail = deque(
+            (self.__import_log.message_log or '').splitlines(),
+            maxlen=settings.IMPORT_LOG_TAIL_MESSAGES,
+        )
+
+    @property
+    def import_log(self) -> ProductImportLog:
+        """ Запись лога текущего импорта. """
+        return self.__import_log
 
     def log(self, message: str) -> None:
         """ Добавить сообщение в лог.
@@ -23,17 +82,35 @@ class ImportLogger:
         Args:
             message (str): сообщение.
         """
-        print(message)
+        logger.debug(message)
         now = datetime.now()
         message = f'[{now.time()}] {message}'
-        self.__log_messages.append(message)
-
-        message_log = self.__import_log.message_log
-        if not message_log:
-            message_log = ''
-        message_log = message_log + message + '\n'
-        self.__import_log.message_log = message_log
-        self.__import_log.save()
+        self.__log_file.write(message + '\n')
+        self.__tail.append(message)
+        self.__pending_messages += 1
+
+        if (self.__pending_messages >= self.__flush_messages or
+                time.monotonic() - self.__last_flush >= self.__flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """ Сохранить накопленные сообщения в файл, а последние из них в запись лога импорта вместе с прогрессом. """
+        self.__last_flush = time.monotonic()
+        update = {}
+        if self.__pending_messages:
+            self.__log_file.flush()
+            self.__pending_messages = 0
+            update['message_log'] = '\n'.join(self.__tail) + '\n'
+        if self.__progress:
+            update['progress'] = self.__progress.as_dict()
+
+        if update:
+            ProductImportLog.objects.filter(pk=self.__import_log.pk).update(**update)
+
+    def close(self) -> None:
+        """ Сохранить накопленные сообщения и закрыть файл лога. """
+        self.flush()
+        self.__log_file.close()
 
     def log_result(
         self,
@@ -99,26 +176,33 @@ class ImportLogger:
         Returns:
             str: Текст лога.
         """
+        if self.__progress:
+            self.__progress.finish()
+        self.close()
+
         self.__import_log.end = datetime.now()
         self.__import_log.status = status
         self.__import_log.items_imported = import_count
         self.__import_log.file_name = self.__file_manager.get_filename()
-        self.__import_log.save()
-
-        log = '\n'.join(self.__log_messages)
-        print(log)
+        self.__import_log.log_file = str(self.__log_path)
+        self.__import_log.save(
+            update_fields=['end', 'status', 'items_imported', 'file_name', 'log_file'],
+        )
 
-        log_path = self.__file_manager.get_log_path()
-        self.__file_manager.save_file(log, log_path)
-
-        return log
+        with open(self.__log_path) as log_file:
+            return log_file.read().rstrip('\n')
 
 
 class FileManager:
     """ Класс, отвечающий за операции с файлами в процессе импорта. """
-    def __init__(self, start):
+    def __init__(self, start: datetime, filename: str = None):
+        """
+        Args:
+            start (datetime): время начала импорта,
+            filename (str): имя файлов импорта, если оно уже было получено другим процессом.
+        """
         self.__start = start
-        self.__filename = None
+        self.__filename = filename
 
     @staticmethod
     def save_file(content: Union[bytes, str], save_path: str) -> None:
@@ -134,6 +218,66 @@ class FileManager:
         with open(save_path, mode) as f:
             f.write(content)
 
+    @staticmethod
+    def save_stream(stream: IO[bytes], save_path: str) -> None:
+        """
+        Сохранить содержимое потока на диск, не загружая его в память целиком.
+
+        Args:
+            stream (IO[bytes]): поток с содержимым файла,
+            save_path (str): путь для сохранения файла.
+        """
+        with open(save_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+
+    @staticmethod
+    def stage_file(
+            chunks: Iterable[bytes],
+            target_dir: Union[str, os.PathLike] = None,
+    ) -> Tuple[Path, str]:
+        """
+        Сохранить загруженный файл импорта, по умолчанию в IMPORT_PENDING_DIR.
+
+        Файл записывается по частям, параллельно считается его хэш.
+        Пока запись не завершена, файл имеет расширение .part.
+
+        Args:
+            chunks (Iterable[bytes]): части содержимого файла,
+            target_dir (Union[str, PathLike]): директория для сохранения файла.
+
+        Returns:
+            Tuple[Path, str]: путь к сохранённому файлу и sha256 хэш его содержимого.
+        """
+        pending_dir = Path(target_dir or settings.IMPORT_PENDING_DIR)
+        pending_dir.mkdir(parents=True, exist_ok=True)
+
+        file_hash = hashlib.sha256()
+        part_path = pending_dir.joinpath(f'{celery.uuid()}.part')
+        with open(part_path, 'wb') as f:
+            for chunk in chunks:
+                file_hash.update(chunk)
+                f.write(chunk)
+
+        file_hash = file_hash.hexdigest()
+        file_path = pending_dir.joinpath(f'{datetime.now():%Y-%m-%d_%H-%M-%S}_{file_hash[:16]}.zip')
+        os.replace(part_path, file_path)
+        return file_path, file_hash
+
+    @staticmethod
+    def get_file_hash(file_path: Union[str, os.PathLike], chunk_size: int = 1024 * 1024) -> str:
+        """
+        Получить sha256 хэш содержимого файла, читая его по частям.
+
+        Args:
+            file_path (Union[str, PathLike]): путь к файлу,
+            chunk_size (int): размер читаемой части файла.
+        """
+        file_hash = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
     @staticmethod
     def remove_file(file_path: str) -> None:
         """
@@ -195,3 +339,272 @@ class FileManager:
             ) + celery.uuid()
 
         return self.__filename + '.' + extension if extension else self.__filename
+
+
+class ImportStats:
+    """ Счётчики записей процесса импорта. """
+    def __init__(self):
+        self.product_imports = 0
+        self.successful_product_imports = 0
+        self.image_imports = 0
+        self.successful_image_imports = 0
+        self.seller_product_imports = 0
+        self.successful_seller_product_imports = 0
+        self.skipped_product_imports = 0
+        self.skipped_seller_product_imports = 0
+        self.stage = ''
+
+    @property
+    def total_imports(self) -> int:
+        """ Общее количество записей для импорта. """
+        return sum(
+            (
+                self.product_imports,
+                self.image_imports,
+                self.seller_product_imports,
+            )
+        )
+
+    def as_dict(self) -> Dict[str, int]:
+        """ Получить значения счётчиков в виде словаря. """
+        return {name: value for name, value in vars(self).items() if isinstance(value, int)}
+
+    def add(self, counts: Dict[str, int]) -> None:
+        """
+        Прибавить к счётчикам значения другого процесса импорта.
+
+        Args:
+            counts (Dict[str, int]): значения счётчиков, полученные через as_dict.
+        """
+        for name, value in counts.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def successful_imports(self) -> int:
+        """ Количество успешно импортированных записей. """
+        return sum(
+            (
+                self.successful_product_imports,
+                self.successful_image_imports,
+                self.successful_seller_product_imports,
+            )
+        )
+
+
+class ImportProgress:
+    """
+        Прогресс импорта: количество записей по этапам, скорость,
+        количество прочитанных байт json файла и оставшееся время.
+    """
+    STAGES = (
+        ('products', 'product_imports', 'successful_product_imports'),
+        ('images', 'image_imports', 'successful_image_imports'),
+        ('seller_products', 'seller_product_imports', 'successful_seller_product_imports'),
+    )
+
+    def __init__(self, stats: ImportStats):
+        """
+        Args:
+            stats (ImportStats): счётчики импорта.
+        """
+        self.__stats = stats
+        self.__started = time.monotonic()
+        self.__stream = None
+        self.__bytes_read = 0
+        self.__bytes_total = 0
+        self.__finished = False
+
+    def track(self, stream: IO[bytes], total: int) -> None:
+        """
+        Отслеживать чтение json файла.
+
+        Args:
+            stream (IO[bytes]): поток json файла, поддерживающий tell,
+            total (int): размер json файла в байтах.
+        """
+        self.__stream = stream
+        self.__bytes_total = total
+
+    def finish(self) -> None:
+        """ Отметить, что импорт завершён. """
+        self.__bytes_read = self.bytes_read
+        self.__stream = None
+        self.__finished = True
+
+    @property
+    def bytes_read(self) -> int:
+        """ Количество прочитанных байт json файла. """
+        if self.__stream is not None:
+            if self.__stream.closed:
+                self.__bytes_read = self.__bytes_total
+            else:
+                self.__bytes_read = self.__stream.tell()
+        return self.__bytes_read
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Получить прогресс в виде словаря для сохранения в запись лога. """
+        elapsed = max(time.monotonic() - self.__started, 0.001)
+        bytes_read = self.bytes_read
+        eta = None
+        if not self.__finished and 0 < bytes_read < self.__bytes_total:
+            eta = round(elapsed * (self.__bytes_total - bytes_read) / bytes_read)
+
+        return {
+            'stage': 'finished' if self.__finished else self.__stats.stage,
+            'rows': {
+                name: {
+                    'parsed': getattr(self.__stats, parsed),
+                    'inserted': getattr(self.__stats, inserted),
+                    'failed': getattr(self.__stats, parsed) - getattr(self.__stats, inserted),
+                }
+                for name, parsed, inserted in self.STAGES
+            },
+            'rows_per_sec': round(self.__stats.total_imports / elapsed, 1),
+            'bytes_read': bytes_read,
+            'bytes_total': self.__bytes_total,
+            'elapsed': round(elapsed),
+            'eta': eta,
+        }
+
+
+class JsonEntriesReader:
+    """
+        Потоковое чтение записей из json файла импорта.
+
+        Файл имеет вид {"section": {"name": {...}, ...}, ...}. Записи
+        разделов читаются по одной, поэтому весь файл в память не загружается.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.__stream = stream
+        self.__chunk_size = chunk_size
+        self.__decoder = json.JSONDecoder()
+        self.__buffer = ''
+        self.__pos = 0
+        self.__eof = False
+
+    def __iter__(self) -> Iterator[Tuple[str, str, Any]]:
+        """ Получить записи в виде кортежей (раздел, имя записи, содержимое). """
+        self.__expect('{')
+        if self.__next_char_is('}'):
+            return
+
+        while True:
+            section = self.__read_value()
+            self.__expect(':')
+            if self.__peek() == '{':
+                self.__expect('{')
+                if not self.__next_char_is('}'):
+                    while True:
+                        name = self.__read_value()
+                        self.__expect(':')
+                        yield section, name, self.__read_value()
+                        if self.__next_char_is('}'):
+                            break
+                        self.__expect(',')
+            else:
+                self.__read_value()
+
+            if self.__next_char_is('}'):
+                return
+            self.__expect(',')
+
+    def __fill(self) -> bool:
+        """ Дочитать следующий фрагмент файла в буфер. """
+        if self.__eof:
+            return False
+        chunk = self.__stream.read(self.__chunk_size)
+        if not chunk:
+            self.__eof = True
+            return False
+        self.__buffer = self.__buffer[self.__pos:] + chunk
+        self.__pos = 0
+        return True
+
+    def __peek(self) -> str:
+        """ Получить следующий значимый символ, не сдвигая позицию. """
+        while True:
+            while self.__pos < len(self.__buffer) and self.__buffer[self.__pos].isspace():
+                self.__pos += 1
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            if not self.__fill():
+                raise ValueError('Unexpected end of json file')
+
+    def __expect(self, char: str) -> None:
+        if self.__peek() != char:
+            raise ValueError(
+                f'Expected "{char}" in json file, got "{self.__buffer[self.__pos]}"'
+            )
+        self.__pos += 1
+
+    def __next_char_is(self, char: str) -> bool:
+        if self.__peek() == char:
+            self.__pos += 1
+            return True
+        return False
+
+    def __read_value(self) -> Any:
+        """ Прочитать одно json значение, дочитывая файл при необходимости. """
+        self.__peek()
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer, self.__pos)
+                if end < len(self.__buffer) or self.__eof:
+                    self.__pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.__eof:
+                    raise
+            if not self.__fill():
+                value, self.__pos = self.__decoder.raw_decode(self.__buffer, self.__pos)
+                return value
+
+
+def get_archive_file_names(archive: zipfile.ZipFile) -> Dict[str, Union[str, List[str]]]:
+    """
+    Получить имена файлов, находящихся в архиве импорта.
+
+    Returns:
+        Словарь, где по ключу json находится имя json файла,
+        а по именам товаров - списки имён файлов их изображений.
+    """
+    file_names = {}
+    for info in archive.infolist():
+        if not info.is_dir():
+            if info.filename.endswith('.json'):
+                if file_names.get('json'):
+                    raise ImportError('Too many json files')
+                file_names['json'] = info.filename
+            else:
+                name_path = info.filename.split('/')
+                if len(name_path) != 3:
+                    continue
+                file_names.setdefault(name_path[1], []).append(
+                    info.filename,
+                )
+    return file_names
+
+
+def get_content_hash(content: Dict) -> str:
+    """ Получить sha256 хэш содержимого записи импорта. """
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode(),
+    ).hexdigest()
+
+
+def get_import_status(successful_imports: int, total_imports: int) -> ImportStatusEnum:
+    """ Получить статус импорта по количеству записей. """
+    if not successful_imports:
+        return ImportStatusEnum.FAILURE
+    if successful_imports == total_imports:
+        return ImportStatusEnum.SUCCESS
+    return ImportStatusEnum.PARTIAL_SUCCESS
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """ Разбить последовательность на списки длиной не более size. """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
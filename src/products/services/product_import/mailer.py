@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.core.mail import send_mail
 
+from account.models import Profile
+from products.models import ImportStatusEnum
+
 
 def send_email(subject: str, message: str, address: str = '') -> None:
     recipients = [settings.DEFAULT_ADMIN_EMAIL]
@@ -16,3 +19,30 @@ def send_email(subject: str, message: str, address: str = '') -> None:
         message=message,
         recipient_list=[address],
     )
+
+
+def send_import_report(
+        user: Profile,
+        address: str,
+        status: ImportStatusEnum,
+        log: str,
+) -> None:
+    """ Выслать отчёт об импорте, инициализированном пользователем. """
+    subject = 'Product import initiated by user {pk} | {username}'.format(
+        pk=user.pk,
+        username=user.username,
+    )
+    message = """
+Product import by user {pk} | {username} | {email} has been performed.
+Import result: {status}.
+Here's the log:
+{log}
+    """.format(
+        pk=user.pk,
+        username=user.username,
+        email=user.email,
+        status=status.name,
+        log=log
+    )
+
+    send_email(subject, message, address)
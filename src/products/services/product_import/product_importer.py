@@ -1,4 +1,5 @@
 from datetime import datetime
+from itertools import chain
 import json
 import io
 from os import path, PathLike
@@ -6,18 +7,31 @@ from typing import Union, Dict
 import zipfile
 
 from django.core.exceptions import PermissionDenied
-from django.core.files.images import ImageFile
 from django.db import transaction
 from django.utils.text import slugify
 
-from products.services.product_import.import_utils import ImportLogger, FileManager
-from products.services.product_import.mailer import send_email
+from products.services.product_import.bulk_import import BulkImportWriter
+from products.services.product_import.image_import import ImageIngestor
+from products.services.product_import.import_utils import (
+    FileManager,
+    ImportLogger,
+    ImportProgress,
+    ImportStats,
+    JsonEntriesReader,
+    get_archive_file_names,
+    get_import_status,
+)
+from products.services.product_import.mailer import send_import_report
+from products.services.product_import.validation import ImportValidator
+from products.services.pictures import update_primary_images
+from products.services.thumbnails import schedule_thumbnails
 from account.models import Profile, Seller
 from products.models import (
     Category,
     ImportStatusEnum,
     Picture,
     Product,
+    ProductImportLog,
     SellerProduct,
 )
 
@@ -29,33 +43,58 @@ class ProductImporter:
             file: Union[str, PathLike[str], bytes],
             user_id: int = None,
             email: str = None,
+            bulk: bool = False,
+            batch_size: int = None,
+            file_hash: str = None,
+            upsert: bool = False,
+            dry_run: bool = False,
+            import_log_id: int = None,
     ):
         """
         Args:
             file (Union[str, PathLike[str], bytes]): zip файл с данными для импорта,
             user_id (int): id пользователя, инициализировавшего импорт,
-            email(str): почта администратора, на которую будет отправлени отчет о проихведённом импорте.
+            email(str): почта администратора, на которую будет отправлени отчет о проихведённом импорте,
+            bulk (bool): пакетный режим импорта - потоковое чтение json и запись пачками,
+            batch_size (int): количество записей в одной пачке пакетного режима,
+            file_hash (str): sha256 хэш zip файла, переданного путём, для проверки его целостности,
+            upsert (bool): обновлять существующие товары и записи seller_product,
+                пропуская неизменившиеся; выполняется в пакетном режиме,
+            dry_run (bool): только проверить архив, ничего не записывая и не перемещая файлы,
+            import_log_id (int): id записи лога, созданной планировщиком при захвате файла.
         """
         self.__user_id = user_id
         self.__email = email
+        self.__bulk = bulk or upsert
+        self.__upsert = upsert
+        self.__batch_size = batch_size
+        self.__file_hash = file_hash
+        self.__dry_run = dry_run
+        self.__valid = False
         self.__original_path = None
         self.__target_path = None
         self.__filename = None
         self.__json = None
         self.__start = datetime.now()
         self.__file_manager = FileManager(self.__start)
-        self.__logger = ImportLogger(self.__start, self.__file_manager)
-        self.__product_imports = 0
-        self.__successful_product_imports = 0
-        self.__image_imports = 0
-        self.__successful_image_imports = 0
-        self.__seller_product_imports = 0
-        self.__successful_seller_product_imports = 0
+        self.__stats = ImportStats()
+        self.__progress = ImportProgress(self.__stats)
+        self.__logger = ImportLogger(
+            self.__start,
+            self.__file_manager,
+            import_log=ProductImportLog.objects.filter(pk=import_log_id).first() if import_log_id else None,
+            progress=self.__progress,
+        )
         self.__total_imports = 0
         self.__successful_imports = 0
 
         self.__import_products(file)
 
+    @property
+    def valid(self) -> bool:
+        """ Прошёл ли архив проверку в режиме dry_run. """
+        return self.__valid
+
     def __import_products(self, file: Union[str, PathLike[str], bytes]) -> None:
         """
         Запуск процесса импорта.
@@ -79,19 +118,32 @@ class ProductImporter:
                 self.__logger.log('Begin product_import initiated by admin')
             self.__check_file(file)
             self.__check_archive()
-            self.__add_entries_from_archive_to_database()
+            if self.__dry_run:
+                self.__valid = ImportValidator(
+                    self.archive,
+                    self.file_names,
+                    self.__logger,
+                    self.__user_id,
+                    self.__batch_size,
+                    self.__upsert,
+                ).validate()
+                return
+            if self.__bulk:
+                self.__bulk_add_entries_from_archive_to_database()
+            else:
+                self.__add_entries_from_archive_to_database()
             self.__logger.log('Import finished')
 
             self.__calculate_successful_imports()
             if self.__successful_imports:
                 self.__logger.log_result(
                     self.__successful_imports,
-                    self.__product_imports,
-                    self.__successful_product_imports,
-                    self.__image_imports,
-                    self.__successful_image_imports,
-                    self.__seller_product_imports,
-                    self.__successful_seller_product_imports,
+                    self.__stats.product_imports,
+                    self.__stats.successful_product_imports,
+                    self.__stats.image_imports,
+                    self.__stats.successful_image_imports,
+                    self.__stats.seller_product_imports,
+                    self.__stats.successful_seller_product_imports,
                 )
         except Exception as e:
             self.__logger.log(f'Import failed due to {type(e).__name__}: {e}')
@@ -102,11 +154,11 @@ class ProductImporter:
             log = self.__logger.finalize_log(status, self.__successful_imports)
 
             success = self.__successful_imports > 0
-            if self.__json:
+            if self.__json and not self.__dry_run:
                 file_path = self.__file_manager.get_json_path(success)
-                file = self.archive.read(self.__json)
-                self.__file_manager.save_file(file, file_path)
-            if self.__original_path:
+                with self.archive.open(self.__json) as file:
+                    self.__file_manager.save_stream(file, file_path)
+            if self.__original_path and not self.__dry_run:
                 self.__file_manager.remove_file(self.__original_path)
 
             self.__notify_admin(status, log)
@@ -119,9 +171,12 @@ class ProductImporter:
             file (Union[str, PathLike[str], bytes]): zip файл с данными для импорта
         """
         if isinstance(file, PathLike) or isinstance(file, str):
-            if path.exists(file) and path.isfile(file):
-                self.file = file
-                self.__original_path = file
+            if not (path.exists(file) and path.isfile(file)):
+                raise FileNotFoundError(f'File {file} does not exist')
+            self.file = file
+            self.__original_path = file
+            if self.__file_hash and self.__file_manager.get_file_hash(file) != self.__file_hash:
+                raise ValueError('File hash does not match the uploaded file')
         elif isinstance(file, bytes):
             self.file = io.BytesIO(file)
         else:
@@ -142,45 +197,82 @@ class ProductImporter:
 
     def __get_file_names_from_archive(self) -> None:
         """ Получение имен файлов, находящихся в архиве. """
-        self.file_names = {}
-        for info in self.archive.infolist():
-            if not info.is_dir():
-                if info.filename.endswith('.json'):
-                    if self.file_names.get('json'):
-                        print('Too many json files')
-                        raise ImportError('Too many json files')
-                    self.file_names['json'] = info.filename
-                else:
-                    name_path = info.filename.split('/')
-                    if len(name_path) != 3:
-                        continue
-                    self.file_names.setdefault(name_path[1], []).append(
-                        info.filename,
-                    )
+        self.file_names = get_archive_file_names(self.archive)
         print(self.file_names)
 
     def __add_entries_from_archive_to_database(self) -> None:
         """ Добавить записи в базу данных. """
-        json_file = json.loads(self.archive.read(self.__json))
+        with self.archive.open(self.__json) as json_file:
+            self.__progress.track(json_file, self.archive.getinfo(self.__json).file_size)
+            json_file = json.load(json_file)
         self.products = json_file.get('products')
         self.seller_products = json_file.get('seller_products')
 
-        with transaction.atomic():
+        with transaction.atomic(), ImageIngestor(self.archive) as self.__images:
             if self.products:
                 self.__add_products_to_database()
             if self.seller_products:
                 self.__add_seller_products_to_database()
 
+    def __bulk_add_entries_from_archive_to_database(self) -> None:
+        """ Добавить записи в базу данных в пакетном режиме. """
+        with ImageIngestor(self.archive) as images:
+            self.__bulk_write_entries(BulkImportWriter(
+                images,
+                self.file_names,
+                self.__logger,
+                self.__stats,
+                self.__user_id,
+                self.__batch_size,
+                self.__upsert,
+            ))
+
+    def __bulk_write_entries(self, writer: BulkImportWriter) -> None:
+        """
+        Прочитать json файл и передать записи на пакетную запись.
+
+        Json файл читается потоково. Записи seller_product могут ссылаться
+        на новые товары, поэтому они записываются после всех товаров:
+        записи, встреченные до окончания раздела товаров, откладываются.
+        """
+        pending_seller_products = []
+
+        with self.archive.open(self.__json) as json_file:
+            self.__progress.track(json_file, self.archive.getinfo(self.__json).file_size)
+            entries = iter(JsonEntriesReader(io.TextIOWrapper(json_file, encoding='utf-8')))
+
+            def product_entries():
+                products_seen = False
+                for section, name, content in entries:
+                    if section == 'products':
+                        products_seen = True
+                        yield name, content
+                    elif section == 'seller_products':
+                        pending_seller_products.append((name, content))
+                        if products_seen:
+                            return
+
+            writer.add_products(product_entries())
+            writer.add_seller_products(chain(
+                pending_seller_products,
+                (
+                    (name, content)
+                    for section, name, content in entries
+                    if section == 'seller_products'
+                ),
+            ))
+
     def __add_products_to_database(self) -> None:
         """ Добавить все записи товаров в базу данных. """
         self.__logger.log('Importing products')
+        self.__stats.stage = 'products'
         self.new_products = {}
 
         for prod_name, prod_content in self.products.items():
             self.__add_product_to_database(prod_content, prod_name)
 
-        if self.__successful_product_imports:
-            self.__logger.log(f'Imported {self.__successful_product_imports} products')
+        if self.__stats.successful_product_imports:
+            self.__logger.log(f'Imported {self.__stats.successful_product_imports} products')
 
     def __add_product_to_database(
             self,
@@ -188,7 +280,7 @@ class ProductImporter:
             prod_name: str,
     ) -> None:
         """ Добавить одну запись о товаре в базу данных. """
-        self.__product_imports += 1
+        self.__stats.product_imports += 1
         try:
             with transaction.atomic():
                 prod_content['category'] = Category.objects.filter(
@@ -198,7 +290,7 @@ class ProductImporter:
                     prod_content['slug'] = slugify(prod_content['name'])
                 new_product = Product(**prod_content)
                 new_product.save()
-                self.__successful_product_imports += 1
+                self.__stats.successful_product_imports += 1
                 self.new_products[prod_name] = new_product
 
                 prod_images = self.file_names.get(prod_name)
@@ -220,36 +312,46 @@ class ProductImporter:
     ):
         """ Добавить изображения товаров в базу данных. """
         self.__logger.log(f'Importing product images')
-        for image_name in prod_images:
-            self.__image_imports += 1
-            try:
-                with transaction.atomic():
-                    name = path.basename(image_name)
-                    image = ImageFile(
-                        io.BytesIO(self.archive.read(image_name)),
-                        name=name,
-                    )
-                    new_image = Picture(
-                        product=product,
-                        image=image,
-                    )
-                    new_image.save()
-                    self.__successful_image_imports += 1
-                    self.__logger.log(f'Image {image_name} imported successfully')
-            except Exception as e:
-                self.__logger.log(
-                    f'Image ({image_name}) product_import failed due to {type(e).__name__}: {e}'
-                )
+        pictures = []
+        stored = self.__images.store(
+            (image_name, Picture(product=product)) for image_name in prod_images
+        )
+        for image_name, picture, error in stored:
+            self.__stats.image_imports += 1
+            if error:
+                self.__log_image_error(image_name, error)
+            else:
+                pictures.append((image_name, picture))
+
+        try:
+            with transaction.atomic():
+                Picture.objects.bulk_create([picture for _, picture in pictures])
+        except Exception as e:
+            for image_name, _ in pictures:
+                self.__log_image_error(image_name, e)
+            return
+
+        for image_name, _ in pictures:
+            self.__stats.successful_image_imports += 1
+            self.__logger.log(f'Image {image_name} imported successfully')
+        schedule_thumbnails(picture.pk for _, picture in pictures)
+        update_primary_images([product.pk])
+
+    def __log_image_error(self, image_name: str, error: Exception) -> None:
+        self.__logger.log(
+            f'Image ({image_name}) product_import failed due to {type(error).__name__}: {error}'
+        )
 
     def __add_seller_products_to_database(self) -> None:
         """ Добавить все записи seller_product в базу данных. """
         self.__logger.log(f'Importing seller products')
+        self.__stats.stage = 'seller_products'
 
         for sell_prod_name, sell_prod_data in self.seller_products.items():
             self.__add_seller_product_to_database(sell_prod_data, sell_prod_name)
-        if self.__successful_seller_product_imports:
+        if self.__stats.successful_seller_product_imports:
             self.__logger.log(
-                f'Imported {self.__successful_seller_product_imports} seller products'
+                f'Imported {self.__stats.successful_seller_product_imports} seller products'
             )
 
     def __add_seller_product_to_database(
@@ -258,13 +360,13 @@ class ProductImporter:
             sell_prod_name: str,
     ) -> None:
         """ Добавить одну запись seller_product в базу данных. """
-        self.__seller_product_imports += 1
+        self.__stats.seller_product_imports += 1
         try:
             with transaction.atomic():
                 self.__process_seller_product_params(sell_prod_data)
                 new_seller_product = SellerProduct(**sell_prod_data)
                 new_seller_product.save()
-                self.__successful_seller_product_imports += 1
+                self.__stats.successful_seller_product_imports += 1
                 self.__logger.log(f'Seller product {sell_prod_name} imported successfully')
         except Exception as e:
             self.__logger.log(
@@ -294,52 +396,19 @@ class ProductImporter:
 
     def __calculate_successful_imports(self) -> None:
         """ Подсчитать количество успешно импортированных записей. """
-        self.__successful_imports = sum(
-            (
-                self.__successful_product_imports,
-                self.__successful_image_imports,
-                self.__successful_seller_product_imports,
-            )
-        )
+        self.__successful_imports = self.__stats.successful_imports
 
     def __calculate_total_imports(self) -> None:
         """ Подсчитать общее количество записей для импорта. """
-        self.__total_imports = sum(
-            (
-                self.__product_imports,
-                self.__image_imports,
-                self.__seller_product_imports,
-            )
-        )
+        self.__total_imports = self.__stats.total_imports
 
     def __get_status(self) -> ImportStatusEnum:
         """ Получить статус импорта. """
-        if not self.__successful_imports:
-            return ImportStatusEnum.FAILURE
-        if self.__successful_imports == self.__total_imports:
-            return ImportStatusEnum.SUCCESS
-        else:
-            return ImportStatusEnum.PARTIAL_SUCCESS
+        if self.__dry_run:
+            return ImportStatusEnum.SUCCESS if self.__valid else ImportStatusEnum.FAILURE
+        return get_import_status(self.__successful_imports, self.__total_imports)
 
     def __notify_admin(self, status: ImportStatusEnum, log: str) -> None:
         """ Выслать уведомление об импорте на почту админу. """
         if self.__user_id:
-            subject = 'Product import initiated by user {pk} | {username}'.format(
-                pk=self.__initiating_user.pk,
-                username=self.__initiating_user.username,
-                email=self.__initiating_user.email,
-            )
-            message = """
-Product import by user {pk} | {username} | {email} has been performed.
-Import result: {status}.
-Here's the log:
-{log}
-            """.format(
-                pk=self.__initiating_user.pk,
-                username=self.__initiating_user.username,
-                email=self.__initiating_user.email,
-                status=status.name,
-                log=log
-            )
-
-            send_email(subject, message, self.__email)
+            send_import_report(self.__initiating_user, self.__email, status, log)
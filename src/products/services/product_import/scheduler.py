@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import celery
+from django.conf import settings
+
+from products.models import ImportStatusEnum, ProductImportLog
+from products.services.product_import.import_utils import FileManager
+
+IMPORT_FILE_SUFFIX = '.zip'
+
+
+def get_free_import_slots() -> int:
+    """
+    Получить количество импортов, которые можно запустить, не превышая IMPORT_MAX_CONCURRENT.
+
+    Незавершённые импорты, начатые раньше IMPORT_STALE_AFTER секунд назад,
+    считаются зависшими и не занимают место.
+    """
+    running = ProductImportLog.objects.filter(
+        status=ImportStatusEnum.IN_PROGRESS,
+        start__gte=datetime.now() - timedelta(seconds=settings.IMPORT_STALE_AFTER),
+    ).count()
+    return max(settings.IMPORT_MAX_CONCURRENT - running, 0)
+
+
+def get_pending_files(names: Iterable[str] = None) -> List[Path]:
+    """
+    Получить zip файлы из IMPORT_PENDING_DIR, начиная с самых старых.
+
+    Недописанные файлы с расширением .part пропускаются.
+
+    Args:
+        names (Iterable[str]): имена файлов, по умолчанию все файлы директории.
+    """
+    pending_dir = Path(settings.IMPORT_PENDING_DIR)
+    if not pending_dir.is_dir():
+        return []
+    if names is None:
+        files = pending_dir.iterdir()
+    else:
+        files = (pending_dir.joinpath(name) for name in names)
+
+    files = [file for file in files if file.suffix == IMPORT_FILE_SUFFIX and file.is_file()]
+    return sorted(files, key=lambda file: file.stat().st_mtime)
+
+
+def claim_file(file_path: Path) -> Optional[Path]:
+    """
+    Захватить файл импорта, переместив его в IMPORT_PROCESSING_DIR.
+
+    Переименование атомарно, поэтому файл достаётся только одному
+    из одновременно работающих планировщиков.
+
+    Args:
+        file_path (Path): путь к файлу в IMPORT_PENDING_DIR.
+
+    Returns:
+        Путь к захваченному файлу или None, если файл уже захвачен другим процессом.
+    """
+    processing_dir = Path(settings.IMPORT_PROCESSING_DIR)
+    processing_dir.mkdir(parents=True, exist_ok=True)
+    claimed_path = processing_dir.joinpath(f'{celery.uuid()}_{file_path.name}')
+    try:
+        os.rename(file_path, claimed_path)
+    except FileNotFoundError:
+        return None
+    return claimed_path
+
+
+def register_import(file_path: Path, file_hash: str) -> Optional[ProductImportLog]:
+    """
+    Создать запись лога для захваченного файла импорта, если такой файл ещё не импортировался.
+
+    Файл с тем же хэшем, что и у незавершённого или успешного импорта,
+    считается дубликатом и перемещается в IMPORT_DUPLICATES_DIR.
+
+    Args:
+        file_path (Path): путь к захваченному файлу,
+        file_hash (str): sha256 хэш содержимого файла.
+
+    Returns:
+        Запись лога импорта или None, если файл является дубликатом.
+    """
+    duplicate = ProductImportLog.objects.filter(
+        file_hash=file_hash,
+    ).exclude(
+        status=ImportStatusEnum.FAILURE,
+    ).exists()
+    if duplicate:
+        duplicates_dir = Path(settings.IMPORT_DUPLICATES_DIR)
+        duplicates_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(file_path, duplicates_dir.joinpath(file_path.name))
+        return None
+
+    return ProductImportLog.objects.create(
+        start=datetime.now(),
+        message_log='',
+        file_hash=file_hash,
+    )
+
+
+def claim_pending_files(
+        limit: int,
+        names: Iterable[str] = None,
+) -> List[Tuple[Path, str, ProductImportLog]]:
+    """
+    Захватить файлы из IMPORT_PENDING_DIR для импорта, пропуская дубликаты.
+
+    Args:
+        limit (int): максимальное количество захватываемых файлов,
+        names (Iterable[str]): имена файлов, по умолчанию все файлы директории.
+
+    Returns:
+        Пути к захваченным файлам, их sha256 хэши и созданные записи лога импорта.
+    """
+    claimed = []
+    for file_path in get_pending_files(names):
+        if len(claimed) >= limit:
+            break
+        claimed_path = claim_file(file_path)
+        if claimed_path is None:
+            continue
+        file_hash = FileManager.get_file_hash(claimed_path)
+        import_log = register_import(claimed_path, file_hash)
+        if import_log is not None:
+            claimed.append((claimed_path, file_hash, import_log))
+    return claimed
+
+
+def release_import(file_path: Path, import_log: ProductImportLog, error: str) -> Path:
+    """
+    Вернуть захваченный файл в IMPORT_PENDING_DIR, если задачу его импорта не удалось поставить в очередь.
+
+    Запись лога завершается со статусом FAILURE, поэтому файл не считается
+    дубликатом и будет снова захвачен планировщиком.
+
+    Args:
+        file_path (Path): путь к захваченному файлу,
+        import_log (ProductImportLog): запись лога, созданная при захвате файла,
+        error (str): описание ошибки.
+
+    Returns:
+        Путь к файлу в IMPORT_PENDING_DIR.
+    """
+    import_log.end = datetime.now()
+    import_log.status = ImportStatusEnum.FAILURE
+    import_log.message_log = f'{import_log.message_log or ""}Import could not be queued due to {error}\n'
+    import_log.save(update_fields=['end', 'status', 'message_log'])
+
+    pending_dir = Path(settings.IMPORT_PENDING_DIR)
+    pending_dir.mkdir(parents=True, exist_ok=True)
+    pending_path = pending_dir.joinpath(file_path.name)
+    os.replace(file_path, pending_path)
+    return pending_path
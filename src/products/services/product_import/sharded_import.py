@@ -0,0 +1,369 @@
+from datetime import datetime
+import io
+import json
+from os import PathLike
+from pathlib import Path
+import shutil
+from typing import Dict, List, Tuple, Union
+import zipfile
+
+from django.conf import settings
+
+from account.models import Profile
+from products.models import ImportStatusEnum, ProductImportLog
+from products.services.product_import.bulk_import import BulkImportWriter
+from products.services.product_import.image_import import ImageIngestor
+from products.services.product_import.import_utils import (
+    FileManager,
+    ImportLogger,
+    ImportProgress,
+    ImportStats,
+    JsonEntriesReader,
+    get_archive_file_names,
+    get_import_status,
+)
+from products.services.product_import.mailer import send_import_report
+
+SECTIONS = {
+    'products': 'products',
+    'seller_products': 'sellers',
+}
+
+
+def split_import(
+        file: Union[str, PathLike[str]],
+        user_id: int = None,
+        email: str = None,
+        file_hash: str = None,
+        batch_size: int = None,
+        shard_size: int = None,
+        upsert: bool = False,
+        import_log_id: int = None,
+) -> Tuple[Dict, List[str], List[str]]:
+    """
+    Проверить архив импорта и разбить его записи на части для параллельного импорта.
+
+    Части сохраняются json файлами в рабочей директории импорта. Если архив
+    не прошёл проверку, ошибка записывается в лог, а списки частей пусты.
+
+    Args:
+        file (Union[str, PathLike[str]]): путь к zip файлу с данными для импорта,
+        user_id (int): id пользователя, инициализировавшего импорт,
+        email (str): почта, на которую будет отправлен отчёт об импорте,
+        file_hash (str): sha256 хэш zip файла для проверки его целостности,
+        batch_size (int): количество записей в одной пачке,
+        shard_size (int): количество записей в одной части,
+        upsert (bool): обновлять существующие записи, пропуская неизменившиеся,
+        import_log_id (int): id записи лога, созданной планировщиком при захвате файла.
+
+    Returns:
+        Контекст импорта для задач Celery, пути к частям с товарами
+        и пути к частям с записями seller_product.
+    """
+    start = datetime.now()
+    file_manager = FileManager(start)
+    work_dir = Path(settings.IMPORT_DIR).joinpath('shards', file_manager.get_filename())
+    work_dir.mkdir(parents=True)
+    split_stats = ImportStats()
+    split_stats.stage = 'split'
+    progress = ImportProgress(split_stats)
+    logger = ImportLogger(
+        start,
+        file_manager,
+        import_log=ProductImportLog.objects.filter(pk=import_log_id).first() if import_log_id else None,
+        log_path=work_dir.joinpath('0000-split.log'),
+        progress=progress,
+    )
+    shard_size = shard_size or settings.IMPORT_SHARD_SIZE
+
+    context = {
+        'import_log': logger.import_log.pk,
+        'start': start.isoformat(),
+        'filename': file_manager.get_filename(),
+        'work_dir': str(work_dir),
+        'file': str(file),
+        'json': None,
+        'user_id': user_id,
+        'email': email,
+        'batch_size': batch_size,
+        'upsert': upsert,
+    }
+    shards = {section: [] for section in SECTIONS}
+
+    try:
+        if user_id:
+            user = Profile.objects.get(pk=user_id)
+            logger.log(
+                f'Begin product import initiated by user {user.pk} | {user.username} | {user.email}'
+            )
+        else:
+            logger.log('Begin product_import initiated by admin')
+
+        if not Path(file).is_file():
+            raise FileNotFoundError(f'File {file} does not exist')
+        if file_hash and FileManager.get_file_hash(file) != file_hash:
+            raise ValueError('File hash does not match the uploaded file')
+
+        with zipfile.ZipFile(file) as archive:
+            if archive.testzip():
+                raise ImportError('There are corrupted files in the archive')
+            file_names = get_archive_file_names(archive)
+            if not file_names.get('json'):
+                raise FileNotFoundError('There is no json file in the archive')
+            context['json'] = file_names['json']
+
+            with archive.open(file_names['json']) as json_file:
+                progress.track(json_file, archive.getinfo(file_names['json']).file_size)
+                entries = JsonEntriesReader(io.TextIOWrapper(json_file, encoding='utf-8'))
+                pending = {section: {} for section in SECTIONS}
+                for section, name, content in entries:
+                    if section not in SECTIONS:
+                        continue
+                    pending[section][name] = content
+                    if len(pending[section]) >= shard_size:
+                        shards[section].append(
+                            _write_shard(work_dir, section, len(shards[section]), pending[section],
+                                         file_names)
+                        )
+                        pending[section] = {}
+                for section, section_entries in pending.items():
+                    if section_entries:
+                        shards[section].append(
+                            _write_shard(work_dir, section, len(shards[section]), section_entries,
+                                         file_names)
+                        )
+
+        logger.log(
+            'Split the archive into {products} product and {sellers} seller product shards'.format(
+                products=len(shards['products']),
+                sellers=len(shards['seller_products']),
+            )
+        )
+    except Exception as e:
+        logger.log(f'Import failed due to {type(e).__name__}: {e}')
+        shards = {section: [] for section in SECTIONS}
+    finally:
+        logger.close()
+
+    return context, shards['products'], shards['seller_products']
+
+
+def _write_shard(
+        work_dir: Path,
+        section: str,
+        number: int,
+        entries: Dict,
+        file_names: Dict,
+) -> str:
+    """ Сохранить часть записей импорта в json файл. """
+    shard = {section: entries}
+    if section == 'products':
+        shard['images'] = {name: file_names.get(name, []) for name in entries}
+
+    shard_path = work_dir.joinpath(f'{SECTIONS[section]}-{number + 1:04}.json')
+    with open(shard_path, 'w') as f:
+        json.dump(shard, f)
+    return str(shard_path)
+
+
+def import_shard(context: Dict, shard_path: str) -> Dict:
+    """
+    Импортировать часть записей в пакетном режиме.
+
+    Args:
+        context (Dict): контекст импорта, полученный из split_import,
+        shard_path (str): путь к json файлу части.
+
+    Returns:
+        Значения счётчиков импорта части и id новых товаров по их именам в архиве.
+    """
+    start = datetime.fromisoformat(context['start'])
+    shard_path = Path(shard_path)
+    logger = ImportLogger(
+        start,
+        FileManager(start, context['filename']),
+        import_log=ProductImportLog.objects.get(pk=context['import_log']),
+        log_path=shard_path.with_suffix('.log'),
+    )
+    stats = ImportStats()
+    new_products = {}
+
+    try:
+        with open(shard_path) as f:
+            shard = json.load(f)
+
+        with zipfile.ZipFile(context['file']) as archive, ImageIngestor(archive) as images:
+            writer = BulkImportWriter(
+                images,
+                shard.get('images', {}),
+                logger,
+                stats,
+                context['user_id'],
+                context['batch_size'],
+                context['upsert'],
+            )
+            if shard.get('products'):
+                writer.add_products(shard['products'].items())
+                new_products = {name: product.pk for name, product in writer.new_products.items()}
+            if shard.get('seller_products'):
+                writer.add_seller_products(shard['seller_products'].items())
+    except Exception as e:
+        logger.log(f'Shard {shard_path.name} failed due to {type(e).__name__}: {e}')
+    finally:
+        logger.close()
+
+    return {'stats': stats.as_dict(), 'new_products': new_products}
+
+
+def resolve_new_products(results: List[Dict], seller_shards: List[str]) -> Dict[str, int]:
+    """
+    Заменить в частях seller_product ссылки на новые товары их id.
+
+    Новые товары импортируются в разных частях, поэтому записи seller_product,
+    ссылающиеся на них по имени, получают id из результатов импорта товаров.
+
+    Args:
+        results (List[Dict]): результаты импорта частей с товарами,
+        seller_shards (List[str]): пути к частям с записями seller_product.
+
+    Returns:
+        Суммарные значения счётчиков импорта частей с товарами.
+    """
+    stats = ImportStats()
+    new_products = {}
+    for result in results:
+        stats.add(result['stats'])
+        new_products.update(result['new_products'])
+
+    for shard_path in seller_shards:
+        with open(shard_path) as f:
+            shard = json.load(f)
+        for sell_prod_data in shard['seller_products'].values():
+            product_id = new_products.get(str(sell_prod_data.get('product')))
+            if sell_prod_data.get('new') and product_id:
+                sell_prod_data['product'] = product_id
+                sell_prod_data['new'] = False
+        with open(shard_path, 'w') as f:
+            json.dump(shard, f)
+
+    return stats.as_dict()
+
+
+def finalize_import(results: List[Dict], context: Dict, product_stats: Dict = None) -> None:
+    """
+    Завершить параллельный импорт.
+
+    Собирает лог из логов частей, выставляет статус импорта, сохраняет json
+    файл импорта, удаляет рабочую директорию и загруженный файл и отправляет
+    отчёт пользователю.
+
+    Args:
+        results (List[Dict]): результаты импорта частей с записями seller_product,
+        context (Dict): контекст импорта, полученный из split_import,
+        product_stats (Dict): суммарные значения счётчиков импорта частей с товарами.
+    """
+    stats = ImportStats()
+    if product_stats:
+        stats.add(product_stats)
+    for result in results:
+        stats.add(result['stats'])
+
+    start = datetime.fromisoformat(context['start'])
+    file_manager = FileManager(start, context['filename'])
+    work_dir = Path(context['work_dir'])
+    log_path = file_manager.get_log_path()
+    _merge_logs(work_dir, log_path)
+
+    logger = ImportLogger(
+        start,
+        file_manager,
+        import_log=ProductImportLog.objects.get(pk=context['import_log']),
+        log_path=log_path,
+        progress=ImportProgress(stats),
+    )
+    if context['json']:
+        logger.log('Import finished')
+    if stats.successful_imports:
+        logger.log_result(
+            stats.successful_imports,
+            stats.product_imports,
+            stats.successful_product_imports,
+            stats.image_imports,
+            stats.successful_image_imports,
+            stats.seller_product_imports,
+            stats.successful_seller_product_imports,
+        )
+    status = get_import_status(stats.successful_imports, stats.total_imports)
+    log = logger.finalize_log(status, stats.successful_imports)
+
+    file = Path(context['file'])
+    if context['json']:
+        json_path = file_manager.get_json_path(stats.successful_imports > 0)
+        with zipfile.ZipFile(file) as archive, archive.open(context['json']) as json_file:
+            file_manager.save_stream(json_file, json_path)
+    file_manager.remove_file(file)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if context['user_id']:
+        user = Profile.objects.get(pk=context['user_id'])
+        send_import_report(user, context['email'], status, log)
+
+
+def abort_import(context: Dict, error: str) -> bool:
+    """
+    Завершить параллельный импорт, задача которого завершилась с ошибкой.
+
+    Вызывается из обработчика ошибок chord импорта. Собирает лог из логов
+    частей, выставляет статус FAILURE, удаляет рабочую директорию
+    и загруженный файл и отправляет отчёт пользователю. Уже завершённый
+    импорт, например при повторной доставке задачи, не изменяется.
+
+    Args:
+        context (Dict): контекст импорта, полученный из split_import,
+        error (str): описание ошибки.
+
+    Returns:
+        Был ли импорт завершён этим вызовом.
+    """
+    claimed = ProductImportLog.objects.filter(
+        pk=context['import_log'],
+        end__isnull=True,
+    ).update(end=datetime.now())
+    if not claimed:
+        return False
+
+    start = datetime.fromisoformat(context['start'])
+    file_manager = FileManager(start, context['filename'])
+    work_dir = Path(context['work_dir'])
+    log_path = file_manager.get_log_path()
+    _merge_logs(work_dir, log_path)
+
+    logger = ImportLogger(
+        start,
+        file_manager,
+        import_log=ProductImportLog.objects.get(pk=context['import_log']),
+        log_path=log_path,
+    )
+    logger.log(f'Import failed due to {error}')
+    status = ImportStatusEnum.FAILURE
+    log = logger.finalize_log(status, 0)
+
+    file = Path(context['file'])
+    if context['json'] and file.is_file():
+        with zipfile.ZipFile(file) as archive, archive.open(context['json']) as json_file:
+            file_manager.save_stream(json_file, file_manager.get_json_path(False))
+    file_manager.remove_file(file)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if context['user_id']:
+        user = Profile.objects.get(pk=context['user_id'])
+        send_import_report(user, context['email'], status, log)
+    return True
+
+
+def _merge_logs(work_dir: Path, log_path: Union[str, PathLike[str]]) -> None:
+    """ Собрать логи частей из рабочей директории в общий лог импорта. """
+    with open(log_path, 'wb') as log_file:
+        for part_path in sorted(work_dir.glob('*.log')):
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, log_file)
@@ -0,0 +1,221 @@
+from decimal import Decimal, InvalidOperation
+import io
+from typing import Dict, Iterable, List, Set
+import zipfile
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from account.models import Seller
+from products.models import Category, Product
+from products.services.product_import.image_import import ImageIngestor
+from products.services.product_import.import_utils import (
+    ImportLogger,
+    JsonEntriesReader,
+    batched,
+)
+
+PRODUCT_REQUIRED_FIELDS = ('name', 'category')
+SELLER_PRODUCT_REQUIRED_FIELDS = ('seller', 'product', 'count', 'price')
+
+
+class ImportValidator:
+    """
+        Класс, отвечающий за проверку архива импорта без записи в базу данных.
+
+        Json файл читается потоково, формат записей проверяется по мере чтения,
+        а существование категорий, продавцов и товаров и уникальность слагов
+        проверяются несколькими запросами по пачкам идентификаторов.
+        Изображения проверяются пулом потоков ImageIngestor.
+    """
+    def __init__(
+            self,
+            archive: zipfile.ZipFile,
+            file_names: Dict,
+            logger: ImportLogger,
+            user_id: int = None,
+            batch_size: int = None,
+            upsert: bool = False,
+    ):
+        """
+        Args:
+            archive (ZipFile): архив импорта,
+            file_names (Dict): имена файлов в архиве, полученные из get_archive_file_names,
+            logger (ImportLogger): лог импорта,
+            user_id (int): id пользователя, инициализировавшего импорт,
+            batch_size (int): количество идентификаторов в одном запросе,
+            upsert (bool): импорт будет обновлять существующие товары, поэтому занятые слаги не ошибка.
+        """
+        self.__archive = archive
+        self.__file_names = file_names
+        self.__logger = logger
+        self.__user_id = user_id
+        self.__batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.__upsert = upsert
+        self.__product_fields = {field.name for field in Product._meta.concrete_fields}
+        self.errors = 0
+        self.checked = 0
+
+    def validate(self) -> bool:
+        """
+        Проверить архив импорта.
+
+        Returns:
+            bool: True, если ошибок не найдено.
+        """
+        self.__logger.log('Validating archive')
+        slugs: Dict[str, str] = {}
+        product_names: Set[str] = set()
+        categories: Dict[int, List[str]] = {}
+        sellers: Dict[int, List[str]] = {}
+        existing_products: Dict[int, List[str]] = {}
+        new_products: Dict[str, List[str]] = {}
+
+        with self.__archive.open(self.__file_names['json']) as json_file:
+            entries = JsonEntriesReader(io.TextIOWrapper(json_file, encoding='utf-8'))
+            for section, name, content in entries:
+                if section == 'products':
+                    self.__check_product(name, content, product_names, slugs, categories)
+                elif section == 'seller_products':
+                    self.__check_seller_product(name, content, sellers, existing_products,
+                                                new_products)
+
+        if not self.__upsert:
+            self.__check_existing_slugs(slugs)
+        self.__check_categories(categories)
+        self.__check_sellers(sellers)
+        self.__check_existing_products(existing_products)
+        for product_name, names in new_products.items():
+            if product_name not in product_names:
+                self.__errors(
+                    'Seller product',
+                    names,
+                    f'new product {product_name} is not in the archive',
+                )
+        self.__check_images(product_names)
+
+        self.__logger.log(
+            f'Validation finished: checked {self.checked} entries, found {self.errors} errors'
+        )
+        return not self.errors
+
+    def __check_product(
+            self,
+            name: str,
+            content: Dict,
+            product_names: Set[str],
+            slugs: Dict[str, str],
+            categories: Dict[int, List[str]],
+    ) -> None:
+        """ Проверить формат записи товара и запомнить её ссылки для пакетной проверки. """
+        self.checked += 1
+        product_names.add(name)
+        if not isinstance(content, dict):
+            return self.__error('Product', name, 'entry is not an object')
+        missing = [field for field in PRODUCT_REQUIRED_FIELDS if not content.get(field)]
+        if missing:
+            return self.__error('Product', name, f'missing fields {", ".join(missing)}')
+        unknown = set(content) - self.__product_fields
+        if unknown:
+            return self.__error('Product', name, f'unknown fields {", ".join(sorted(unknown))}')
+        try:
+            category = int(content['category'])
+        except (TypeError, ValueError):
+            return self.__error('Product', name, f'invalid category {content["category"]}')
+
+        slug = content.get('slug') or slugify(content['name'])
+        if slug in slugs:
+            return self.__error('Product', name, f'slug {slug} is also used by {slugs[slug]}')
+        slugs[slug] = name
+        categories.setdefault(category, []).append(name)
+
+    def __check_seller_product(
+            self,
+            name: str,
+            content: Dict,
+            sellers: Dict[int, List[str]],
+            existing_products: Dict[int, List[str]],
+            new_products: Dict[str, List[str]],
+    ) -> None:
+        """ Проверить формат записи seller_product и запомнить её ссылки для пакетной проверки. """
+        self.checked += 1
+        if not isinstance(content, dict):
+            return self.__error('Seller product', name, 'entry is not an object')
+        missing = [field for field in SELLER_PRODUCT_REQUIRED_FIELDS if content.get(field) is None]
+        if missing:
+            return self.__error('Seller product', name, f'missing fields {", ".join(missing)}')
+        try:
+            seller = int(content['seller'])
+            if int(content['count']) < 0:
+                raise ValueError
+            if Decimal(str(content['price'])) < 0:
+                raise ValueError
+        except (TypeError, ValueError, InvalidOperation):
+            return self.__error('Seller product', name, 'invalid seller, count or price')
+
+        if content.get('new'):
+            new_products.setdefault(str(content['product']), []).append(name)
+        else:
+            try:
+                existing_products.setdefault(int(content['product']), []).append(name)
+            except (TypeError, ValueError):
+                return self.__error('Seller product', name, f'invalid product {content["product"]}')
+        sellers.setdefault(seller, []).append(name)
+
+    def __check_existing_slugs(self, slugs: Dict[str, str]) -> None:
+        """ Проверить, что слаги новых товаров не заняты. """
+        for batch in batched(slugs, self.__batch_size):
+            for slug in Product.objects.filter(slug__in=batch).values_list('slug', flat=True):
+                self.__error('Product', slugs[slug], f'product with slug {slug} already exists')
+
+    def __check_categories(self, categories: Dict[int, List[str]]) -> None:
+        """ Проверить существование категорий товаров. """
+        for batch in batched(categories, self.__batch_size):
+            existing = set(Category.objects.filter(pk__in=batch).values_list('pk', flat=True))
+            for category in set(batch) - existing:
+                self.__errors('Product', categories[category], f'category {category} does not exist')
+
+    def __check_sellers(self, sellers: Dict[int, List[str]]) -> None:
+        """ Проверить существование продавцов и права пользователя на добавление их товаров. """
+        for batch in batched(sellers, self.__batch_size):
+            existing = Seller.objects.filter(pk__in=batch).select_related('profile').in_bulk()
+            for seller_id in batch:
+                seller = existing.get(seller_id)
+                if not seller:
+                    self.__errors('Seller product', sellers[seller_id],
+                                  f'seller {seller_id} does not exist')
+                    continue
+                owner = seller.profile
+                if self.__user_id and not (owner.pk == self.__user_id or
+                                           owner.is_superuser or
+                                           owner.is_staff):
+                    self.__errors('Seller product', sellers[seller_id],
+                                  f'can\'t add products for someone else\'s seller {seller_id}')
+
+    def __check_existing_products(self, products: Dict[int, List[str]]) -> None:
+        """ Проверить существование товаров, на которые ссылаются записи seller_product. """
+        for batch in batched(products, self.__batch_size):
+            existing = set(Product.objects.filter(pk__in=batch).values_list('pk', flat=True))
+            for product in set(batch) - existing:
+                self.__errors('Seller product', products[product], f'product {product} does not exist')
+
+    def __check_images(self, product_names: Set[str]) -> None:
+        """ Проверить, что изображения товаров из архива можно прочитать. """
+        image_names = (
+            image_name
+            for product_name in product_names
+            for image_name in self.__file_names.get(product_name, [])
+        )
+        with ImageIngestor(self.__archive) as images:
+            for image_name, error in images.verify(image_names):
+                self.checked += 1
+                if error:
+                    self.__error('Image', image_name, f'{type(error).__name__}: {error}')
+
+    def __errors(self, kind: str, names: Iterable[str], reason: str) -> None:
+        for name in names:
+            self.__error(kind, name, reason)
+
+    def __error(self, kind: str, name: str, reason: str) -> None:
+        self.errors += 1
+        self.__logger.log(f'{kind} ({name}) validation failed: {reason}')
@@ -0,0 +1,69 @@
+import random
+from typing import List
+
+from django.db.models import Max, Min, QuerySet
+
+
+SAMPLE_FETCH_ALL_LIMIT = 500
+
+
+def sample_ids(queryset: QuerySet, amount: int) -> List[int]:
+    """
+    Сервис для выбора id случайных записей queryset без загрузки всех записей.
+
+    Сначала одним запросом загружается не больше SAMPLE_FETCH_ALL_LIMIT + 1 id.
+    Если подходящих записей не больше SAMPLE_FETCH_ALL_LIMIT (например, для
+    избирательных фильтров вроде limited=True), id выбираются из них в памяти.
+    Иначе подходящих записей много, и случайное значение выбирается в диапазоне
+    id, после чего берётся ближайшая подходящая запись с id не меньше него
+    (или, если таких нет, ближайшая меньше него). Уже выбранные записи
+    исключаются, поэтому каждый выбор - один запрос по индексу первичного
+    ключа, а запросов не больше amount. Записи после больших пропусков в id
+    выбираются чаще, что для баннеров допустимо.
+
+    args:
+        queryset - отфильтрованный queryset, из которого выбираются записи;
+        amount - количество выбираемых записей.
+
+    return:
+        id выбранных записей без повторов в порядке выбора.
+    """
+    if amount <= 0:
+        return []
+
+    ids_queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    head = list(ids_queryset[:SAMPLE_FETCH_ALL_LIMIT + 1])
+    if len(head) <= SAMPLE_FETCH_ALL_LIMIT:
+        return random.sample(head, min(amount, len(head)))
+
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    ids = []
+    while len(ids) < amount:
+        pivot = random.randint(bounds['low'], bounds['high'])
+        candidates = ids_queryset.exclude(pk__in=ids)
+        pk = candidates.filter(pk__gte=pivot).first()
+        if pk is None:
+            pk = candidates.filter(pk__lt=pivot).last()
+        if pk is None:
+            break
+        ids.append(pk)
+    return ids
+
+
+def sample(queryset: QuerySet, amount: int) -> List:
+    """
+    Сервис для выбора случайных записей queryset.
+
+    Выбираются только id, затем загружаются только выбранные записи
+    со всеми select_related и prefetch_related исходного queryset.
+
+    args:
+        queryset - отфильтрованный queryset, из которого выбираются записи;
+        amount - количество выбираемых записей.
+
+    return:
+        Выбранные записи в случайном порядке.
+    """
+    ids = sample_ids(queryset, amount)
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,205 @@
+import io
+import logging
+from os import path
+from typing import Iterable, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import SafeString, mark_safe
+from kombu.exceptions import OperationalError
+from PIL import Image, ImageOps
+
+from products.models import Picture
+from products.services.dto import CacheableDTO
+
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+THUMBNAIL_SCHEDULED_KEY = 'picture_thumbnails_scheduled_{pk}'
+
+logger = logging.getLogger(__name__)
+
+
+class Thumbnail(CacheableDTO):
+    """
+        DTO со ссылками на миниатюру изображения товара в форматах WebP и JPEG.
+
+        Пригодный для кэширования. Если миниатюры ещё не созданы,
+        jpeg ссылается на оригинал изображения, а webp пуст.
+    """
+    __slots__ = ('jpeg', 'webp')
+
+    def __init__(self, jpeg: str = '', webp: str = ''):
+        self.jpeg = jpeg
+        self.webp = webp
+
+    def __bool__(self) -> bool:
+        return bool(self.jpeg)
+
+
+def get_thumbnail_name(image_name: str, size: str, fmt: str) -> str:
+    """
+    Получить имя файла миниатюры в хранилище.
+
+    Миниатюры хранятся рядом с оригиналом в поддиректории thumbnails.
+
+    Args:
+        image_name (str): имя файла оригинала в хранилище,
+        size (str): название размера из PICTURE_THUMBNAIL_SIZES,
+        fmt (str): формат миниатюры из THUMBNAIL_FORMATS.
+    """
+    directory, filename = path.split(image_name)
+    stem = path.splitext(filename)[0]
+    return path.join(directory, THUMBNAIL_DIR, f'{stem}_{size}.{fmt}')
+
+
+def get_thumbnail(picture: Picture = None, size: str = 'medium') -> Thumbnail:
+    """
+    Получить ссылки на миниатюру изображения товара.
+
+    Для изображений без миниатюр возвращается ссылка на оригинал,
+    а создание миниатюр ставится в очередь.
+
+    Args:
+        picture (Picture): изображение товара,
+        size (str): название размера из PICTURE_THUMBNAIL_SIZES.
+    """
+    if picture is None or not picture.image:
+        return Thumbnail()
+    if not picture.thumbnails_ready:
+        schedule_thumbnails([picture.pk])
+        return Thumbnail(picture.image.url)
+
+    storage = picture.image.storage
+    return Thumbnail(
+        jpeg=storage.url(get_thumbnail_name(picture.image.name, size, 'jpeg')),
+        webp=storage.url(get_thumbnail_name(picture.image.name, size, 'webp')),
+    )
+
+
+def thumbnail_url(picture: Picture = None, size: str = 'medium') -> str:
+    """ Получить ссылку на JPEG миниатюру изображения товара. """
+    return get_thumbnail(picture, size).jpeg
+
+
+def thumbnail(image: Union[Picture, Thumbnail, None], size: str = 'medium', **attrs) -> SafeString:
+    """
+    Шаблонный хелпер, выводящий миниатюру изображения товара тегом picture.
+
+    Браузеры с поддержкой WebP получают WebP миниатюру, остальные - JPEG.
+
+    Args:
+        image (Union[Picture, Thumbnail, None]): изображение товара или DTO миниатюры,
+        size (str): название размера из PICTURE_THUMBNAIL_SIZES,
+        attrs: атрибуты тега img, class можно передать как class_.
+    """
+    if not isinstance(image, Thumbnail):
+        image = get_thumbnail(image, size)
+    if not image:
+        return mark_safe('')
+
+    img = format_html(
+        '<img src="{}"{} />',
+        image.jpeg,
+        format_html_join('', ' {}="{}"', ((name.rstrip('_'), value) for name, value in attrs.items())),
+    )
+    if not image.webp:
+        return img
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp" />{}</picture>',
+        image.webp,
+        img,
+    )
+
+
+def schedule_thumbnails(picture_ids: Iterable[int]) -> None:
+    """
+    Поставить в очередь создание миниатюр изображений после фиксации транзакции.
+
+    Повторная постановка одного изображения в очередь откладывается
+    на PICTURE_THUMBNAIL_RETRY_TIMEOUT секунд. Вызывается в том числе
+    при рендеринге страниц, поэтому ошибка постановки в очередь только
+    логируется, а изображение остаётся без миниатюр до следующей попытки.
+
+    Args:
+        picture_ids (Iterable[int]): id изображений товаров.
+    """
+    from products.tasks import generate_picture_thumbnails
+
+    picture_ids = [
+        pk for pk in picture_ids
+        if pk and cache.add(
+            THUMBNAIL_SCHEDULED_KEY.format(pk=pk),
+            True,
+            timeout=settings.PICTURE_THUMBNAIL_RETRY_TIMEOUT,
+        )
+    ]
+    if not picture_ids:
+        return
+
+    def enqueue() -> None:
+        try:
+            generate_picture_thumbnails.delay(picture_ids)
+        except (OperationalError, OSError):
+            logger.exception('Thumbnails for pictures %s could not be scheduled', picture_ids)
+            cache.delete_many([THUMBNAIL_SCHEDULED_KEY.format(pk=pk) for pk in picture_ids])
+
+    transaction.on_commit(enqueue)
+
+
+def generate_thumbnails(picture: Picture) -> None:
+    """
+    Создать миниатюры изображения товара всех размеров из PICTURE_THUMBNAIL_SIZES.
+
+    Файл изображения общий для записей с одинаковым содержимым, поэтому
+    миниатюры создаются один раз на файл, а остальные записи только
+    отмечаются готовыми. Иначе существующие миниатюры перезаписываются.
+
+    Args:
+        picture (Picture): изображение товара.
+    """
+    same_image = Picture.objects.filter(image=picture.image.name)
+    if not same_image.filter(thumbnails_ready=True).exclude(pk=picture.pk).exists():
+        _render_thumbnails(picture)
+
+    same_image.update(thumbnails_ready=True)
+    picture.thumbnails_ready = True
+    cache.delete(THUMBNAIL_SCHEDULED_KEY.format(pk=picture.pk))
+
+
+def _render_thumbnails(picture: Picture) -> None:
+    """ Создать и сохранить миниатюры изображения всех размеров и форматов. """
+    storage = picture.image.storage
+    with picture.image.open('rb') as image_file, Image.open(image_file) as original:
+        original.load()
+        original = ImageOps.exif_transpose(original)
+
+    for size, dimensions in settings.PICTURE_THUMBNAIL_SIZES.items():
+        rendition = original.copy()
+        rendition.thumbnail(dimensions, Image.LANCZOS)
+        for fmt, image_format in THUMBNAIL_FORMATS.items():
+            content = io.BytesIO()
+            _convert(rendition, fmt).save(
+                content,
+                image_format,
+                quality=settings.PICTURE_THUMBNAIL_QUALITY,
+            )
+            name = get_thumbnail_name(picture.image.name, size, fmt)
+            storage.save_derivative(name, ContentFile(content.getvalue()))
+
+
+def _convert(image: Image.Image, fmt: str) -> Image.Image:
+    """ Привести изображение к режиму, который поддерживает формат миниатюры. """
+    if fmt == 'webp':
+        return image if image.mode in ('RGB', 'RGBA') else image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
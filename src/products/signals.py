@@ -1,8 +1,19 @@
-from django.core.cache import cache
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from products.models import Product, SellerProduct
+from catalog.models import Review
+from discounts.models import Discount
+from products.context_processors import clear_active_discounts_cache, clear_category_cache
+from products.models import Category, ImportStatusEnum, Picture, Product, ProductImportLog, SellerProduct
+from products.services import cache_utils
+from products.services.pictures import delete_unreferenced_images, update_primary_images
+from products.services.thumbnails import schedule_thumbnails
+from products.views import PRODUCT_DETAILS_KEY
+
+CATALOG_TAG = 'catalog'
+COMMON_TAG = 'common'
+PRODUCT_TAG = 'product:{slug}'
 
 
 @receiver(post_save, sender=Product)
@@ -10,8 +21,7 @@ def clear_product_cache(sender, instance, **kwargs) -> None:
     """
     Очистка кеша модели Product при изменении товара в БД.
     """
-    cache_key = f'product_details_{instance.pk}'
-    cache.delete(cache_key)
+    cache_utils.delete_namespaced(PRODUCT_DETAILS_KEY.format(slug=instance.slug))
 
 
 @receiver(post_save, sender=SellerProduct)
@@ -20,5 +30,139 @@ def clear_sellerproduct_cache(sender, instance, **kwargs) -> None:
     Очистка кеша при добавлении/изменении товара продавцом
     """
     product = instance.product
-    cache_key = f'product_details_{product.pk}'
-    cache.delete(cache_key)
+    cache_utils.delete_namespaced(PRODUCT_DETAILS_KEY.format(slug=product.slug))
+
+
+@receiver(post_save, sender=Picture)
+def set_primary_image(sender, instance, created, raw=False, **kwargs) -> None:
+    """
+    Назначение изображения основным, если у товара ещё нет основного изображения.
+    """
+    if created and not raw:
+        Product.objects.filter(
+            pk=instance.product_id,
+            primary_image__isnull=True,
+        ).update(primary_image=instance)
+
+
+@receiver(post_delete, sender=Picture)
+def replace_primary_image(sender, instance, **kwargs) -> None:
+    """
+    Назначение нового основного изображения после удаления изображения товара.
+
+    Ссылка на удалённое изображение обнуляется до удаления (on_delete=SET_NULL).
+    """
+    update_primary_images([instance.product_id])
+
+
+@receiver(pre_save, sender=Picture)
+def remember_replaced_image(sender, instance, raw=False, **kwargs) -> None:
+    """
+    Запоминание файла изображения, который заменяется при изменении записи.
+    """
+    if raw or not instance.pk:
+        return
+    old_image = Picture.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+    if old_image and old_image != instance.image.name:
+        instance._replaced_image = old_image
+
+
+@receiver(post_save, sender=Picture)
+def process_picture_image(sender, instance, created, raw=False, **kwargs) -> None:
+    """
+    Создание миниатюр добавленного или заменённого изображения товара
+    и удаление заменённого файла, если на него больше нет ссылок.
+    После фиксации записи с файла снимается пометка повторного использования.
+    """
+    if raw:
+        return
+    old_image = instance.__dict__.pop('_replaced_image', None)
+    if not created and not old_image:
+        return
+    name = instance.image.name
+    transaction.on_commit(lambda: instance.image.storage.release(name))
+    if old_image:
+        Picture.objects.filter(pk=instance.pk).update(thumbnails_ready=False)
+        instance.thumbnails_ready = False
+        transaction.on_commit(lambda: delete_unreferenced_images([old_image]))
+    schedule_thumbnails([instance.pk])
+
+
+@receiver(post_delete, sender=Picture)
+def delete_picture_image(sender, instance, **kwargs) -> None:
+    """
+    Удаление файла изображения вместе с последней ссылающейся на него записью.
+    """
+    name = instance.image.name
+    transaction.on_commit(lambda: delete_unreferenced_images([name]))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def clear_menu_cache(sender, **kwargs) -> None:
+    """
+    Очистка кэша меню категорий при изменении категории.
+    """
+    clear_category_cache()
+
+
+def clear_discounts_cache(sender, **kwargs) -> None:
+    """
+    Очистка кэша количества активных скидок и страниц при изменении скидки.
+    """
+    clear_active_discounts_cache()
+    cache_utils.invalidate_tags(CATALOG_TAG, COMMON_TAG)
+
+
+for discount_model in Discount.__subclasses__():
+    post_save.connect(clear_discounts_cache, sender=discount_model)
+    post_delete.connect(clear_discounts_cache, sender=discount_model)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs) -> None:
+    """
+    Сброс кэша страниц каталога и страницы товара при изменении товара.
+    """
+    cache_utils.invalidate_tags(CATALOG_TAG, PRODUCT_TAG.format(slug=instance.slug))
+
+
+@receiver([post_save, post_delete], sender=SellerProduct)
+@receiver([post_save, post_delete], sender=Picture)
+def invalidate_product_related_pages(sender, instance, **kwargs) -> None:
+    """
+    Сброс кэша страниц каталога и страницы товара при изменении предложений и изображений товара.
+    """
+    slug = Product.objects.filter(pk=instance.product_id).values_list('slug', flat=True).first()
+    cache_utils.invalidate_tags(CATALOG_TAG, PRODUCT_TAG.format(slug=slug))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_pages(sender, **kwargs) -> None:
+    """
+    Сброс кэша всех страниц при изменении категории, в том числе меню.
+    """
+    cache_utils.invalidate_tags(CATALOG_TAG, COMMON_TAG)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_pages(sender, instance, **kwargs) -> None:
+    """
+    Сброс кэша страницы товара при добавлении или удалении отзыва.
+    """
+    slug = Product.objects.filter(pk=instance.product_id).values_list('slug', flat=True).first()
+    cache_utils.invalidate_tags(PRODUCT_TAG.format(slug=slug))
+
+
+@receiver(post_save, sender=ProductImportLog)
+def invalidate_imported_pages(sender, instance, **kwargs) -> None:
+    """
+    Сброс кэша всех страниц по завершении импорта, сохраняющего товары без сигналов.
+
+    Проверка архива без записи (dry_run) и импорт без сохранённых
+    записей кэш не сбрасывают.
+    """
+    if (
+        instance.status in (ImportStatusEnum.SUCCESS, ImportStatusEnum.PARTIAL_SUCCESS)
+        and instance.items_imported > 0
+    ):
+        cache_utils.invalidate_tags(CATALOG_TAG, COMMON_TAG)
@@ -0,0 +1,112 @@
+import hashlib
+import os
+from typing import IO, Union
+
+import celery
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+REUSE_KEY = 'picture_reuse_{name}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+        Файловое хранилище, называющее файлы по sha256 хэшу их содержимого.
+
+        Файлы с одинаковым содержимым сохраняются один раз, а повторное
+        сохранение возвращает имя уже существующего файла. Файл пишется
+        под временным именем и переименовывается атомарно, поэтому
+        одновременное сохранение одинаковых файлов безопасно.
+
+        Повторно используемый файл помечается в кэше до фиксации ссылающейся
+        на него записи (см. reuse и delete_unused), чтобы его не удалил
+        процесс, не видящий ещё не зафиксированную запись.
+    """
+    def save(self, name: str, content: Union[File, IO], max_length: int = None) -> str:
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        file_hash = hashlib.sha256()
+        for chunk in content.chunks():
+            file_hash.update(chunk)
+        name = self.get_hashed_name(name, file_hash.hexdigest())
+        if self.reuse(name):
+            return name
+
+        return self.save_derivative(name, content, max_length)
+
+    def reuse(self, name: str) -> bool:
+        """
+        Пометить файл как используемый новой записью, если он уже сохранён.
+
+        Пометка ставится до проверки существования файла и хранится
+        PICTURE_REUSE_TIMEOUT секунд или до вызова release.
+
+        Returns:
+            Существует ли файл.
+        """
+        cache.set(REUSE_KEY.format(name=name), True, timeout=settings.PICTURE_REUSE_TIMEOUT)
+        return self.exists(name)
+
+    def release(self, name: str) -> None:
+        """ Снять пометку повторного использования после фиксации ссылающейся на файл записи. """
+        cache.delete(REUSE_KEY.format(name=name))
+
+    def delete_unused(self, name: str) -> bool:
+        """
+        Удалить файл, если он не помечен как повторно используемый.
+
+        Файл сначала атомарно переименовывается, поэтому reuse, вызванный
+        после проверки пометки, уже не найдёт файл и сохранит его заново,
+        а помеченный файл возвращается на место.
+
+        Returns:
+            Был ли файл удалён.
+        """
+        path = self.path(name)
+        removed_path = f'{path}.{celery.uuid()}.deleted'
+        try:
+            os.rename(path, removed_path)
+        except FileNotFoundError:
+            return True
+        if cache.get(REUSE_KEY.format(name=name)):
+            os.replace(removed_path, path)
+            return False
+        os.remove(removed_path)
+        return True
+
+    def save_derivative(self, name: str, content: Union[File, IO], max_length: int = None) -> str:
+        """
+        Сохранить файл под заданным именем, перезаписав существующий.
+
+        Используется для производных файлов, например миниатюр, имена
+        которых получены из имени исходного файла.
+
+        Args:
+            name (str): имя файла в хранилище,
+            content (Union[File, IO]): содержимое файла,
+            max_length (int): максимальная длина имени файла.
+        """
+        temp_name = super().save(f'{name}.{celery.uuid()}.part', content, max_length)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    @staticmethod
+    def get_hashed_name(name: str, file_hash: str) -> str:
+        """
+        Получить имя файла в хранилище по хэшу его содержимого.
+
+        Файлы раскладываются по поддиректориям по первым символам хэша,
+        расширение исходного имени сохраняется.
+
+        Args:
+            name (str): исходное имя файла с директорией,
+            file_hash (str): sha256 хэш содержимого файла.
+        """
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, file_hash[:2], f'{file_hash}{extension}').replace('\\', '/')
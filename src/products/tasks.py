@@ -1,9 +1,35 @@
 from os import PathLike
-from typing import Union
+from pathlib import Path
+from typing import Dict, List, Optional, Union
 
-from celery import shared_task
+from celery import chord, shared_task
+from celery.result import AsyncResult
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from kombu.exceptions import OperationalError
 
+from products.models import Picture, ProductImportLog
+from products.services.banners import refresh_banner_cache
+from products.services.pictures import delete_unreferenced_images
 from products.services.product_import.product_importer import ProductImporter
+from products.services.product_import.scheduler import (
+    claim_pending_files,
+    get_free_import_slots,
+    release_import,
+)
+from products.services.product_import.sharded_import import (
+    abort_import,
+    finalize_import,
+    import_shard,
+    resolve_new_products,
+    split_import,
+)
+from products.services.thumbnails import generate_thumbnails
+
+SCHEDULER_LOCK_KEY = 'product_import_scheduler_lock'
+
+logger = get_task_logger(__name__)
 
 
 @shared_task
@@ -11,5 +37,185 @@ def import_products(
     file: Union[str, PathLike[str], bytes],
     user_id: int = 0,
     email: str = '',
+    bulk: bool = False,
+    batch_size: int = None,
+    file_hash: str = None,
+    sharded: bool = False,
+    upsert: bool = False,
+    import_log_id: int = None,
 ):
-    ProductImporter(file, user_id, email)
+    if sharded:
+        start_sharded_import(file, user_id, email, file_hash, batch_size, upsert, import_log_id)
+        return
+
+    ProductImporter(
+        file,
+        user_id,
+        email,
+        bulk=bulk,
+        batch_size=batch_size,
+        file_hash=file_hash,
+        upsert=upsert,
+        import_log_id=import_log_id,
+    )
+
+
+@shared_task
+def schedule_pending_imports(
+    files: List[str] = None,
+    email: str = '',
+    bulk: bool = False,
+    batch_size: int = None,
+    sharded: bool = False,
+    upsert: bool = False,
+) -> int:
+    """
+    Запустить импорт файлов из IMPORT_PENDING_DIR.
+
+    Файлы захватываются переименованием, дубликаты уже импортированных
+    файлов пропускаются, а количество одновременных импортов ограничено
+    IMPORT_MAX_CONCURRENT. Оставшиеся файлы будут захвачены при следующем
+    запуске задачи по расписанию CELERY_BEAT_SCHEDULE.
+
+    Returns:
+        Количество запущенных импортов.
+    """
+    if not cache.add(SCHEDULER_LOCK_KEY, True, timeout=settings.IMPORT_SCHEDULER_LOCK_TIMEOUT):
+        return 0
+    try:
+        slots = get_free_import_slots()
+        if not slots:
+            return 0
+        started = 0
+        for file_path, file_hash, import_log in claim_pending_files(slots, files):
+            task = enqueue_import(
+                file_path,
+                file_hash,
+                import_log,
+                email=email,
+                bulk=bulk,
+                batch_size=batch_size,
+                sharded=sharded,
+                upsert=upsert,
+            )
+            started += task is not None
+        return started
+    finally:
+        cache.delete(SCHEDULER_LOCK_KEY)
+
+
+def enqueue_import(
+    file_path: Path,
+    file_hash: str,
+    import_log: ProductImportLog,
+    **options,
+) -> Optional[AsyncResult]:
+    """
+    Поставить в очередь импорт захваченного файла.
+
+    Если брокер недоступен, запись лога завершается со статусом FAILURE,
+    а файл возвращается в IMPORT_PENDING_DIR, откуда его снова захватит
+    планировщик.
+
+    Args:
+        file_path (Path): путь к захваченному файлу,
+        file_hash (str): sha256 хэш содержимого файла,
+        import_log (ProductImportLog): запись лога, созданная при захвате файла,
+        options: остальные параметры задачи import_products.
+
+    Returns:
+        Результат поставленной задачи или None, если задачу не удалось поставить в очередь.
+    """
+    try:
+        return import_products.delay(
+            file_path.as_posix(),
+            file_hash=file_hash,
+            import_log_id=import_log.pk,
+            **options,
+        )
+    except (OperationalError, OSError) as e:
+        logger.exception('Import of %s could not be queued', file_path.name)
+        release_import(file_path, import_log, f'{type(e).__name__}: {e}')
+        return None
+
+
+def start_sharded_import(
+    file: Union[str, PathLike[str]],
+    user_id: int = 0,
+    email: str = '',
+    file_hash: str = None,
+    batch_size: int = None,
+    upsert: bool = False,
+    import_log_id: int = None,
+) -> None:
+    """
+    Разбить архив на части и запустить их параллельный импорт.
+
+    Сначала параллельно импортируются части с товарами, затем части
+    с записями seller_product, которые могут ссылаться на новые товары
+    из любой части, затем импорт завершается задачей finalize_products_import.
+    Если какая-либо задача импорта упала, обработчик ошибок тела chord
+    fail_products_import завершает импорт с ошибкой.
+    """
+    context, product_shards, seller_shards = split_import(
+        file,
+        user_id,
+        email,
+        file_hash=file_hash,
+        batch_size=batch_size,
+        upsert=upsert,
+        import_log_id=import_log_id,
+    )
+    seller_products = import_seller_product_shards.s(context, seller_shards)
+    seller_products.link_error(fail_products_import.s(context))
+    if product_shards:
+        chord(import_products_shard.s(context, shard) for shard in product_shards)(seller_products)
+    else:
+        seller_products.delay([])
+
+
+
+@shared_task
+def import_products_shard(context: Dict, shard_path: str) -> Dict:
+    return import_shard(context, shard_path)
+
+
+@shared_task
+def import_seller_product_shards(results: List[Dict], context: Dict, seller_shards: List[str]):
+    product_stats = resolve_new_products(results, seller_shards)
+    finalize = finalize_products_import.s(context, product_stats)
+    finalize.link_error(fail_products_import.s(context))
+    if seller_shards:
+        chord(import_products_shard.s(context, shard) for shard in seller_shards)(finalize)
+    else:
+        finalize.delay([])
+
+
+@shared_task
+def finalize_products_import(results: List[Dict], context: Dict, product_stats: Dict):
+    finalize_import(results, context, product_stats)
+
+
+@shared_task
+def fail_products_import(request, exc, traceback, context: Dict):
+    logger.error('Sharded import %s failed in task %s: %r', context['import_log'], request.id, exc)
+    abort_import(context, f'{type(exc).__name__}: {exc}')
+
+
+@shared_task
+def generate_picture_thumbnails(picture_ids: List[int]):
+    for picture in Picture.objects.filter(pk__in=picture_ids).exclude(image=''):
+        try:
+            generate_thumbnails(picture)
+        except Exception:
+            logger.exception('Thumbnails for picture %s failed', picture.pk)
+
+
+@shared_task
+def delete_picture_images(names: List[str]):
+    delete_unreferenced_images(names, retry=False)
+
+
+@shared_task
+def refresh_banners(keys: List[str] = None, language: str = None):
+    refresh_banner_cache(keys, language=language)
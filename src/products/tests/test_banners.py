@@ -0,0 +1,153 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
+from kombu.exceptions import OperationalError
+
+from account.models import Profile, Seller
+from products.models import Category, Product, SellerProduct
+from products.services import cache_utils
+from products.services.banners import (
+    BANNER_BUILDERS,
+    FIXED_KEY,
+    LIMITED_OFFERS_KEY,
+    SLIDER_KEY,
+    TOP_SELLERS_KEY,
+    Banner,
+    TopSellerProduct,
+    refresh_banner_cache,
+)
+from products.services.dto import pack
+from products.services.sampling import sample, sample_ids
+
+
+@override_settings(CACHE_REBUILD_BETA=1.0, CACHE_REBUILD_GRACE=60, CACHE_REBUILD_LOCK_TIMEOUT=60)
+class CacheRebuildTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.builder = mock.Mock(return_value='value')
+        self.refresh = mock.Mock()
+
+    def get(self, timeout: int = 60):
+        return cache_utils.get_or_build('key', self.builder, lambda: timeout, self.refresh, 'default')
+
+    def test_cold_miss_is_built_once(self):
+        self.assertEqual(self.get(), 'value')
+        self.assertEqual(self.get(), 'value')
+        self.builder.assert_called_once()
+        self.refresh.assert_not_called()
+
+    def test_cold_miss_during_rebuild_returns_default(self):
+        cache_utils.acquire_lock('key')
+        self.assertEqual(self.get(), 'default')
+        self.builder.assert_not_called()
+
+    def test_expired_value_is_refreshed_in_background(self):
+        cache.set('key', (pack('stale'), time.time() - 1, 0.1))
+
+        self.assertEqual(self.get(), 'stale')
+        self.assertEqual(self.get(), 'stale')
+        self.builder.assert_not_called()
+        self.refresh.assert_called_once_with('key')
+
+
+class BannerPrewarmTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        category = Category.objects.create(name="category")
+        profile = Profile.objects.create_user(username="seller", email="seller@example.com", password='123')
+        seller = Seller.objects.create(name="seller", description="seller", profile=profile)
+        for i in range(3):
+            product = Product.objects.create(category=category, name=f"product {i}", slug=f"product-{i}",
+                                             sort_index=i)
+            SellerProduct.objects.create(product=product, seller=seller, count=1, price=10)
+
+    def test_prewarm_builds_all_banners(self):
+        self.assertEqual(
+            set(refresh_banner_cache()),
+            {cache_utils.get_namespaced_key(key, language)
+             for key in (FIXED_KEY, SLIDER_KEY, TOP_SELLERS_KEY, LIMITED_OFFERS_KEY)
+             for language in ('ru', 'en')},
+        )
+        self.assertEqual(refresh_banner_cache(), [])
+
+        with self.assertNumQueries(0):
+            banner = Banner()
+            top_sellers = TopSellerProduct.get_top_sellers()
+        self.assertEqual(len(banner.slider), 3)
+        self.assertEqual([card.name for card in top_sellers], ['product 2', 'product 1', 'product 0'])
+
+    def test_prewarm_refreshes_expiring_banners(self):
+        refresh_banner_cache()
+        slider_key = cache_utils.get_namespaced_key(SLIDER_KEY, 'en')
+        value, _, delta = cache.get(slider_key)
+        cache.set(slider_key, (value, time.time() + 10, delta))
+
+        self.assertEqual(refresh_banner_cache(ahead=60), [slider_key])
+        self.assertGreater(cache_utils.expires_in(slider_key), 60)
+
+    def test_banners_are_cached_per_language(self):
+        Product.objects.filter(name='product 2').update(name_en='english product')
+
+        with translation.override('en'):
+            self.assertEqual(TopSellerProduct.get_top_sellers()[0].name, 'english product')
+        with translation.override('ru'):
+            self.assertEqual(TopSellerProduct.get_top_sellers()[0].name, 'product 2')
+        with translation.override('en'), self.assertNumQueries(0):
+            self.assertEqual(TopSellerProduct.get_top_sellers()[0].name, 'english product')
+
+    def test_stale_value_is_served_when_broker_is_down(self):
+        refresh_banner_cache()
+        slider_key = cache_utils.get_namespaced_key(SLIDER_KEY, 'ru')
+        value, _, delta = cache.get(slider_key)
+        cache.set(slider_key, (value, time.time() - 1, delta))
+
+        with mock.patch('products.tasks.refresh_banners.delay', side_effect=OperationalError), \
+                translation.override('ru'):
+            self.assertEqual(len(Banner().slider), 3)
+        self.assertTrue(cache_utils.acquire_lock(slider_key))
+
+    def test_failing_builder_releases_locks(self):
+        failing = mock.Mock(side_effect=RuntimeError)
+        with mock.patch.dict(BANNER_BUILDERS, {FIXED_KEY: (failing, lambda: 60)}):
+            refreshed = refresh_banner_cache(language='ru')
+
+        self.assertEqual(len(refreshed), 3)
+        for key in BANNER_BUILDERS:
+            self.assertTrue(cache_utils.acquire_lock(cache_utils.get_namespaced_key(key, 'ru')))
+
+
+class SamplingTest(TestCase):
+    def setUp(self) -> None:
+        self.category = Category.objects.create(name="category")
+        self.products = [
+            Product.objects.create(category=self.category, name=f"product {i}", slug=f"product-{i}")
+            for i in range(10)
+        ]
+
+    def test_sample_ids(self):
+        queryset = Product.objects.filter(pk__in=[product.pk for product in self.products[::2]])
+        with CaptureQueriesContext(connection) as queries:
+            ids = sample_ids(queryset, 3)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(set(ids) <= set(queryset.values_list('pk', flat=True)))
+
+    def test_sample_ids_of_large_queryset(self):
+        queryset = Product.objects.filter(pk__in=[product.pk for product in self.products[::2]])
+        with mock.patch('products.services.sampling.SAMPLE_FETCH_ALL_LIMIT', 2), \
+                CaptureQueriesContext(connection) as queries:
+            ids = sample_ids(queryset, 3)
+        self.assertLessEqual(len(queries), 2 + 2 * 3)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(set(ids) <= set(queryset.values_list('pk', flat=True)))
+
+    def test_sample_more_than_available(self):
+        queryset = Product.objects.filter(pk__in=[self.products[0].pk, self.products[-1].pk])
+        self.assertEqual(sorted(product.pk for product in sample(queryset, 5)),
+                         [self.products[0].pk, self.products[-1].pk])
+        self.assertEqual(sample(Product.objects.none(), 3), [])
@@ -0,0 +1,65 @@
+from decimal import Decimal
+import hashlib
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from products.context_processors import CATEGORIES_KEY, MenuCategory, get_menu_categories
+from products.models import Category, Product
+from products.services import cache_utils
+from products.services.banners import Banner, LimitedProduct
+from products.services.dto import SCHEMA_VERSION, StaleSchemaError, pack, unpack
+from products.services.thumbnails import Thumbnail
+
+
+class CacheableDTOTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.category = Category.objects.create(name="category", slug="category")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="product",
+            slug="product",
+            description="word " * 100,
+        )
+
+    def test_dto_has_no_instance_dict(self):
+        slider = Banner.SliderProduct(self.product)
+        self.assertFalse(hasattr(slider, '__dict__'))
+        self.assertEqual(slider.fields, ('pk', 'name', 'absolute_url', 'image', 'description'))
+        self.assertLess(len(slider.description), len(self.product.description))
+
+    def test_pack_roundtrip(self):
+        offer = LimitedProduct.__new__(LimitedProduct)
+        for field, value in zip(LimitedProduct.fields, (1, 'offer', '/offer/', Thumbnail('/a.jpg', '/a.webp'),
+                                                        'category', Decimal('10.00'), Decimal('9.00'), None)):
+            setattr(offer, field, value)
+
+        payload = pack({'timed': offer, 'regular': [offer]})
+        self.assertEqual(payload[0], SCHEMA_VERSION)
+        self.assertEqual(payload[1]['timed'][:3], (LimitedProduct.schema, 1, 'offer'))
+        self.assertTrue(LimitedProduct.schema.startswith('LimitedProduct:'))
+
+        value = unpack(payload)
+        self.assertIsInstance(value['regular'][0], LimitedProduct)
+        self.assertEqual(value['timed'].price, Decimal('10.00'))
+        self.assertEqual(value['timed'].image.webp, '/a.webp')
+
+    def test_stale_payload_is_rebuilt(self):
+        with self.assertRaises(StaleSchemaError):
+            unpack((SCHEMA_VERSION, ('MenuCategory', 'name')))
+        with self.assertRaises(StaleSchemaError):
+            unpack([MenuCategory])
+
+        cache.set(cache_utils.get_namespaced_key(CATEGORIES_KEY), (SCHEMA_VERSION - 1, []))
+        self.assertEqual([category.name for category in get_menu_categories()], ['category'])
+
+    def test_renamed_field_is_stale(self):
+        _, (schema, *values) = pack(Thumbnail('/a.jpg', '/a.webp'))
+        self.assertEqual(unpack((SCHEMA_VERSION, (schema, *values))).webp, '/a.webp')
+
+        reordered = 'Thumbnail:' + hashlib.md5(b'webp,jpeg').hexdigest()[:8]
+        renamed = 'Thumbnail:' + hashlib.md5(b'jpeg,avif').hexdigest()[:8]
+        for old_schema in (reordered, renamed):
+            with self.assertRaises(StaleSchemaError):
+                unpack((SCHEMA_VERSION, (old_schema, *values)))
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from discounts.models import DiscountTypeEnum, ProductDiscount
+from products.context_processors import get_active_discounts_count, get_menu_categories, header_menu
+from products.models import Category
+
+
+class HeaderMenuTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.phones = Category.objects.create(name="phones", slug="phones", sort_index=1)
+        self.laptops = Category.objects.create(name="laptops", slug="laptops", sort_index=0)
+        Category.objects.create(name="smartphones", slug="smartphones", parent_category=self.phones)
+        Category.objects.create(name="old phones", slug="old-phones", parent_category=self.phones, is_active=False)
+        Category.objects.create(name="tablets", slug="tablets", is_active=False)
+
+    def test_menu_is_built_with_single_query(self):
+        with self.assertNumQueries(1):
+            categories = get_menu_categories()
+        self.assertEqual([category.name for category in categories], ['laptops', 'phones'])
+        self.assertEqual([category.name for category in categories[1].subcategories], ['smartphones'])
+
+        with self.assertNumQueries(0):
+            get_menu_categories()
+
+        self.laptops.is_active = False
+        self.laptops.save()
+        self.assertEqual([category.name for category in get_menu_categories()], ['phones'])
+
+    def test_context_is_lazy(self):
+        with self.assertNumQueries(0):
+            context = header_menu(RequestFactory().get('/'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(context['categories']), 2)
+
+    def test_active_discounts_count_is_cached(self):
+        discount = ProductDiscount.objects.create(
+            name="discount", slug="discount", description="discount",
+            discount_type=DiscountTypeEnum.PERCENTAGE, value=10, end=timezone.now(),
+        )
+        self.assertEqual(get_active_discounts_count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_discounts_count(), 1)
+
+        discount.active = False
+        discount.save()
+        self.assertEqual(get_active_discounts_count(), 0)
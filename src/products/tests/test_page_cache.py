@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from account.models import Profile, Seller
+from products.models import Category, Product
+from products.services import cache_utils
+from products.services.banners import SLIDER_KEY
+from products.services.page_cache import CSRF_PLACEHOLDER
+
+
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        category = Category.objects.create(name='category')
+        self.product = Product.objects.create(
+            category=category,
+            name='cached product',
+            description='description',
+            slug='cached-product',
+        )
+        self.url = reverse('products:product_details', kwargs={'slug': self.product.slug})
+
+    def test_page_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertContains(first, 'cached product')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertContains(second, 'cached product')
+        self.assertContains(second, "name='csrfmiddlewaretoken'")
+        self.assertNotContains(second, CSRF_PLACEHOLDER)
+
+    def test_page_is_invalidated_on_change(self):
+        self.client.get(self.url)
+        self.product.name = 'renamed product'
+        self.product.save()
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'renamed product')
+
+    def test_query_order_and_language_are_part_of_key(self):
+        self.client.get(self.url, {'a': 1, 'b': 2})
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'b': 2, 'a': 1})
+
+        english_url = self.url.replace('/ru/', '/en/', 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(english_url)
+        self.assertTrue(queries)
+
+    def test_visitors_with_session_are_not_served_from_cache(self):
+        self.client.get(self.url)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'session'
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertTrue(queries)
+
+    def test_not_modified_response(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Product.objects.create(category=self.product.category, name='other product', slug='other-product')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.product.sellerproduct.create(
+            seller=self.make_seller(), count=1, price=10,
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators_are_not_reused_without_revalidation(self):
+        miss = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            hit = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=miss['ETag'])
+
+        for response in (miss, hit, not_modified):
+            cache_control = {value.strip() for value in response['Cache-Control'].split(',')}
+            self.assertTrue({'private', 'no-cache'} <= cache_control)
+            vary = {value.strip() for value in response['Vary'].split(',')}
+            self.assertTrue({'Cookie', 'Accept-Language'} <= vary)
+
+    def test_page_with_deferred_banners_is_not_cached(self):
+        slider_key = cache_utils.get_namespaced_key(SLIDER_KEY, 'ru')
+        cache_utils.acquire_lock(slider_key)
+        url = reverse('index')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request._page_cache_deferred)
+
+        cache_utils.release_lock(slider_key)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertTrue(queries)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    @staticmethod
+    def make_seller() -> Seller:
+        profile = Profile.objects.create_user(username='seller', email='seller@example.com', password='123')
+        return Seller.objects.create(name='seller', description='seller', profile=profile)
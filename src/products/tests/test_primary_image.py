@@ -0,0 +1,36 @@
+from django.test import TestCase
+
+from products.models import Category, Picture, Product
+from products.services.pictures import update_primary_images
+
+
+class PrimaryImageTest(TestCase):
+    def setUp(self) -> None:
+        category = Category.objects.create(name="some category")
+        self.product = Product.objects.create(category=category, name="product", slug="product")
+
+    def test_primary_image_follows_pictures(self):
+        first = Picture.objects.create(product=self.product, image='products/images/first.png')
+        second = Picture.objects.create(product=self.product, image='products/images/second.png')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_image, first)
+
+        first.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_image, second)
+
+        second.delete()
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.primary_image)
+
+    def test_update_primary_images(self):
+        pictures = Picture.objects.bulk_create([
+            Picture(product=self.product, image='products/images/first.png'),
+            Picture(product=self.product, image='products/images/second.png'),
+        ])
+        self.assertEqual(update_primary_images([self.product.pk]), 1)
+        self.assertEqual(update_primary_images(), 0)
+
+        product = Product.objects.select_related('primary_image').get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.primary_image.image.name, pictures[0].image.name)
@@ -0,0 +1,94 @@
+import io
+import json
+from os import path
+from pathlib import Path
+import shutil
+import tempfile
+import zipfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from account.models import Profile, Seller
+from products.models import Category, Picture, Product, SellerProduct
+from products.services.product_export import EXPORT_JSON, export_products
+from products.services.product_import.product_importer import ProductImporter
+
+
+class ProductExportTest(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tmp_dir,
+            IMPORT_DIR=Path(self.tmp_dir, 'imports'),
+            IMPORT_SUCCESS_DIR=Path(self.tmp_dir, 'imports/success'),
+            IMPORT_FAILURE_DIR=Path(self.tmp_dir, 'imports/failure'),
+            IMPORT_LOGS_DIR=Path(self.tmp_dir, 'imports/logs'),
+        )
+        self.settings_override.enable()
+
+        profile = Profile.objects.create_user(
+            username="seller",
+            email="seller@example.com",
+            password='123'
+        )
+        self.seller = Seller.objects.create(name="seller", description="seller", profile=profile)
+        self.category = Category.objects.create(name="some category")
+        for i in range(3):
+            product = Product.objects.create(
+                category=self.category,
+                name=f"product {i}",
+                slug=f"product-{i}",
+                description="description",
+            )
+            SellerProduct.objects.create(product=product, seller=self.seller, count=i, price=10 + i)
+
+        content = io.BytesIO()
+        Image.new('RGB', (4, 4), 'red').save(content, 'PNG')
+        self.picture = Picture(product=Product.objects.get(slug='product-0'))
+        self.picture.image.save('image.png', ContentFile(content.getvalue()))
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_export(self):
+        file = io.BytesIO()
+        counts = export_products(file, chunk_size=2)
+        self.assertEqual(counts, {'products': 3, 'seller_products': 3, 'images': 1})
+
+        with zipfile.ZipFile(file) as archive:
+            data = json.loads(archive.read(EXPORT_JSON))
+            self.assertIn(f'export/product-0/{path.basename(self.picture.image.name)}',
+                          archive.namelist())
+        self.assertEqual(data['products']['product-1']['name'], 'product 1')
+        self.assertEqual(data['products']['product-1']['category'], self.category.pk)
+        self.assertEqual(len(data['seller_products']), 3)
+
+    def test_export_keeps_pictures_with_same_name(self):
+        storage = Picture._meta.get_field('image').storage
+        name = path.basename(self.picture.image.name)
+        with storage.open(self.picture.image.name) as image:
+            copy = storage.save(f'copies/{name}', ContentFile(image.read()))
+        Picture.objects.create(product=self.picture.product, image=copy)
+
+        file = io.BytesIO()
+        counts = export_products(file, Product.objects.filter(slug='product-0'))
+        self.assertEqual(counts['images'], 2)
+
+        with zipfile.ZipFile(file) as archive:
+            names = [name for name in archive.namelist() if name != EXPORT_JSON]
+        stem, ext = path.splitext(name)
+        self.assertEqual(names, [f'export/product-0/{name}', f'export/product-0/{stem}_1{ext}'])
+
+    def test_export_can_be_imported(self):
+        file = io.BytesIO()
+        export_products(file, Product.objects.filter(slug='product-0'))
+        Product.objects.all().delete()
+
+        ProductImporter(file.getvalue())
+        product = Product.objects.get(slug='product-0')
+        self.assertEqual(product.name, 'product 0')
+        self.assertEqual(product.images.count(), 1)
+        self.assertEqual(SellerProduct.objects.get(product=product).price, 10)
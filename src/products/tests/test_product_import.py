@@ -0,0 +1,444 @@
+import io
+import json
+from pathlib import Path
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from account.models import Profile, Seller
+from products.models import (
+    Category,
+    ImportStatusEnum,
+    Picture,
+    Product,
+    ProductImportLog,
+    SellerProduct,
+)
+from products.services import cache_utils
+from products.services.product_import.import_utils import FileManager, ImportLogger
+from products.services.product_import.product_importer import ProductImporter
+from products.services.product_import.sharded_import import abort_import
+from products.signals import CATALOG_TAG, COMMON_TAG
+from products.tasks import (
+    fail_products_import,
+    finalize_products_import,
+    import_products,
+    import_seller_product_shards,
+    schedule_pending_imports,
+)
+
+
+def make_image() -> bytes:
+    content = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(content, 'PNG')
+    return content.getvalue()
+
+
+def make_archive(data: dict, images: dict) -> bytes:
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, 'w') as archive:
+        archive.writestr('import/products.json', json.dumps(data))
+        for name, image in images.items():
+            archive.writestr(f'import/{name}', image)
+    return content.getvalue()
+
+
+class ProductImporterTest(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tmp_dir,
+            IMPORT_DIR=self.__path('imports'),
+            IMPORT_PENDING_DIR=self.__path('imports/pending'),
+            IMPORT_PROCESSING_DIR=self.__path('imports/processing'),
+            IMPORT_DUPLICATES_DIR=self.__path('imports/duplicates'),
+            IMPORT_SUCCESS_DIR=self.__path('imports/success'),
+            IMPORT_FAILURE_DIR=self.__path('imports/failure'),
+            IMPORT_LOGS_DIR=self.__path('imports/logs'),
+        )
+        self.settings_override.enable()
+
+        profile = Profile.objects.create_user(
+            username="seller",
+            email="seller@example.com",
+            password='123'
+        )
+        self.seller = Seller.objects.create(name="seller", description="seller", profile=profile)
+        self.category = Category.objects.create(name="some category")
+        self.existing_product = Product.objects.create(
+            category=self.category,
+            name="existing product",
+            slug="existing_product",
+        )
+        self.archive = make_archive(
+            {
+                'seller_products': {
+                    'offer_1': {'seller': self.seller.pk, 'product': 'product_1', 'new': True,
+                                'count': 5, 'price': '100.00'},
+                    'offer_2': {'seller': self.seller.pk, 'product': self.existing_product.pk,
+                                'count': 1, 'price': '50.00'},
+                    'offer_3': {'seller': 999, 'product': 'product_1', 'new': True,
+                                'count': 1, 'price': '10.00'},
+                },
+                'products': {
+                    'product_1': {'name': 'Product one', 'category': self.category.pk},
+                    'product_2': {'name': 'Product two', 'category': self.category.pk,
+                                  'slug': 'product-two'},
+                    'product_3': {'name': 'Product three', 'category': 999},
+                    'product_4': {'name': 'Existing', 'category': self.category.pk,
+                                  'slug': 'existing_product'},
+                },
+            },
+            {
+                'product_1/first.png': make_image(),
+                'product_1/second.png': make_image(),
+                'product_1/broken.png': b'not an image',
+            },
+        )
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp_dir)
+
+    def __path(self, name: str) -> Path:
+        return Path(self.tmp_dir) / name
+
+    def assert_imported(self):
+        product = Product.objects.get(slug='product-one')
+        self.assertTrue(Product.objects.filter(slug='product-two').exists())
+        self.assertFalse(Product.objects.filter(name='Product three').exists())
+        self.assertEqual(Picture.objects.filter(product=product).count(), 2)
+        self.assertEqual(product.primary_image, Picture.objects.filter(product=product).earliest('pk'))
+        self.assertTrue(SellerProduct.objects.filter(product=product, seller=self.seller).exists())
+        self.assertTrue(SellerProduct.objects.filter(product=self.existing_product).exists())
+        self.assertEqual(SellerProduct.objects.count(), 2)
+
+        import_log = ProductImportLog.objects.earliest('pk')
+        self.assertEqual(import_log.status, ImportStatusEnum.PARTIAL_SUCCESS)
+        self.assertEqual(import_log.items_imported, 6)
+        self.assertIn('Product (product_3) product_import failed', import_log.message_log)
+        self.assertIn('Product (product_4) product_import failed', import_log.message_log)
+        self.assertIn('Seller product (offer_3) import failed', import_log.message_log)
+        self.assertIn('Image (import/product_1/broken.png) product_import failed',
+                      import_log.message_log)
+
+    def test_import(self):
+        ProductImporter(self.archive)
+        self.assert_imported()
+
+    @override_settings(IMPORT_IMAGE_WORKERS=2, IMPORT_IMAGE_MEMORY_BUDGET=1)
+    def test_bulk_import(self):
+        ProductImporter(self.archive, bulk=True, batch_size=2)
+        self.assert_imported()
+
+    def test_log_is_flushed_in_batches(self):
+        logger = ImportLogger(datetime.now(), FileManager(datetime.now()), flush_messages=3,
+                              flush_interval=3600)
+        import_log = ProductImportLog.objects.get()
+
+        for i in range(4):
+            logger.log(f'message {i}')
+        import_log.refresh_from_db()
+        self.assertIn('message 2', import_log.message_log)
+        self.assertNotIn('message 3', import_log.message_log)
+
+        log = logger.finalize_log(ImportStatusEnum.SUCCESS, 4)
+        import_log.refresh_from_db()
+        self.assertEqual(import_log.message_log.rstrip('\n'), log)
+        self.assertEqual(Path(import_log.log_file).read_text().rstrip('\n'), log)
+        self.assertEqual(import_log.status, ImportStatusEnum.SUCCESS)
+
+    def test_bulk_import_skips_malformed_rows(self):
+        ProductImporter(make_archive(
+            {
+                'products': {
+                    'product_1': {'name': 'Product one', 'category': self.category.pk},
+                    'product_2': {'name': 'Product two', 'category': self.category.pk,
+                                  'slug': 'product-two', 'sort_index': 'abc'},
+                    'product_3': {'name': 'Product three', 'category': self.category.pk},
+                },
+                'seller_products': {
+                    'offer_1': {'seller': self.seller.pk, 'product': self.existing_product.pk,
+                                'count': 1, 'price': 'abc'},
+                    'offer_2': {'seller': self.seller.pk, 'product': 'product_1', 'new': True,
+                                'count': 1, 'price': '10.00'},
+                },
+            },
+            {},
+        ), bulk=True, batch_size=2)
+
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(import_log.status, ImportStatusEnum.PARTIAL_SUCCESS)
+        self.assertEqual(import_log.items_imported, 3)
+        self.assertIn('Product (product_2) product_import failed', import_log.message_log)
+        self.assertIn('Seller product (offer_1) import failed', import_log.message_log)
+        self.assertFalse(Product.objects.filter(slug='product-two').exists())
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(SellerProduct.objects.get().price, 10)
+
+    @override_settings(IMPORT_LOG_TAIL_MESSAGES=2)
+    def test_log_record_keeps_only_tail(self):
+        logger = ImportLogger(datetime.now(), FileManager(datetime.now()), flush_messages=1)
+        for i in range(5):
+            logger.log(f'message {i}')
+        log = logger.finalize_log(ImportStatusEnum.SUCCESS, 5)
+
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(len(import_log.message_log.splitlines()), 2)
+        self.assertIn('message 4', import_log.message_log)
+        self.assertNotIn('message 2', import_log.message_log)
+        self.assertIn('message 0', log)
+
+    def test_import_staged_file(self):
+        chunks = [self.archive[i:i + 100] for i in range(0, len(self.archive), 100)]
+        file_path, file_hash = FileManager.stage_file(chunks)
+        self.assertEqual(file_path.parent, self.__path('imports/pending'))
+        self.assertEqual(file_path.read_bytes(), self.archive)
+
+        ProductImporter(file_path, file_hash=file_hash)
+        self.assert_imported()
+        self.assertFalse(file_path.exists())
+
+    def test_import_staged_file_hash_mismatch(self):
+        file_path, _ = FileManager.stage_file([self.archive])
+
+        ProductImporter(file_path, file_hash='0' * 64)
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(import_log.status, ImportStatusEnum.FAILURE)
+        self.assertIn('File hash does not match', import_log.message_log)
+        self.assertFalse(Product.objects.filter(slug='product-one').exists())
+
+    @override_settings(IMPORT_SHARD_SIZE=1)
+    def test_sharded_import(self):
+        file_path, file_hash = FileManager.stage_file([self.archive])
+
+        import_products.delay(file_path.as_posix(), file_hash=file_hash, sharded=True)
+        self.assert_imported()
+        self.assertFalse(file_path.exists())
+        self.assertFalse(any(self.__path('imports/shards').iterdir()))
+
+    @override_settings(IMPORT_SHARD_SIZE=1)
+    def test_shard_chords_fail_import_on_error(self):
+        file_path, file_hash = FileManager.stage_file([self.archive])
+
+        with mock.patch('products.tasks.chord') as shard_chord:
+            import_products.delay(file_path.as_posix(), file_hash=file_hash, sharded=True)
+        body = shard_chord.return_value.call_args.args[0]
+        self.assertEqual(body.task, import_seller_product_shards.name)
+        context, seller_shards = body.args
+        self.assertEqual(body.options['link_error'], [fail_products_import.s(context)])
+
+        with mock.patch('products.tasks.chord') as shard_chord:
+            import_seller_product_shards([], context, seller_shards)
+        finalize = shard_chord.return_value.call_args.args[0]
+        self.assertEqual(finalize.task, finalize_products_import.name)
+        self.assertEqual(finalize.options['link_error'], [fail_products_import.s(context)])
+
+        fail_products_import(mock.Mock(id='task'), OSError('worker lost'), None, context)
+        import_log = ProductImportLog.objects.get(pk=context['import_log'])
+        self.assertEqual(import_log.status, ImportStatusEnum.FAILURE)
+        self.assertIsNotNone(import_log.end)
+        self.assertIn('Import failed due to OSError: worker lost', import_log.message_log)
+        self.assertFalse(file_path.exists())
+        self.assertFalse(any(self.__path('imports/shards').iterdir()))
+        self.assertFalse(abort_import(context, 'RuntimeError: again'))
+
+    def test_upsert_import(self):
+        ProductImporter(self.archive, bulk=True)
+        self.assert_imported()
+        product = Product.objects.get(slug='product-two')
+        offer = SellerProduct.objects.get(product=self.existing_product)
+
+        ProductImporter(make_archive(
+            {
+                'products': {
+                    'product_1': {'name': 'Product one', 'category': self.category.pk},
+                    'product_2': {'name': 'Product two', 'category': self.category.pk,
+                                  'slug': 'product-two', 'description': 'updated'},
+                },
+                'seller_products': {
+                    'offer_1': {'seller': self.seller.pk, 'product': 'product_1', 'new': True,
+                                'count': 5, 'price': '100.00'},
+                    'offer_2': {'seller': self.seller.pk, 'product': self.existing_product.pk,
+                                'count': 1, 'price': '75.00'},
+                },
+            },
+            {},
+        ), upsert=True)
+
+        import_log = ProductImportLog.objects.latest('pk')
+        self.assertEqual(import_log.status, ImportStatusEnum.SUCCESS)
+        self.assertIn('Skipped 1 unchanged products', import_log.message_log)
+        self.assertIn('Product product_2 updated successfully', import_log.message_log)
+        self.assertIn('Skipped 1 unchanged seller products', import_log.message_log)
+        self.assertIn('Seller product offer_2 updated successfully', import_log.message_log)
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(SellerProduct.objects.count(), 2)
+        product.refresh_from_db()
+        offer.refresh_from_db()
+        self.assertEqual(product.description, 'updated')
+        self.assertEqual(product.name, 'Product two')
+        self.assertEqual(offer.price, 75)
+
+    def test_dry_run(self):
+        file_path, _ = FileManager.stage_file([self.archive])
+
+        importer = ProductImporter(file_path, dry_run=True)
+        self.assertFalse(importer.valid)
+        self.assertTrue(file_path.exists())
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertFalse(Picture.objects.exists())
+
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(import_log.status, ImportStatusEnum.FAILURE)
+        self.assertIn('Product (product_3) validation failed: category 999 does not exist',
+                      import_log.message_log)
+        self.assertIn('Product (product_4) validation failed: product with slug existing_product',
+                      import_log.message_log)
+        self.assertIn('Seller product (offer_3) validation failed: seller 999 does not exist',
+                      import_log.message_log)
+        self.assertIn('Image (import/product_1/broken.png) validation failed',
+                      import_log.message_log)
+        self.assertIn('found 4 errors', import_log.message_log)
+
+    def test_dry_run_valid_archive(self):
+        importer = ProductImporter(make_archive(
+            {
+                'products': {
+                    'product_1': {'name': 'Product one', 'category': self.category.pk},
+                },
+                'seller_products': {
+                    'offer_1': {'seller': self.seller.pk, 'product': 'product_1', 'new': True,
+                                'count': 5, 'price': '100.00'},
+                },
+            },
+            {'product_1/first.png': make_image()},
+        ), dry_run=True)
+
+        self.assertTrue(importer.valid)
+        self.assertEqual(ProductImportLog.objects.get().status, ImportStatusEnum.SUCCESS)
+        self.assertFalse(Product.objects.filter(slug='product-one').exists())
+
+    def test_only_committed_import_invalidates_pages(self):
+        versions = cache_utils.get_tag_versions([CATALOG_TAG, COMMON_TAG])
+        ProductImporter(make_archive(
+            {'products': {'product_1': {'name': 'Product one', 'category': self.category.pk}}},
+            {},
+        ), dry_run=True)
+        ProductImporter(make_archive(
+            {'products': {'product_1': {'name': 'Product one', 'category': 999}}},
+            {},
+        ))
+        self.assertEqual(cache_utils.get_tag_versions([CATALOG_TAG, COMMON_TAG]), versions)
+
+        ProductImporter(self.archive, bulk=True)
+        self.assertNotEqual(cache_utils.get_tag_versions([CATALOG_TAG, COMMON_TAG]), versions)
+
+    def test_progress(self):
+        ProductImporter(self.archive, bulk=True)
+        progress = ProductImportLog.objects.get().progress
+
+        self.assertEqual(progress['stage'], 'finished')
+        self.assertEqual(progress['rows']['products'], {'parsed': 4, 'inserted': 2, 'failed': 2})
+        self.assertEqual(progress['rows']['images'], {'parsed': 3, 'inserted': 2, 'failed': 1})
+        self.assertEqual(progress['rows']['seller_products'],
+                         {'parsed': 3, 'inserted': 2, 'failed': 1})
+        self.assertGreater(progress['bytes_total'], 0)
+        self.assertEqual(progress['bytes_read'], progress['bytes_total'])
+
+        admin = Profile.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password='123'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:import_products_progress'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['progress'], progress)
+        self.assertEqual(response.json()['status'], 'Partial success')
+
+    @override_settings(IMPORT_MAX_CONCURRENT=1)
+    def test_schedule_pending_imports(self):
+        first_path, _ = FileManager.stage_file([self.archive])
+        duplicate_path = first_path.with_name('duplicate.zip')
+        shutil.copy(first_path, duplicate_path)
+        first_path.with_name('upload.part').write_bytes(self.archive)
+
+        self.assertEqual(schedule_pending_imports(), 1)
+        self.assert_imported()
+        self.assertFalse(first_path.exists())
+        self.assertTrue(duplicate_path.exists())
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(import_log.file_hash, FileManager.get_file_hash(duplicate_path))
+
+        self.assertEqual(schedule_pending_imports(), 0)
+        self.assertFalse(duplicate_path.exists())
+        self.assertEqual(len(list(self.__path('imports/duplicates').iterdir())), 1)
+        self.assertTrue(first_path.with_name('upload.part').exists())
+        self.assertEqual(ProductImportLog.objects.count(), 1)
+
+    @override_settings(IMPORT_MAX_CONCURRENT=1)
+    def test_schedule_pending_imports_respects_running_imports(self):
+        ProductImportLog.objects.create(start=datetime.now())
+        file_path, _ = FileManager.stage_file([self.archive])
+
+        self.assertEqual(schedule_pending_imports(), 0)
+        self.assertTrue(file_path.exists())
+
+    def test_schedule_pending_imports_returns_file_when_broker_is_down(self):
+        file_path, _ = FileManager.stage_file([self.archive])
+
+        with mock.patch('products.tasks.import_products.delay', side_effect=OperationalError):
+            self.assertEqual(schedule_pending_imports(), 0)
+
+        self.assertEqual(ProductImportLog.objects.get().status, ImportStatusEnum.FAILURE)
+        self.assertEqual(len(list(self.__path('imports/pending').iterdir())), 1)
+        self.assertFalse(any(self.__path('imports/processing').iterdir()))
+
+        self.assertEqual(schedule_pending_imports(), 1)
+        self.assertEqual(ProductImportLog.objects.latest('pk').status, ImportStatusEnum.PARTIAL_SUCCESS)
+
+    @override_settings(IMPORT_MAX_CONCURRENT=1)
+    def test_upload_respects_running_imports(self):
+        ProductImportLog.objects.create(start=datetime.now())
+        self.client.force_login(self.make_admin())
+
+        with mock.patch('products.tasks.import_products.delay') as delay:
+            self.upload()
+
+        delay.assert_not_called()
+        self.assertEqual(ProductImportLog.objects.count(), 1)
+        self.assertFalse(self.__path('imports/processing').exists())
+
+    def test_upload_returns_file_when_broker_is_down(self):
+        self.client.force_login(self.make_admin())
+
+        with mock.patch('products.tasks.import_products.delay', side_effect=OperationalError):
+            self.upload()
+
+        import_log = ProductImportLog.objects.get()
+        self.assertEqual(import_log.status, ImportStatusEnum.FAILURE)
+        self.assertIn('Import could not be queued', import_log.message_log)
+        self.assertEqual(len(list(self.__path('imports/pending').iterdir())), 1)
+        self.assertFalse(any(self.__path('imports/processing').iterdir()))
+
+    def upload(self):
+        archive = SimpleUploadedFile('import.zip', self.archive, content_type='application/zip')
+        response = self.client.post(reverse('admin:import_products'), {'zip_file': archive})
+        self.assertEqual(response.status_code, 302)
+
+    @staticmethod
+    def make_admin() -> Profile:
+        return Profile.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password='123'
+        )
@@ -0,0 +1,141 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from products.models import Category, Picture, Product
+from products.services.pictures import delete_unreferenced_images
+from products.services.thumbnails import THUMBNAIL_SCHEDULED_KEY, get_thumbnail_name, thumbnail, thumbnail_url
+
+
+def make_image(size=(600, 400), mode='RGBA') -> bytes:
+    content = io.BytesIO()
+    Image.new(mode, size, 'red').save(content, 'PNG')
+    return content.getvalue()
+
+
+class PictureThumbnailsTest(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.tmp_dir,
+            PICTURE_THUMBNAIL_SIZES={'small': (50, 50), 'medium': (200, 200)},
+        )
+        self.settings_override.enable()
+        cache.clear()
+
+        category = Category.objects.create(name="some category")
+        self.product = Product.objects.create(category=category, name="product", slug="product")
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_thumbnails_are_generated_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            picture = Picture.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('photo.png', make_image()),
+            )
+
+        picture.refresh_from_db()
+        self.assertTrue(picture.thumbnails_ready)
+        storage = picture.image.storage
+        for fmt in ('webp', 'jpeg'):
+            with storage.open(get_thumbnail_name(picture.image.name, 'medium', fmt)) as f:
+                with Image.open(f) as image:
+                    self.assertEqual(image.size, (200, 133))
+            self.assertTrue(storage.exists(get_thumbnail_name(picture.image.name, 'small', fmt)))
+
+        html = thumbnail(picture, 'small', class_='Cart-img', alt='card')
+        small = get_thumbnail_name(picture.image.name, 'small', 'webp')
+        self.assertIn(f'<picture><source srcset="/media/{small}" type="image/webp" />', html)
+        small = get_thumbnail_name(picture.image.name, 'small', 'jpeg')
+        self.assertIn(f'<img src="/media/{small}" class="Cart-img" alt="card" />', html)
+
+    def test_legacy_picture_is_generated_on_demand(self):
+        picture = Picture(product=self.product)
+        picture.image.save('legacy.png', SimpleUploadedFile('legacy.png', make_image()), save=False)
+        Picture.objects.bulk_create([picture])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(thumbnail_url(picture), picture.image.url)
+            self.assertEqual(str(thumbnail(picture, alt='legacy')),
+                             f'<img src="{picture.image.url}" alt="legacy" />')
+
+        picture.refresh_from_db()
+        self.assertTrue(picture.thumbnails_ready)
+        self.assertEqual(thumbnail_url(picture),
+                         f'/media/{get_thumbnail_name(picture.image.name, "medium", "jpeg")}')
+
+    def test_identical_images_are_stored_once(self):
+        content = make_image()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Picture.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('first.png', content),
+            )
+        storage = first.image.storage
+        thumbnail_name = get_thumbnail_name(first.image.name, 'small', 'webp')
+        self.assertTrue(storage.exists(thumbnail_name))
+
+        with mock.patch('products.services.thumbnails._render_thumbnails') as render, \
+                self.captureOnCommitCallbacks(execute=True):
+            second = Picture.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('second.png', content),
+            )
+        render.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertTrue(second.thumbnails_ready)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(storage.exists(thumbnail_name))
+
+    def test_reused_image_is_not_deleted(self):
+        content = make_image()
+        with self.captureOnCommitCallbacks(execute=True):
+            picture = Picture.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('first.png', content),
+            )
+        storage = picture.image.storage
+        name = picture.image.name
+        self.assertTrue(storage.reuse(name))
+
+        with mock.patch('products.tasks.delete_picture_images.apply_async') as retry, \
+                self.captureOnCommitCallbacks(execute=True):
+            picture.delete()
+        self.assertTrue(storage.exists(name))
+        retry.assert_called_once_with(([name],), countdown=mock.ANY)
+
+        storage.release(name)
+        self.assertEqual(delete_unreferenced_images([name]), [])
+        self.assertFalse(storage.exists(name))
+
+    def test_broker_failure_does_not_break_rendering(self):
+        picture = Picture(product=self.product)
+        picture.image.save('offline.png', SimpleUploadedFile('offline.png', make_image()), save=False)
+        Picture.objects.bulk_create([picture])
+
+        with mock.patch('products.tasks.generate_picture_thumbnails.delay', side_effect=OperationalError), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(thumbnail_url(picture), picture.image.url)
+        self.assertIsNone(cache.get(THUMBNAIL_SCHEDULED_KEY.format(pk=picture.pk)))
+
+    def test_missing_picture(self):
+        self.assertEqual(thumbnail(None), '')
+        self.assertEqual(thumbnail_url(None), '')
@@ -10,7 +10,6 @@ from products.views import (
     delete_product_to_compare_list_view,
     get_compare_list_amt_view,
     add_product_to_compare_list_view,
-    reset_banners_cache,
 )
 
 app_name = "products"
@@ -23,7 +22,6 @@ urlpatterns = [
     path('compare/delete/<str:slug>/', delete_product_to_compare_list_view, name='delete_product_to_compare_list'),
     path('compare/amt/', get_compare_list_amt_view, name='compare_amt'),
     path('compare/add/<str:slug>/', add_product_to_compare_list_view, name='add_product_to compare_list'),
-    path('reset-cache/', reset_banners_cache, name='reset_cache'),
     path('api/', include(routers.urls)),
     path('t/<slug:tag>', CatalogView.as_view(), name='products-by-tag'),
     path(
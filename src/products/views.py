@@ -1,19 +1,21 @@
 from typing import Any, Dict
 
 from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.core.cache import cache
 from django.core.paginator import EmptyPage, Paginator, PageNotAnInteger
 from django.db.models import QuerySet
 from django.shortcuts import redirect
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.urls import reverse
-from django.views.generic import DetailView, FormView, ListView, TemplateView
+from django.views.generic import DetailView, FormView, ListView, TemplateView, View
 from django.utils import timezone
 
 from .forms import ProductsImportForm
-from .models import Product
+from .models import Product, ProductImportLog
+from .services import cache_utils
 from .services.catalog_queryset import CatalogQuerySetProcessor
 from .services.compare_products import (
     add_product_to_compare_list,
@@ -22,12 +24,16 @@ from .services.compare_products import (
     get_compare_list_amt,
     get_compare_list,
 )
-from .services.banners import Banner, LimitedProduct, TopSellerProduct, clear_banner_cache
-from .tasks import import_products
+from .services.banners import Banner, LimitedProduct, TopSellerProduct
+from .services.product_import.import_utils import FileManager
+from .services.product_import.scheduler import get_free_import_slots, register_import
+from .services.thumbnails import thumbnail_url
+from .tasks import enqueue_import
 from account.models import BrowsingHistory
 from catalog.forms import ReviewForm
 from catalog.services import add_review, get_count_review
-from .context_processors import clear_category_cache
+
+PRODUCT_DETAILS_KEY = 'product_details_{slug}'
 
 
 class IndexView(TemplateView):
@@ -109,7 +115,7 @@ class ProductDetailsView(DetailView):
         Если данные не найдены в кэше, они извлекаются из базы данных и кэшируются на 24 часа.
         """
         slug = self.kwargs.get('slug')
-        cache_key = f'product_details_{slug}'
+        cache_key = cache_utils.get_namespaced_key(PRODUCT_DETAILS_KEY.format(slug=slug))
         queryset = cache.get(cache_key)
 
         if queryset is None:
@@ -179,7 +185,7 @@ class ProductsCompareView(ListView):
         '''Фомирует кверисет для страницы сравнения'''
         return [
             product[0] for product in [
-                Product.objects.filter(slug=slug).select_related('category').prefetch_related("images")
+                Product.objects.filter(slug=slug).select_related('category', 'primary_image')
                 for slug in get_compare_list(self.request)
             ]
         ]
@@ -196,7 +202,7 @@ class ProductsCompareView(ListView):
                 'pk': product.pk,
                 'product': product,
                 'price': product.min_price,
-                'img': product.images.first().image.url,
+                'img': thumbnail_url(product.primary_image),
                 'slug': product.slug,
                 'property': [
                     {
@@ -289,11 +295,41 @@ class ProductImportFormView(PermissionRequiredMixin, FormView):
     ]
 
     def form_valid(self, form):
-        task = import_products.delay(
-            form.files['zip_file'].read(),
-            self.request.user.pk,
-            form.cleaned_data['email'],
+        if not get_free_import_slots():
+            messages.add_message(
+                self.request,
+                messages.WARNING,
+                "Too many imports are running, try again later")
+            return super().form_valid(form)
+
+        file_path, file_hash = FileManager.stage_file(
+            form.files['zip_file'].chunks(),
+            settings.IMPORT_PROCESSING_DIR,
+        )
+        import_log = register_import(file_path, file_hash)
+        if import_log is None:
+            messages.add_message(
+                self.request,
+                messages.WARNING,
+                "This archive has already been imported")
+            return super().form_valid(form)
+
+        task = enqueue_import(
+            file_path,
+            file_hash,
+            import_log,
+            user_id=self.request.user.pk,
+            email=form.cleaned_data['email'],
+            bulk=form.cleaned_data['bulk'],
+            sharded=form.cleaned_data['sharded'],
+            upsert=form.cleaned_data['upsert'],
         )
+        if task is None:
+            messages.add_message(
+                self.request,
+                messages.WARNING,
+                "Import queue is unavailable, the archive will be imported by the scheduler")
+            return super().form_valid(form)
 
         self.request.session['import_task'] = task.id
         messages.add_message(
@@ -314,12 +350,32 @@ class ProductImportFormView(PermissionRequiredMixin, FormView):
         return context
 
 
-def reset_banners_cache(request) -> HttpResponse:
+class ProductImportProgressView(PermissionRequiredMixin, View):
     """
-    AJAX функция для сброса кэша при смене языка
+    View прогресса импорта товаров в формате json.
+
+    Возвращает статус и прогресс импорта с id из параметра log
+    или последнего начатого импорта.
     """
-    if request.method == 'POST':
-        clear_banner_cache()
-        clear_category_cache()
-        return HttpResponse()
-    return HttpResponse('Нет доступа')
+    permission_required = ProductImportFormView.permission_required
+
+    def get(self, request: HttpRequest) -> JsonResponse:
+        import_logs = ProductImportLog.objects.only(
+            'pk', 'status', 'start', 'end', 'items_imported', 'progress',
+        ).order_by('-pk')
+        log_id = request.GET.get('log')
+        if log_id and log_id.isdigit():
+            import_logs = import_logs.filter(pk=log_id)
+
+        import_log = import_logs.first()
+        if not import_log:
+            return JsonResponse({}, status=404)
+
+        return JsonResponse({
+            'id': import_log.pk,
+            'status': import_log.get_status_display(),
+            'start': import_log.start,
+            'end': import_log.end,
+            'items_imported': import_log.items_imported,
+            'progress': import_log.progress,
+        })